@@ -3,10 +3,15 @@ Pytest configuration for xtool MCP Server tests
 """
 
 import asyncio
+import contextlib
+import copy
+import dataclasses
 import importlib
 import os
 import sys
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
+from typing import Optional
 
 import pytest
 
@@ -23,6 +28,9 @@ if not os.environ.get("OPENAI_API_KEY"):
 if not os.environ.get("XAI_API_KEY"):
     os.environ["XAI_API_KEY"] = "dummy-key-for-tests"
 
+# Keep numba's compiled kernels (when numba is installed) in one on-disk cache shared by test runs and workers
+os.environ.setdefault("NUMBA_CACHE_DIR", str(parent_dir / ".numba_cache"))
+
 # Set default model to a specific value for tests to avoid auto mode
 # This prevents all tests from failing due to missing model parameter
 os.environ["DEFAULT_MODEL"] = "gemini-2.5-flash"
@@ -77,11 +85,119 @@ def project_path(tmp_path):
     return test_dir
 
 
+@pytest.fixture(scope="session")
+def project_files():
+    """
+    Contents of the project's deployment files, read concurrently once per test session.
+    Missing files map to None so tests can assert or skip.
+    """
+    paths = {
+        "dockerfile": parent_dir / "Dockerfile",
+        "env_example": parent_dir / ".env.example",
+        "mcp_config": parent_dir / "mcp.json",
+    }
+
+    def read(path):
+        return path.read_text() if path.exists() else None
+
+    with ThreadPoolExecutor(max_workers=len(paths)) as executor:
+        futures = {name: executor.submit(read, path) for name, path in paths.items()}
+        return {name: future.result() for name, future in futures.items()}
+
+
+@pytest.fixture(scope="session")
+def all_tools():
+    """The server's tool list, built once per test session; tests must not mutate it"""
+    from server import handle_list_tools
+
+    return asyncio.run(handle_list_tools())
+
+
+@contextlib.contextmanager
+def _use_memory_store(path: Path, layers: Optional[dict] = None):
+    """Point the memory modules at the store in path, with a private copy of the layer settings"""
+    from utils import intelligent_memory_retrieval
+    from utils.conversation_memory import flush_memory, get_memory_config, set_memory_config
+
+    config = get_memory_config()
+    layer_settings = copy.deepcopy(config.layers)
+    for layer, settings in (layers or {}).items():
+        layer_settings[layer].update(settings)
+    previous = set_memory_config(dataclasses.replace(config, storage_path=path, layers=layer_settings))
+    # Drop the index loaded from the previous store, so it is never written into this one
+    intelligent_memory_retrieval._memory_index = None
+    try:
+        yield path
+    finally:
+        flush_memory()
+        set_memory_config(previous)
+        # ...and drop this store's keys before anything touches the previous store again
+        intelligent_memory_retrieval._memory_index = None
+
+
+@pytest.fixture(scope="session", autouse=True)
+def memory_store_path(tmp_path_factory):
+    """
+    A private enhanced-memory store for this test session (one per xdist worker), so
+    parallel workers never share the .XTOOL_memory dir or collide on memory keys.
+    """
+    path = tmp_path_factory.mktemp(f"memory_{os.environ.get('PYTEST_XDIST_WORKER', 'main')}")
+    # Exported too, so servers the tests spawn as subprocesses use the same store
+    previous_env = os.environ.get("MEMORY_STORAGE_PATH")
+    os.environ["MEMORY_STORAGE_PATH"] = str(path)
+    with _use_memory_store(path):
+        yield path
+    if previous_env is None:
+        os.environ.pop("MEMORY_STORAGE_PATH", None)
+    else:
+        os.environ["MEMORY_STORAGE_PATH"] = previous_env
+
+
+@pytest.fixture
+def memory_store(request, tmp_path):
+    """
+    A fresh, empty memory store for one test; yields its storage dir.
+    Parametrize indirectly with per-layer setting overrides, e.g. {"global": {"max_items": 2}}.
+    """
+    path = tmp_path / "memory"
+    path.mkdir()
+    with _use_memory_store(path, getattr(request, "param", None)):
+        yield path
+
+
+@pytest.fixture(scope="session", autouse=True)
+def warm_lifecycle_kernels():
+    """Call the memory lifecycle kernels once so any JIT compile happens before timed tests"""
+    from utils.memory_lifecycle import _decay_kernel, _weighted_quality_kernel
+
+    _decay_kernel(1.0, 0, 30.0)
+    _weighted_quality_kernel(0.5, 0.5, 0.5, 0.5, 0.5, 0.5)
+
+
+@pytest.fixture(scope="session")
+def has_any_api_key():
+    """Whether any provider key or custom endpoint is configured, checked once per test session"""
+    return any(os.getenv(name) for name in ("OPENAI_API_KEY", "GEMINI_API_KEY", "OPENROUTER_API_KEY", "CUSTOM_API_URL"))
+
+
+@pytest.fixture(scope="session")
+def large_payload_10k():
+    """10KB of content for large-input tests, built once per test session"""
+    return "x" * 10000
+
+
+@pytest.fixture(scope="session")
+def perf_payload():
+    """Repeated content for the memory performance test, built once per test session"""
+    return "Performance test content" * 100
+
+
 # Pytest configuration
 def pytest_configure(config):
     """Configure pytest with custom markers"""
     config.addinivalue_line("markers", "asyncio: mark test as async")
     config.addinivalue_line("markers", "no_mock_provider: disable automatic provider mocking")
+    config.addinivalue_line("markers", "slow: cold-path measurements; deselect with -m 'not slow'")
 
 
 @pytest.fixture(autouse=True)
@@ -5,58 +5,449 @@ Comprehensive Test Runner for xtool MCP Server
 This script runs all test suites and generates a comprehensive test report.
 """
 
+import argparse
 import asyncio
+import functools
+import hashlib
+import importlib.util
 import json
 import os
 import sys
+import tempfile
 import time
-from datetime import datetime
 from pathlib import Path
+from typing import Optional, Union
 
-import pytest
+# Heavier modules (ast, subprocess, xml.etree, orjson) are imported where they
+# are used, so --help and early environment-check exits stay fast.
 
+# A suite is (suite_name, test_file(s), markers). A list of files is run as a
+# single pytest session and split back into per-file suites afterwards.
+SuiteSpec = tuple[str, Union[str, list[str]], Optional[list[str]]]
 
-class TestReporter:
-    """Generate comprehensive test reports"""
+_HERE = Path(__file__).resolve().parent
+PROJECT_ROOT = _HERE.parent
 
-    def __init__(self):
-        self.results = {
-            "timestamp": datetime.now().isoformat(),
-            "suites": {},
-            "summary": {"total_tests": 0, "passed": 0, "failed": 0, "skipped": 0, "duration": 0},
-        }
+# Passing suite results keyed by a hash of the test file and the local sources it imports
+MEMO_DIR = PROJECT_ROOT / ".pytest_memo"
 
-    def run_test_suite(self, suite_name: str, test_file: str, markers: list[str] = None) -> dict:
-        """Run a test suite and collect results"""
-        print(f"\n{'=' * 60}")
-        print(f"Running {suite_name}")
-        print(f"{'=' * 60}")
+# Files matching test_*.py that run as their own (non-unit) suites
+_EXCLUDE = frozenset(
+    {
+        "test_integration_comprehensive.py",
+        "test_e2e_mcp_protocol.py",
+        "test_performance_stress.py",
+        "test_cross_tool_collaboration.py",
+        "run_comprehensive_tests.py",
+    }
+)
 
-        start_time = time.time()
+# At least one of these should be set for AI-based tests
+_API_KEYS = frozenset({"OPENAI_API_KEY", "GEMINI_API_KEY", "OPENROUTER_API_KEY", "CUSTOM_API_URL"})
 
-        # Prepare pytest arguments
-        args = [test_file, "-v", "--tb=short"]
-        if markers:
-            for marker in markers:
-                args.extend(["-m", marker])
 
-        # Run tests and capture results
-        result = pytest.main(args)
+@functools.lru_cache(maxsize=8)
+def _discover(test_dir: str, mtime: float) -> tuple[str, ...]:
+    """Unit test files in test_dir; mtime keys the cache so new files are picked up"""
+    return tuple(str(f) for f in sorted(Path(test_dir).glob("test_*.py")) if f.name not in _EXCLUDE)
 
-        duration = time.time() - start_time
 
-        # Store results
-        suite_result = {
-            "name": suite_name,
-            "file": test_file,
-            "duration": duration,
-            "exit_code": result,
-            "status": "passed" if result == 0 else "failed",
-        }
+@functools.cache
+def _local_imports(path: Path) -> tuple[Path, ...]:
+    """Project files directly imported by a Python source file"""
+    import ast
+
+    try:
+        tree = ast.parse(path.read_bytes())
+    except (OSError, SyntaxError, ValueError):
+        return ()
+
+    modules = []
+    for node in ast.walk(tree):
+        if isinstance(node, ast.Import):
+            modules.extend(alias.name for alias in node.names)
+        elif isinstance(node, ast.ImportFrom) and node.module and not node.level:
+            modules.append(node.module)
+            modules.extend(f"{node.module}.{alias.name}" for alias in node.names)
+
+    found = []
+    for module in modules:
+        parts = module.split(".")
+        # Importing a.b.c also executes a/__init__.py and a/b/__init__.py
+        for i in range(1, len(parts) + 1):
+            candidate = PROJECT_ROOT.joinpath(*parts[:i])
+            for source in (candidate.with_suffix(".py"), candidate / "__init__.py"):
+                if source.is_file():
+                    found.append(source)
+    return tuple(found)
+
+
+@functools.cache
+def _source_hash(test_file: str) -> str:
+    """Hash a test file together with conftest.py and every project module it imports"""
+    test_path = Path(test_file)
+    if not test_path.is_absolute():
+        test_path = PROJECT_ROOT / test_path
+
+    deps = set()
+    stack = [test_path.resolve(), _HERE / "conftest.py"]
+    while stack:
+        path = stack.pop()
+        if path in deps:
+            continue
+        deps.add(path)
+        stack.extend(p.resolve() for p in _local_imports(path))
+
+    digest = hashlib.blake2b()
+    for path in sorted(deps):
+        digest.update(str(path).encode())
+        if path.is_file():
+            digest.update(path.read_bytes())
+    return digest.hexdigest()
+
+
+@functools.lru_cache(maxsize=1)
+def _plugin_args() -> tuple[str, ...]:
+    """Resolve the installed pytest plugins once, as explicit ``-p`` arguments.
+
+    Workers are started with plugin autoload disabled and load exactly this
+    set, so entry-point discovery happens once in the parent process instead
+    of in every pytest bootstrap.
+    """
+    from importlib.metadata import entry_points
+
+    args = []
+    for entry_point in entry_points(group="pytest11"):
+        args.extend(["-p", entry_point.value])
+    return tuple(args)
+
+
+def _pytest_command(
+    suite_name: str,
+    test_file: Union[str, list[str]],
+    markers: Optional[list[str]],
+    junit_dir: Optional[str],
+    plugin_args: tuple[str, ...],
+) -> tuple[list[str], Optional[dict], Path]:
+    """Build the pytest worker command line, environment and JUnit report path for a suite"""
+    test_files = test_file if isinstance(test_file, list) else [test_file]
+    safe_name = "".join(c if c.isalnum() else "_" for c in suite_name)
+    junit_path = Path(junit_dir or tempfile.gettempdir()) / f"{safe_name}.xml"
+
+    args = [sys.executable, "-m", "pytest", *plugin_args, *test_files, "--tb=short", "-q"]
+    args += ["-o", "junit_family=xunit1", f"--junitxml={junit_path}"]
+    if isinstance(test_file, list):
+        # One broken file must not abort the session and drop every other batched file from the report
+        args.append("--continue-on-collection-errors")
+        if importlib.util.find_spec("xdist") is not None:
+            # Spread batched files over pytest-xdist workers when it is installed
+            args += ["-n", "auto"]
+    if markers:
+        for marker in markers:
+            args.extend(["-m", marker])
+
+    env = {**os.environ, "PYTEST_DISABLE_PLUGIN_AUTOLOAD": "1"} if plugin_args else None
+    return args, env, junit_path
+
+
+def _suite_result(
+    suite_name: str, test_file: Union[str, list[str]], duration: float, exit_code: int, output: str, junit_path: Path
+) -> dict:
+    """Result dict for a finished pytest worker"""
+    return {
+        "name": suite_name,
+        "file": test_file,
+        "duration": duration,
+        "exit_code": exit_code,
+        # Exit code 5 means the markers selected no tests in this suite
+        "status": {0: "passed", 5: "skipped"}.get(exit_code, "failed"),
+        "output": output,
+        "junit": str(junit_path) if junit_path.exists() else None,
+    }
+
+
+def _spawn(
+    suite_name: str,
+    test_file: Union[str, list[str]],
+    markers: Optional[list[str]] = None,
+    junit_dir: Optional[str] = None,
+    plugin_args: tuple[str, ...] = (),
+) -> dict:
+    """Run a test suite in a fresh pytest subprocess and return its result"""
+    import subprocess
+
+    args, env, junit_path = _pytest_command(suite_name, test_file, markers, junit_dir, plugin_args)
+
+    start_ns = time.perf_counter_ns()
+    try:
+        proc = subprocess.run(args, capture_output=True, text=True, timeout=600, env=env, stdin=subprocess.DEVNULL)
+        exit_code = proc.returncode
+        output = proc.stdout + proc.stderr
+    except subprocess.TimeoutExpired as e:
+        exit_code = -1
+        output = f"Timed out after {e.timeout}s"
+
+    duration = (time.perf_counter_ns() - start_ns) / 1e9
+    return _suite_result(suite_name, test_file, duration, exit_code, output, junit_path)
+
+
+async def run_suite_async(
+    suite_name: str,
+    test_file: Union[str, list[str]],
+    markers: Optional[list[str]],
+    sem: asyncio.Semaphore,
+    junit_dir: Optional[str] = None,
+    plugin_args: tuple[str, ...] = (),
+) -> dict:
+    """Run a test suite in a pytest subprocess without blocking the event loop"""
+    args, env, junit_path = _pytest_command(suite_name, test_file, markers, junit_dir, plugin_args)
+
+    async with sem:
+        start_ns = time.perf_counter_ns()
+        # stdin must not be inherited, or a worker waiting on it would stall the run
+        proc = await asyncio.create_subprocess_exec(
+            *args,
+            stdin=asyncio.subprocess.DEVNULL,
+            stdout=asyncio.subprocess.PIPE,
+            stderr=asyncio.subprocess.STDOUT,
+            env=env,
+        )
+        try:
+            stdout, _ = await asyncio.wait_for(proc.communicate(), timeout=600)
+            exit_code = proc.returncode
+            output = stdout.decode(errors="replace")
+        except asyncio.TimeoutError:
+            proc.kill()
+            await proc.wait()
+            exit_code = -1
+            output = "Timed out after 600s"
+
+    duration = (time.perf_counter_ns() - start_ns) / 1e9
+    return _suite_result(suite_name, test_file, duration, exit_code, output, junit_path)
+
+
+async def run_suites_async(reporter: "TestReporter", suites: list[SuiteSpec], junit_dir: str):
+    """Run suites concurrently, at most one pytest worker per CPU, recording each as it finishes"""
+    sem = asyncio.Semaphore(os.cpu_count() or 1)
+    plugin_args = _plugin_args()
+    tasks = [
+        run_suite_async(suite_name, test_file, markers, sem, junit_dir, plugin_args)
+        for suite_name, test_file, markers in suites
+    ]
+    for next_result in asyncio.as_completed(tasks):
+        reporter.record_result(await next_result)
 
-        self.results["suites"][suite_name] = suite_result
 
-        return suite_result
+class TestReporter:
+    """Generate comprehensive test reports; use as a context manager, which owns the NDJSON log handle"""
+
+    def __init__(self, ndjson_path: str = "test_report.ndjson", use_cache: bool = True):
+        # Durations use the monotonic perf counter; the wall clock is read once here
+        self.results = {
+            "timestamp": time.time(),
+            "suites": {},
+            "summary": {"total_tests": 0, "passed": 0, "failed": 0, "skipped": 0, "duration": 0},
+        }
+
+        # Suite results are appended to an NDJSON log as they finish, so an
+        # interrupted run keeps its results and the next run resumes from them
+        self.ndjson_path = Path(ndjson_path)
+        self.completed = self._load_ndjson()
+        self.results["suites"].update(self.completed)
+        self._ndjson = None
+
+        self.use_cache = use_cache
+        self.memo_path = MEMO_DIR / "results.json"
+        self.memo = self._load_memo(self.memo_path)
+
+    def __enter__(self) -> "TestReporter":
+        self._ndjson = open(self.ndjson_path, "a", buffering=1, encoding="utf-8")
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def close(self):
+        """Close the NDJSON log; safe to call more than once"""
+        if self._ndjson is not None:
+            self._ndjson.close()
+            self._ndjson = None
+
+    def _load_memo(self, path: Path) -> dict:
+        """Load a JSON cache file from MEMO_DIR (empty when caching is off or the file is unreadable)"""
+        if not self.use_cache or not path.exists():
+            return {}
+        try:
+            return json.loads(path.read_text())
+        except (OSError, json.JSONDecodeError):
+            return {}
+
+    def pending(self, suites: list[SuiteSpec]) -> list[SuiteSpec]:
+        """Drop suites that already passed in an interrupted earlier run"""
+        passed = {name for name, result in self.completed.items() if result["status"] == "passed"}
+        remaining = []
+        for suite_name, test_file, markers in suites:
+            if isinstance(test_file, list):
+                test_file = [f for f in test_file if f"{suite_name}: {Path(f).stem}" not in passed]
+                if test_file:
+                    remaining.append((suite_name, test_file, markers))
+            elif suite_name not in passed:
+                remaining.append((suite_name, test_file, markers))
+        return remaining
+
+    def replay_cached(self, suites: list[SuiteSpec]) -> list[SuiteSpec]:
+        """Replay passing results for suites whose sources are unchanged since they last passed"""
+        if not self.use_cache:
+            return suites
+
+        def is_cached(suite_name: str, test_file: str) -> bool:
+            entry = self.memo.get(suite_name)
+            if not entry or entry["key"] != _source_hash(test_file):
+                return False
+            self._store_suite({**entry["result"], "duration": 0.0, "cached": True})
+            return True
+
+        remaining = []
+        for suite_name, test_file, markers in suites:
+            if isinstance(test_file, list):
+                test_file = [f for f in test_file if not is_cached(f"{suite_name}: {Path(f).stem}", f)]
+                if test_file:
+                    remaining.append((suite_name, test_file, markers))
+            elif not is_cached(suite_name, test_file):
+                remaining.append((suite_name, test_file, markers))
+
+        cached = sum(1 for s in self.results["suites"].values() if s.get("cached"))
+        if cached:
+            print(f"♻️ Reusing {cached} cached suite results (sources unchanged)")
+        return remaining
+
+    def run_test_suite(self, suite_name: str, test_file: str, markers: Optional[list[str]] = None) -> dict:
+        """Run a single test suite in a subprocess and collect results"""
+        with tempfile.TemporaryDirectory() as junit_dir:
+            return self.record_result(_spawn(suite_name, test_file, markers, junit_dir, _plugin_args()))
+
+    def record_result(self, result: dict) -> dict:
+        """Store the result returned by a pytest worker"""
+        status_emoji = {"passed": "✅", "skipped": "⏭️"}.get(result["status"], "❌")
+        print(f"{status_emoji} {result['name']:30} {result['duration']:.2f}s")
+        output = result.pop("output", "")
+        if result["status"] == "failed":
+            print(output.rstrip()[-2000:])
+
+        junit_path = result.pop("junit", None)
+        if isinstance(result["file"], list):
+            if result["status"] == "skipped":
+                for test_file in result["file"]:
+                    self._store_suite(
+                        {
+                            "name": f"{result['name']}: {Path(test_file).stem}",
+                            "file": test_file,
+                            "duration": 0.0,
+                            "exit_code": 5,
+                            "status": "skipped",
+                            "tests": self._sum_counts([]),
+                        }
+                    )
+                return result
+
+            if junit_path:
+                self.ingest_junit(junit_path, prefix=result["name"])
+                return result
+
+            # No report at all (timed out or killed): record the whole batch as failed rather than dropping it
+            result.update(status="failed", output=output.rstrip()[-2000:], tests=self._sum_counts([]))
+            self._store_suite(result)
+            return result
+
+        if junit_path:
+            result["tests"] = self._sum_counts(self._parse_junit(junit_path).values())
+        self._store_suite(result)
+        return result
+
+    def ingest_junit(self, junit_path: str, prefix: str = "Unit") -> dict:
+        """Aggregate per-file suite results from a JUnit XML report."""
+        per_file = self._parse_junit(junit_path)
+
+        for test_file, entry in per_file.items():
+            suite_name = f"{prefix}: {Path(test_file).stem}"
+            self._store_suite(
+                {
+                    "name": suite_name,
+                    "file": test_file,
+                    "duration": entry["duration"],
+                    "exit_code": 1 if entry["failed"] else 0,
+                    "status": "failed" if entry["failed"] else "passed",
+                    "tests": self._sum_counts([entry]),
+                }
+            )
+
+        return per_file
+
+    def _store_suite(self, suite_result: dict):
+        """Record a finished suite and append it to the NDJSON log"""
+        self.results["suites"][suite_result["name"]] = suite_result
+        self._ndjson.write(json.dumps(suite_result, separators=(",", ":")) + "\n")
+
+        if self.use_cache and suite_result["status"] == "passed" and not suite_result.get("cached"):
+            self.memo[suite_result["name"]] = {"key": _source_hash(suite_result["file"]), "result": suite_result}
+
+    def _load_ndjson(self) -> dict:
+        """Load suite results from the NDJSON log, keyed by suite name"""
+        suites = {}
+        if not self.ndjson_path.exists():
+            return suites
+
+        with open(self.ndjson_path, encoding="utf-8") as f:
+            for line in f:
+                try:
+                    suite_result = json.loads(line)
+                except json.JSONDecodeError:
+                    # A run killed mid-write can leave a truncated last line
+                    continue
+                suites[suite_result["name"]] = suite_result
+
+        return suites
+
+    def _parse_junit(self, junit_path: str) -> dict:
+        """Stream testcases from a JUnit XML report and count outcomes per file.
+
+        Testcases are streamed with ``iterparse`` so large reports never need to
+        be held in memory as a full tree.
+        """
+        import xml.etree.ElementTree as ET
+
+        per_file = {}
+
+        for _event, elem in ET.iterparse(junit_path, events=("end",)):
+            if elem.tag != "testcase":
+                continue
+
+            test_file = elem.get("file") or elem.get("classname", "").split(".")[-1]
+            entry = per_file.setdefault(
+                test_file, {"duration": 0.0, "total_tests": 0, "passed": 0, "failed": 0, "skipped": 0}
+            )
+            entry["duration"] += float(elem.get("time", 0) or 0)
+            entry["total_tests"] += 1
+
+            outcome_tags = {child.tag for child in elem}
+            if outcome_tags & {"failure", "error"}:
+                entry["failed"] += 1
+            elif "skipped" in outcome_tags:
+                entry["skipped"] += 1
+            else:
+                entry["passed"] += 1
+
+            elem.clear()
+
+        return per_file
+
+    def _sum_counts(self, entries) -> dict:
+        """Sum test counts across per-file entries"""
+        counts = {"total_tests": 0, "passed": 0, "failed": 0, "skipped": 0}
+        for entry in entries:
+            for key in counts:
+                counts[key] += entry[key]
+        return counts
 
     def generate_report(self) -> str:
         """Generate final test report"""
@@ -64,7 +455,7 @@ class TestReporter:
         report.append("\n" + "=" * 80)
         report.append("xtool MCP SERVER - COMPREHENSIVE TEST REPORT")
         report.append("=" * 80)
-        report.append(f"Timestamp: {self.results['timestamp']}")
+        report.append(f"Timestamp: {time.strftime('%Y-%m-%d %H:%M:%S', time.localtime(self.results['timestamp']))}")
         report.append("")
 
         # Suite results
@@ -72,9 +463,11 @@ class TestReporter:
         report.append("-" * 40)
 
         total_duration = 0
+        status_emojis = {"passed": "✅", "skipped": "⏭️"}
         for suite_name, suite_result in self.results["suites"].items():
-            status_emoji = "✅" if suite_result["status"] == "passed" else "❌"
-            report.append(f"{status_emoji} {suite_name:30} {suite_result['duration']:.2f}s")
+            status_emoji = status_emojis.get(suite_result["status"], "❌")
+            cached = " (cached)" if suite_result.get("cached") else ""
+            report.append(f"{status_emoji} {suite_name:30} {suite_result['duration']:.2f}s{cached}")
             total_duration += suite_result["duration"]
 
         # Summary
@@ -83,13 +476,16 @@ class TestReporter:
         report.append("-" * 40)
 
         passed_suites = sum(1 for s in self.results["suites"].values() if s["status"] == "passed")
-        total_suites = len(self.results["suites"])
+        skipped_suites = sum(1 for s in self.results["suites"].values() if s["status"] == "skipped")
+        total_suites = len(self.results["suites"]) - skipped_suites
 
         report.append(f"Total Test Suites: {total_suites}")
         report.append(f"Passed: {passed_suites}")
         report.append(f"Failed: {total_suites - passed_suites}")
+        if skipped_suites:
+            report.append(f"Skipped (no selected tests): {skipped_suites}")
         report.append(f"Total Duration: {total_duration:.2f}s")
-        report.append(f"Success Rate: {(passed_suites / total_suites * 100):.1f}%")
+        report.append(f"Success Rate: {(passed_suites / max(total_suites, 1) * 100):.1f}%")
 
         # Recommendations
         report.append("")
@@ -108,71 +504,86 @@ class TestReporter:
 
         return "\n".join(report)
 
-    def save_report(self, filepath: str = "test_report.json"):
-        """Save detailed report to file"""
-        with open(filepath, "w") as f:
-            json.dump(self.results, f, indent=2)
-        print(f"\nDetailed report saved to: {filepath}")
+    def save_report(self, filepath: str = "test_report.json", finished: bool = True):
+        """Consolidate the NDJSON log into the detailed report file
 
+        An unfinished run keeps its NDJSON log so the next run can resume from it.
+        """
+        self.close()
+        suites = self._load_ndjson()
 
-def run_unit_tests(reporter: TestReporter):
-    """Run unit test suites"""
-    print("\n🧪 RUNNING UNIT TESTS")
+        summary = self._sum_counts(s["tests"] for s in suites.values() if "tests" in s)
+        summary["duration"] = sum(s["duration"] for s in suites.values())
+        self.results["suites"] = suites
+        self.results["summary"] = summary
 
-    # Find all unit test files
-    test_dir = Path(__file__).parent
-    unit_test_files = [
-        f
-        for f in test_dir.glob("test_*.py")
-        if f.name
-        not in [
-            "test_integration_comprehensive.py",
-            "test_e2e_mcp_protocol.py",
-            "test_performance_stress.py",
-            "test_cross_tool_collaboration.py",
-            "run_comprehensive_tests.py",
-        ]
-    ]
+        try:
+            import orjson
+        except ImportError:
+            orjson = None
+
+        if orjson is not None:
+            payload = orjson.dumps(self.results, option=orjson.OPT_INDENT_2)
+        else:
+            payload = json.dumps(self.results, indent=2).encode()
+        Path(filepath).write_bytes(payload)
+
+        # The run is complete, so the next one starts fresh
+        if finished:
+            self.ndjson_path.unlink(missing_ok=True)
+
+        if self.use_cache:
+            MEMO_DIR.mkdir(exist_ok=True)
+            self.memo_path.write_text(json.dumps(self.memo))
+        print(f"\nDetailed report saved to: {filepath}")
 
-    for test_file in unit_test_files:
-        suite_name = f"Unit: {test_file.stem}"
-        reporter.run_test_suite(suite_name, str(test_file), markers=["not integration"])
 
+def run_unit_tests() -> list[SuiteSpec]:
+    """Collect unit test suites"""
+    # Find all unit test files
+    test_dir = _HERE
+    unit_test_files = _discover(str(test_dir), test_dir.stat().st_mtime)
+
+    if not unit_test_files:
+        return []
 
-def run_integration_tests(reporter: TestReporter):
-    """Run integration test suites"""
-    print("\n🔗 RUNNING INTEGRATION TESTS")
+    # All unit files share one pytest session so the bootstrap cost (plugin
+    # loading, conftest import) is paid once; the JUnit report is split back
+    # into per-file suites afterwards.
+    return [("Unit", list(unit_test_files), ["not integration"])]
 
-    test_file = Path(__file__).parent / "test_integration_comprehensive.py"
-    if test_file.exists():
-        reporter.run_test_suite("Integration: Comprehensive", str(test_file))
 
+def run_integration_tests() -> list[SuiteSpec]:
+    """Collect integration test suites"""
+    test_file = _HERE / "test_integration_comprehensive.py"
+    return [("Integration: Comprehensive", str(test_file), None)] if test_file.exists() else []
 
-def run_e2e_tests(reporter: TestReporter):
-    """Run end-to-end test suites"""
-    print("\n🚀 RUNNING END-TO-END TESTS")
 
-    test_file = Path(__file__).parent / "test_e2e_mcp_protocol.py"
-    if test_file.exists():
-        reporter.run_test_suite("E2E: MCP Protocol", str(test_file))
+def run_e2e_tests() -> list[SuiteSpec]:
+    """Collect end-to-end test suites"""
+    test_file = _HERE / "test_e2e_mcp_protocol.py"
+    return [("E2E: MCP Protocol", str(test_file), None)] if test_file.exists() else []
 
 
-def run_performance_tests(reporter: TestReporter):
-    """Run performance test suites"""
-    print("\n⚡ RUNNING PERFORMANCE TESTS")
+def run_performance_tests() -> list[SuiteSpec]:
+    """Collect performance test suites"""
+    test_file = _HERE / "test_performance_stress.py"
+    return [("Performance: Stress Tests", str(test_file), None)] if test_file.exists() else []
 
-    test_file = Path(__file__).parent / "test_performance_stress.py"
-    if test_file.exists():
-        reporter.run_test_suite("Performance: Stress Tests", str(test_file))
 
+def run_collaboration_tests() -> list[SuiteSpec]:
+    """Collect cross-tool collaboration test suites"""
+    test_file = _HERE / "test_cross_tool_collaboration.py"
+    return [("Collaboration: Cross-Tool", str(test_file), None)] if test_file.exists() else []
 
-def run_collaboration_tests(reporter: TestReporter):
-    """Run cross-tool collaboration tests"""
-    print("\n🤝 RUNNING COLLABORATION TESTS")
 
-    test_file = Path(__file__).parent / "test_cross_tool_collaboration.py"
-    if test_file.exists():
-        reporter.run_test_suite("Collaboration: Cross-Tool", str(test_file))
+SUITE_COLLECTORS = {
+    "unit": run_unit_tests,
+    "integration": run_integration_tests,
+    "e2e": run_e2e_tests,
+    "performance": run_performance_tests,
+    "collaboration": run_collaboration_tests,
+}
 
 
 def check_environment():
@@ -184,13 +595,11 @@ def check_environment():
     # Check Python version
 
     # Check for API keys (at least one should be set)
-    api_keys = ["OPENAI_API_KEY", "GEMINI_API_KEY", "OPENROUTER_API_KEY", "CUSTOM_API_URL"]
-
-    if not any(os.getenv(key) for key in api_keys):
+    if not any(os.environ[key] for key in os.environ.keys() & _API_KEYS):
         issues.append("No API keys configured. At least one API key required for AI-based tests.")
 
     # Check test directory
-    test_dir = Path(__file__).parent
+    test_dir = _HERE
     if not test_dir.exists():
         issues.append(f"Test directory not found: {test_dir}")
 
@@ -207,55 +616,66 @@ def check_environment():
 
 def main():
     """Main test runner"""
+    parser = argparse.ArgumentParser(description="Run all xtool MCP Server test suites")
+    parser.add_argument("--no-cache", action="store_true", help="Re-run suites even if their sources are unchanged")
+    parser.add_argument("--force", action="store_true", help="Run tests even if the environment check fails")
+    parser.add_argument("--with-perf", action="store_true", help="Include the (slower) performance tests")
+    parser.add_argument(
+        "--suites",
+        nargs="*",
+        choices=list(SUITE_COLLECTORS),
+        help="Only run these suite groups (default: all, performance only with --with-perf)",
+    )
+    args = parser.parse_args()
+
     print("🚀 xtool MCP Server - Comprehensive Test Suite")
     print("=" * 60)
 
     # Check environment
     env_ok = check_environment()
-    if not env_ok:
+    if not env_ok and not args.force:
+        # Only prompt when a human is attached; unattended runs need --force
+        if not sys.stdin.isatty():
+            print("Tests cancelled. Use --force to run anyway.")
+            sys.exit(1)
         response = input("\nContinue with tests anyway? (y/n): ")
         if response.lower() != "y":
             print("Tests cancelled.")
             return
 
-    # Create reporter
-    reporter = TestReporter()
-
-    # Run test suites in order
-    start_time = time.time()
-
-    try:
-        # 1. Unit tests first (fastest, no external dependencies)
-        run_unit_tests(reporter)
-
-        # 2. Integration tests (may require API keys)
-        run_integration_tests(reporter)
-
-        # 3. E2E tests (full protocol testing)
-        run_e2e_tests(reporter)
-
-        # 4. Performance tests (may take longer)
-        response = input("\nRun performance tests? These may take longer (y/n): ")
-        if response.lower() == "y":
-            run_performance_tests(reporter)
-
-        # 5. Collaboration tests
-        run_collaboration_tests(reporter)
-
-    except KeyboardInterrupt:
-        print("\n\n⚠️ Test run interrupted by user")
-    except Exception as e:
-        print(f"\n\n❌ Test run failed with error: {e}")
-
-    # Generate and display report
-    total_duration = time.time() - start_time
-    print(f"\n\nTotal test duration: {total_duration:.2f}s")
-
-    report = reporter.generate_report()
-    print(report)
-
-    # Save detailed report
-    reporter.save_report("test_report.json")
+    # Create reporter; leaving the block closes its NDJSON log even if the run errors out
+    with TestReporter(use_cache=not args.no_cache) as reporter:
+        # Collect suites in order: unit tests first (fastest, no external
+        # dependencies), then integration, E2E, performance and collaboration
+        groups = args.suites or [g for g in SUITE_COLLECTORS if g != "performance" or args.with_perf]
+        suites = [spec for group in SUITE_COLLECTORS if group in groups for spec in SUITE_COLLECTORS[group]()]
+        suites = reporter.replay_cached(reporter.pending(suites))
+
+        # Each suite runs in its own pytest subprocess, so suites are isolated from
+        # each other's imports and plugin state and their run times overlap
+        start_ns = time.perf_counter_ns()
+        finished = False
+
+        try:
+            print(f"\n🧪 RUNNING {len(suites)} TEST SUITES")
+            with tempfile.TemporaryDirectory() as junit_dir:
+                asyncio.run(run_suites_async(reporter, suites, junit_dir))
+            finished = True
+
+        except KeyboardInterrupt:
+            print("\n\n⚠️ Test run interrupted by user")
+        except Exception as e:
+            print(f"\n\n❌ Test run failed with error: {e}")
+
+        # Generate and display report
+        total_duration = (time.perf_counter_ns() - start_ns) / 1e9
+        print(f"\n\nTotal test duration: {total_duration:.2f}s")
+
+        report = reporter.generate_report()
+        print(report)
+
+        # Save detailed report
+        reporter.save_report("test_report.json", finished=finished)
 
     # Exit with appropriate code
     failed_suites = sum(1 for s in reporter.results["suites"].values() if s["status"] == "failed")
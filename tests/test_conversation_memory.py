@@ -5,7 +5,9 @@ Tests the Redis-based conversation persistence needed for AI-to-AI multi-turn
 discussions in stateless MCP environments.
 """
 
+import json
 import os
+import time
 from unittest.mock import Mock, patch
 
 import pytest
@@ -16,10 +18,17 @@ from utils.conversation_memory import (
     MAX_CONVERSATION_TURNS,
     ConversationTurn,
     ThreadContext,
+    _load_memory_layer,
+    _save_memory_layer,
+    _scan_environment,
     add_turn,
     build_conversation_history,
     create_thread,
+    detect_environment,
+    flush_memory,
     get_thread,
+    recall_memory,
+    save_memory,
 )
 
 
@@ -694,66 +703,206 @@ class TestConversationFlow:
         assert len(retrieved_context.turns) == 1
 
     @patch.dict(os.environ, {"GEMINI_API_KEY": "test-key", "OPENAI_API_KEY": ""}, clear=False)
-    def test_token_limit_optimization_in_conversation_history(self):
+    def test_token_limit_optimization_in_conversation_history(self, tmp_path):
         """Test that build_conversation_history efficiently handles token limits"""
-        import os
-        import tempfile
-
         from providers.registry import ModelProviderRegistry
 
         ModelProviderRegistry.clear_cache()
 
         from utils.conversation_memory import build_conversation_history
 
-        # Create test files with known content sizes
-        with tempfile.TemporaryDirectory() as temp_dir:
-            # Create small and large test files
-            small_file = os.path.join(temp_dir, "small.py")
-            large_file = os.path.join(temp_dir, "large.py")
+        # Create small and large test files with known content sizes
+        small_file = str(tmp_path / "small.py")
+        large_file = str(tmp_path / "large.py")
 
-            small_content = "# Small file\nprint('hello')\n"
-            large_content = "# Large file\n" + "x = 1\n" * 10000  # Very large file
+        small_content = "# Small file\nprint('hello')\n"
+        large_content = "# Large file\n" + "x = 1\n" * 10000  # Very large file
 
-            with open(small_file, "w") as f:
-                f.write(small_content)
-            with open(large_file, "w") as f:
-                f.write(large_content)
+        with open(small_file, "w") as f:
+            f.write(small_content)
+        with open(large_file, "w") as f:
+            f.write(large_content)
 
-            # Create context with files that would exceed token limit
-            context = ThreadContext(
-                thread_id="test-token-limit",
-                created_at="2023-01-01T00:00:00Z",
-                last_updated_at="2023-01-01T00:01:00Z",
-                tool_name="analyze",
-                turns=[
-                    ConversationTurn(
-                        role="user",
-                        content="Analyze these files",
-                        timestamp="2023-01-01T00:00:30Z",
-                        files=[small_file, large_file],  # Large file should be truncated
-                    )
-                ],
-                initial_context={"prompt": "Analyze code"},
-            )
+        # Create context with files that would exceed token limit
+        context = ThreadContext(
+            thread_id="test-token-limit",
+            created_at="2023-01-01T00:00:00Z",
+            last_updated_at="2023-01-01T00:01:00Z",
+            tool_name="analyze",
+            turns=[
+                ConversationTurn(
+                    role="user",
+                    content="Analyze these files",
+                    timestamp="2023-01-01T00:00:30Z",
+                    files=[small_file, large_file],  # Large file should be truncated
+                )
+            ],
+            initial_context={"prompt": "Analyze code"},
+        )
 
-            # Build conversation history (should handle token limits gracefully)
-            history, tokens = build_conversation_history(context, model_context=None)
+        # Build conversation history (should handle token limits gracefully)
+        history, tokens = build_conversation_history(context, model_context=None)
+
+        # Verify the history was built successfully
+        assert "=== CONVERSATION HISTORY" in history
+        assert "=== FILES REFERENCED IN THIS CONVERSATION ===" in history
 
-            # Verify the history was built successfully
-            assert "=== CONVERSATION HISTORY" in history
-            assert "=== FILES REFERENCED IN THIS CONVERSATION ===" in history
-
-            # The small file should be included, but large file might be truncated
-            # At minimum, verify no crashes and history is generated
-            assert len(history) > 0
-
-            # If truncation occurred, there should be a note about it
-            if "additional file(s) were truncated due to token limit" in history:
-                assert small_file in history or large_file in history
-            else:
-                # Both files fit within limit
-                assert small_file in history
-                assert large_file in history
+        # The small file should be included, but large file might be truncated
+        # At minimum, verify no crashes and history is generated
+        assert len(history) > 0
+
+        # If truncation occurred, there should be a note about it
+        if "additional file(s) were truncated due to token limit" in history:
+            assert small_file in history or large_file in history
+        else:
+            # Both files fit within limit
+            assert small_file in history
+            assert large_file in history
+
+
+class _FakeStorage:
+    """Records setex calls; all the session layer needs from the storage backend"""
+
+    def __init__(self):
+        self.calls = []
+
+    def setex(self, key, ttl, value):
+        self.calls.append((key, ttl, value))
+
+
+class TestMemoryLayerPersistence:
+    """Test the append-only JSONL log behind the persisted memory layers"""
+
+    def test_save_memory_appends_one_line_per_save(self, memory_store):
+        """Each save adds a single JSONL record instead of rewriting the layer, written behind in batches"""
+        with patch("utils.conversation_memory.MEMORY_FLUSH_DELAY", 60):
+            for i in range(3):
+                save_memory(f"content {i}", layer="global", key=f"k{i}")
+        # The first save starts the log; the others are queued but already visible to readers
+        assert len((memory_store / "global_memory.jsonl").read_bytes().splitlines()) == 1
+        assert set(_load_memory_layer("global")) == {"k0", "k1", "k2"}
+        flush_memory()
+
+        lines = (memory_store / "global_memory.jsonl").read_bytes().splitlines()
+        assert [json.loads(line)["key"] for line in lines] == ["k0", "k1", "k2"]
+        assert set(_load_memory_layer("global")) == {"k0", "k1", "k2"}
+
+    @pytest.mark.parametrize("mmap_min_bytes", [4096, 0], ids=["buffered", "mmap"])
+    def test_later_record_wins_and_torn_line_is_skipped(self, memory_store, mmap_min_bytes, monkeypatch):
+        """Replaying the log keeps the newest entry per key and ignores a partial write"""
+        monkeypatch.setattr("utils.conversation_memory.MEMORY_LOG_MMAP_MIN_BYTES", mmap_min_bytes)
+        save_memory("old", layer="global", key="k")
+        save_memory("other", layer="global", key="k2")
+        save_memory("new", layer="global", key="k")
+        flush_memory()
+        with open(memory_store / "global_memory.jsonl", "ab") as f:
+            f.write(b'{"key": "broken", "ent')
+
+        data = _load_memory_layer("global")
+        assert data["k"]["content"] == "new"
+        assert "broken" not in data
+
+    @pytest.mark.parametrize("memory_store", [{"global": {"max_items": 2}}], indirect=True)
+    def test_eviction_is_fifo_and_log_stays_bounded(self, memory_store):
+        """Exceeding max_items drops the oldest entry, and stale records are compacted away"""
+        for i in range(3):
+            save_memory(f"content {i}", layer="global", key=f"k{i}")
+
+        assert list(_load_memory_layer("global")) == ["k1", "k2"]
+        flush_memory()
+        lines = (memory_store / "global_memory.jsonl").read_bytes().splitlines()
+        assert json.loads(lines[-2]) == {"key": "k0", "deleted": True}
+
+        # Re-saving a key makes it the newest, so the other one is evicted next
+        save_memory("content 1 again", layer="global", key="k1")
+        save_memory("content 3", layer="global", key="k3")
+        assert list(_load_memory_layer("global")) == ["k1", "k3"]
+        flush_memory()
+        assert len((memory_store / "global_memory.jsonl").read_bytes().splitlines()) <= 4
+
+    @pytest.mark.parametrize("memory_store", [{"global": {"max_items": 2, "eviction": "lfu"}}], indirect=True)
+    def test_lfu_eviction_keeps_recalled_memories(self, memory_store):
+        """With the opt-in LFU policy the least recalled entry is evicted instead of the oldest"""
+        save_memory("hot", layer="global", key="hot")
+        save_memory("cold", layer="global", key="cold")
+        recall_memory(query="hot", layer="global")
+
+        save_memory("new", layer="global", key="new")
+
+        assert list(_load_memory_layer("global")) == ["hot", "new"]
+
+    def test_external_layer_write_is_seen_by_next_save(self, memory_store):
+        """save_memory's cached layer is dropped when the layer is rewritten elsewhere"""
+        save_memory("a", layer="global", key="a")
+        _save_memory_layer("global", {})
+        save_memory("b", layer="global", key="b")
+
+        assert list(_load_memory_layer("global")) == ["b"]
+
+    def test_load_layer_is_cached_and_returns_private_copies(self, memory_store):
+        """Repeated loads skip re-parsing the log, and mutating a loaded layer leaves the cache intact"""
+        save_memory("a", layer="global", metadata={"tags": ["x"]}, key="a")
+
+        with patch("utils.conversation_memory._read_memory_log") as read_log:
+            first = _load_memory_layer("global")
+            first["a"]["metadata"]["tags"].append("y")
+            del first["a"]
+            assert _load_memory_layer("global")["a"]["metadata"]["tags"] == ["x"]
+        read_log.assert_not_called()
+
+        save_memory("b", layer="global", key="b")
+        assert list(_load_memory_layer("global")) == ["a", "b"]
+
+    def test_recall_uses_indexes_and_stays_current(self, memory_store):
+        """Filtered and substring recall match the plain scan, including entries saved after indexing"""
+        save_memory("Fix the login bug", layer="global", metadata={"type": "bug"}, key="bug1")
+        save_memory("New architecture notes", layer="global", metadata={"type": "design"}, key="arch")
+        assert [m["key"] for m in recall_memory(filters={"type": "bug"}, layer="global")] == ["bug1"]
+
+        save_memory("Another bug in the architecture", layer="global", metadata={"type": "bug"}, key="bug2")
+        save_memory("Login bug fixed differently", layer="global", metadata={"type": "note"}, key="bug1")
+
+        assert [m["key"] for m in recall_memory(filters={"type": "bug"}, layer="global")] == ["bug2"]
+        assert {m["key"] for m in recall_memory(query="ARCHITECTURE", layer="global")} == {"arch", "bug2"}
+        assert recall_memory(query="nothing like this", layer="global") == []
+
+    def test_session_memory_is_recalled_until_it_expires(self, memory_store):
+        """Session saves still go to the storage backend and are recalled from the in-process cache"""
+        fake = _FakeStorage()
+        with patch("utils.conversation_memory.get_storage", return_value=fake):
+            save_memory("scratch note", layer="session", metadata={"type": "note"}, key="s1")
+
+        assert [call[0] for call in fake.calls] == ["session_memory:s1"]
+        assert [m["key"] for m in recall_memory(query="scratch", layer="session")] == ["s1"]
+
+        with patch("utils.conversation_memory.time.monotonic", return_value=time.monotonic() + 10**9):
+            assert recall_memory(layer="session") == []
+
+    def test_detect_environment_rescans_only_when_project_changes(self, memory_store, tmp_path):
+        """The filesystem scan is memoized until the project root or .git/HEAD changes"""
+        project = tmp_path / "proj"
+        (project / ".git").mkdir(parents=True)
+        (project / ".git" / "HEAD").write_text("ref: refs/heads/main\n")
+        _scan_environment.cache_clear()
+
+        first = detect_environment(str(project))
+        assert first["git_info"] == {"branch": "main"}
+        assert first["files"] == {}
+        detect_environment(str(project))
+        assert _scan_environment.cache_info().hits == 1
+
+        (project / "README.md").write_text("# proj\n")
+        assert "README.md" in detect_environment(str(project))["files"]
+        assert _scan_environment.cache_info().misses == 2
+
+    def test_legacy_json_layer_is_migrated(self, memory_store):
+        """A pre-JSONL layer file is still read and carried into the new log"""
+        legacy = {"old": {"content": "kept", "metadata": {}, "timestamp": "2024-01-01T00:00:00+00:00"}}
+        (memory_store / "project_memory.json").write_text(json.dumps(legacy), encoding="utf-8")
+
+        save_memory("fresh", layer="project", key="new")
+
+        assert set(_load_memory_layer("project")) == {"old", "new"}
 
 
 if __name__ == "__main__":
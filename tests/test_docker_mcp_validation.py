@@ -3,7 +3,9 @@ Validation test for Docker MCP implementation
 """
 
 import json
+import mmap
 import os
+import re
 import subprocess
 import sys
 import tempfile
@@ -12,24 +14,34 @@ from unittest.mock import patch
 
 import pytest
 
+_PROJECT_ROOT = Path(__file__).resolve().parent.parent
+_DOCKERFILE = _PROJECT_ROOT / "Dockerfile"
+
 # Add project root to path
-sys.path.insert(0, str(Path(__file__).parent.parent))
+sys.path.insert(0, str(_PROJECT_ROOT))
+
+# KEY=value assignments, skipping comment lines
+_ENV_RE = re.compile(rb"(?m)^(?!\s*#)([A-Za-z_][A-Za-z0-9_]*)=(.*)$")
+
+# Any instruction that sets up a non-root user
+_USER_RE = re.compile(r"\b(?:USER |useradd|adduser)\b")
 
 
 class TestDockerMCPValidation:
     """Validation tests for Docker MCP"""
 
-    @pytest.fixture(autouse=True)
-    def setup(self):
-        """Automatic setup for each test"""
-        self.project_root = Path(__file__).parent.parent
-        self.dockerfile_path = self.project_root / "Dockerfile"
+    @pytest.fixture(autouse=True, scope="class")
+    @classmethod
+    def setup(cls):
+        """Automatic setup, once per class"""
+        cls.project_root = _PROJECT_ROOT
+        cls.dockerfile_path = _DOCKERFILE
 
-    def test_dockerfile_exists_and_valid(self):
+    def test_dockerfile_exists_and_valid(self, project_files):
         """Test Dockerfile existence and validity"""
         assert self.dockerfile_path.exists(), "Missing Dockerfile"
 
-        content = self.dockerfile_path.read_text()
+        content = project_files["dockerfile"]
         assert "FROM python:" in content, "Python base required"
         assert "server.py" in content, "server.py must be copied"
 
@@ -46,27 +58,27 @@ class TestDockerMCPValidation:
 
     def test_environment_variables_validation(self):
         """Test environment variables validation"""
-        required_vars = ["GEMINI_API_KEY", "OPENAI_API_KEY", "XAI_API_KEY"]
+        required_vars = frozenset({"GEMINI_API_KEY", "OPENAI_API_KEY", "XAI_API_KEY"})
 
         # Test with variable present
         with patch.dict(os.environ, {"GEMINI_API_KEY": "test"}):
-            has_key = any(os.getenv(var) for var in required_vars)
+            has_key = bool(os.environ.keys() & required_vars)
             assert has_key, "At least one API key required"
 
         # Test without variables
         with patch.dict(os.environ, {}, clear=True):
-            has_key = any(os.getenv(var) for var in required_vars)
+            has_key = bool(os.environ.keys() & required_vars)
             assert not has_key, "No key should be present"
 
-    def test_docker_security_configuration(self):
+    def test_docker_security_configuration(self, project_files):
         """Test Docker security configuration"""
-        if not self.dockerfile_path.exists():
+        if project_files["dockerfile"] is None:
             pytest.skip("Dockerfile not found")
 
-        content = self.dockerfile_path.read_text()
+        content = project_files["dockerfile"]
 
         # Check non-root user
-        has_user_config = "USER " in content or "useradd" in content or "adduser" in content
+        has_user_config = bool(_USER_RE.search(content))
 
         # Note: The test can be adjusted according to implementation
         if has_user_config:
@@ -76,34 +88,38 @@ class TestDockerMCPValidation:
             pytest.warns(UserWarning, "Consider adding a non-root user")
 
 
-class TestDockerIntegration:
-    """Docker-MCP integration tests"""
-
-    @pytest.fixture
-    def temp_env_file(self):
-        """Fixture for temporary .env file"""
-        content = """GEMINI_API_KEY=test_key
+@pytest.fixture(scope="session")
+def temp_env_file():
+    """Fixture for temporary .env file, created once per test session"""
+    content = """GEMINI_API_KEY=test_key
 LOG_LEVEL=INFO
 DEFAULT_MODEL=auto
 """
-        with tempfile.NamedTemporaryFile(mode="w", suffix=".env", delete=False, encoding="utf-8") as f:
-            f.write(content)
-            temp_file_path = f.name
+    with tempfile.NamedTemporaryFile(mode="w", suffix=".env", delete=False, encoding="utf-8") as f:
+        f.write(content)
+        temp_file_path = f.name
 
-        # File is now closed, can yield
-        yield temp_file_path
-        os.unlink(temp_file_path)
+    # File is now closed, can yield
+    yield temp_file_path
+    os.unlink(temp_file_path)
+
+
+class TestDockerIntegration:
+    """Docker-MCP integration tests"""
 
     def test_env_file_parsing(self, temp_env_file):
         """Test .env file parsing"""
         env_vars = {}
 
-        with open(temp_env_file, encoding="utf-8") as f:
-            for line in f:
-                line = line.strip()
-                if line and not line.startswith("#") and "=" in line:
-                    key, value = line.split("=", 1)
-                    env_vars[key] = value
+        # Scan the mapped file so only the matched key/value spans are decoded
+        with open(temp_env_file, "rb") as f:
+            if hasattr(mmap, "mmap"):
+                with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as data:
+                    for m in _ENV_RE.finditer(data):
+                        env_vars[m.group(1).decode("ascii")] = m.group(2).decode("utf-8").strip()
+            else:
+                for m in _ENV_RE.finditer(f.read()):
+                    env_vars[m.group(1).decode("ascii")] = m.group(2).decode("utf-8").strip()
 
         assert "GEMINI_API_KEY" in env_vars
         assert env_vars["GEMINI_API_KEY"] == "test_key"
@@ -122,60 +138,39 @@ DEFAULT_MODEL=auto
         assert "id" in parsed
 
 
-class TestDockerPerformance:
-    """Docker performance tests"""
+# Simulated values - in reality, Docker would be queried. Replace these with
+# real probes to turn the tests below into live checks.
+SIMULATED_METRICS = [
+    # (metric, observed, maximum)
+    ("image_mb", 294, 500),
+    ("startup_s", 3, 10),
+]
 
-    def test_image_size_expectation(self):
-        """Test expected image size"""
-        # Maximum expected size (in MB)
-        max_size_mb = 500
+SIMULATED_COMPONENTS = {
+    "dockerfile": True,
+    "mcp_config": True,
+    "env_template": True,
+    "documentation": True,
+}
 
-        # Simulation - in reality, Docker would be queried
-        simulated_size = 294  # MB observed
 
-        assert simulated_size <= max_size_mb, f"Image too large: {simulated_size}MB > {max_size_mb}MB"
-
-    def test_startup_performance(self):
-        """Test startup performance"""
-        max_startup_seconds = 10
-        simulated_startup = 3  # seconds
+class TestDockerPerformance:
+    """Docker performance tests"""
 
-        assert simulated_startup <= max_startup_seconds, f"Startup too slow: {simulated_startup}s"
+    @pytest.mark.parametrize("metric,actual,limit", SIMULATED_METRICS)
+    def test_perf_thresholds(self, metric, actual, limit):
+        """Test image size and startup time stay within limits"""
+        assert actual <= limit, f"{metric} too high: {actual} > {limit}"
 
 
 @pytest.mark.integration
 class TestFullIntegration:
     """Full integration tests"""
 
-    def test_complete_setup_simulation(self):
-        """Simulate complete setup"""
-        # Simulate all required components
-        components = {
-            "dockerfile": True,
-            "mcp_config": True,
-            "env_template": True,
-            "documentation": True,
-        }
-
-        # Check that all components are present
-        missing = [k for k, v in components.items() if not v]
-        assert not missing, f"Missing components: {missing}"
-
-    def test_docker_mcp_workflow(self):
-        """Test complete Docker-MCP workflow"""
-        # Workflow steps
-        workflow_steps = [
-            "build_image",
-            "create_env_file",
-            "configure_mcp_json",
-            "test_docker_run",
-            "validate_mcp_communication",
-        ]
-
-        # Simulate each step
-        for step in workflow_steps:
-            # In reality, each step would be tested individually
-            assert step is not None, f"Step {step} not defined"
+    @pytest.mark.parametrize("component", list(SIMULATED_COMPONENTS))
+    def test_component_present(self, component):
+        """Test each component required for the Docker-MCP setup is present"""
+        assert SIMULATED_COMPONENTS[component], f"Missing component: {component}"
 
 
 if __name__ == "__main__":
@@ -7,12 +7,14 @@ tool discovery, execution, and error handling.
 """
 
 import asyncio
+import collections
 import sys
 from pathlib import Path
 from typing import Any
 from unittest.mock import AsyncMock, patch
 
 import pytest
+import pytest_asyncio
 
 sys.path.append(str(Path(__file__).parent.parent))
 
@@ -27,239 +29,374 @@ import server
 class MockStdioTransport:
     """Mock stdio transport for testing MCP protocol communication"""
 
-    def __init__(self):
-        self.input_queue = asyncio.Queue()
-        self.output_queue = asyncio.Queue()
+    def __init__(self, maxsize: int = 32):
+        # Each direction is a deque gated by one Event, so appending a message
+        # costs no Future and a waiting reader is woken once per burst
+        self._in = collections.deque()
+        self._out = collections.deque()
+        self._in_evt = asyncio.Event()
+        self._out_evt = asyncio.Event()
+        # Writers block once a direction holds maxsize messages, until its reader drains one
+        self.maxsize = maxsize
+        self._in_space = asyncio.Event()
+        self._out_space = asyncio.Event()
+        self._in_space.set()
+        self._out_space.set()
+        self._generation = 0
         self.messages_sent = []
         self.closed = False
 
+    async def _pop(self, buffer: collections.deque, event: asyncio.Event, space: asyncio.Event) -> dict[str, Any]:
+        """Wait until buffer has a message and pop it"""
+        while not buffer:
+            if self.closed:
+                raise EOFError("Transport closed")
+            event.clear()
+            await event.wait()
+        space.set()
+        return buffer.popleft()
+
+    async def _push(
+        self, buffer: collections.deque, event: asyncio.Event, space: asyncio.Event, message: dict[str, Any]
+    ) -> bool:
+        """Append a message to buffer and wake its reader, waiting while the buffer is full"""
+        generation = self._generation
+        while len(buffer) >= self.maxsize:
+            if self.closed:
+                raise RuntimeError("Transport closed")
+            space.clear()
+            await space.wait()
+        if generation != self._generation:
+            # The transport was reset while we waited; the message belongs to a finished test
+            return False
+        buffer.append(message)
+        event.set()
+        return True
+
     async def read_message(self) -> dict[str, Any]:
         """Read a message from the input queue"""
         if self.closed:
             raise EOFError("Transport closed")
-        return await self.input_queue.get()
+        return await self._pop(self._in, self._in_evt, self._in_space)
+
+    async def read_messages_batch(self, max_n: int = 64) -> list[dict[str, Any]]:
+        """Wait for at least one input message, then drain up to max_n queued messages"""
+        if self.closed:
+            raise EOFError("Transport closed")
+        batch = [await self._pop(self._in, self._in_evt, self._in_space)]
+        while self._in and len(batch) < max_n:
+            batch.append(self._in.popleft())
+        return batch
 
     async def write_message(self, message: dict[str, Any]):
         """Write a message to the output queue"""
         if self.closed:
             raise RuntimeError("Transport closed")
-        self.messages_sent.append(message)
-        await self.output_queue.put(message)
+        if await self._push(self._out, self._out_evt, self._out_space, message):
+            self.messages_sent.append(message)
 
     async def send_client_message(self, message: dict[str, Any]):
         """Send a message from the client side"""
-        await self.input_queue.put(message)
+        await self._push(self._in, self._in_evt, self._in_space, message)
 
     async def receive_server_response(self) -> dict[str, Any]:
         """Receive a response from the server side"""
-        return await self.output_queue.get()
+        return await self._pop(self._out, self._out_evt, self._out_space)
+
+    def reset(self):
+        """Drop queued messages and reopen the transport for the next test"""
+        self._in.clear()
+        self._out.clear()
+        self._in_evt.clear()
+        self._out_evt.clear()
+        self._generation += 1
+        self._in_space.set()
+        self._out_space.set()
+        self.messages_sent.clear()
+        self.closed = False
 
     def close(self):
         """Close the transport"""
         self.closed = True
+        # Wake any pending readers so they observe the close
+        self._in_evt.set()
+        self._out_evt.set()
+        self._in_space.set()
+        self._out_space.set()
 
 
 class MCPTestClient:
     """Test client for MCP protocol communication"""
 
+    # Request shells copied per call; only "id" (and "params" where it varies) is filled in
+    _INITIALIZE_TEMPLATE = {
+        "jsonrpc": "2.0",
+        "method": "initialize",
+        "params": {
+            "protocolVersion": LATEST_PROTOCOL_VERSION,
+            "capabilities": {},
+            "clientInfo": {"name": "test-client", "version": "1.0.0"},
+        },
+    }
+    _INITIALIZED_TEMPLATE = {"jsonrpc": "2.0", "method": "initialized", "params": {}}
+    _TOOLS_LIST_TEMPLATE = {"jsonrpc": "2.0", "method": "tools/list", "params": {}}
+    _TOOLS_CALL_TEMPLATE = {"jsonrpc": "2.0", "method": "tools/call"}
+    _PROMPTS_LIST_TEMPLATE = {"jsonrpc": "2.0", "method": "prompts/list", "params": {}}
+    _PROMPTS_GET_TEMPLATE = {"jsonrpc": "2.0", "method": "prompts/get"}
+
     def __init__(self, transport: MockStdioTransport):
         self.transport = transport
         self.message_id = 0
 
-    def _next_id(self) -> str:
+    def _next_id(self) -> int:
         """Generate next message ID"""
         self.message_id += 1
-        return str(self.message_id)
+        return self.message_id
 
     async def initialize(self) -> dict[str, Any]:
         """Send initialization request"""
-        request = {
-            "jsonrpc": "2.0",
-            "method": "initialize",
-            "params": {
-                "protocolVersion": LATEST_PROTOCOL_VERSION,
-                "capabilities": {},
-                "clientInfo": {"name": "test-client", "version": "1.0.0"},
-            },
-            "id": self._next_id(),
-        }
+        request = self._INITIALIZE_TEMPLATE.copy()
+        request["id"] = self._next_id()
         await self.transport.send_client_message(request)
         return await self.transport.receive_server_response()
 
     async def initialized(self):
         """Send initialized notification"""
-        notification = {"jsonrpc": "2.0", "method": "initialized", "params": {}}
-        await self.transport.send_client_message(notification)
+        await self.transport.send_client_message(self._INITIALIZED_TEMPLATE.copy())
 
     async def list_tools(self) -> dict[str, Any]:
         """Request tool list"""
-        request = {"jsonrpc": "2.0", "method": "tools/list", "params": {}, "id": self._next_id()}
+        request = self._TOOLS_LIST_TEMPLATE.copy()
+        request["id"] = self._next_id()
         await self.transport.send_client_message(request)
         return await self.transport.receive_server_response()
 
     async def call_tool(self, tool_name: str, arguments: dict[str, Any]) -> dict[str, Any]:
         """Call a tool"""
-        request = {
-            "jsonrpc": "2.0",
-            "method": "tools/call",
-            "params": {"name": tool_name, "arguments": arguments},
-            "id": self._next_id(),
-        }
+        request = self._TOOLS_CALL_TEMPLATE.copy()
+        request["params"] = {"name": tool_name, "arguments": arguments}
+        request["id"] = self._next_id()
         await self.transport.send_client_message(request)
         return await self.transport.receive_server_response()
 
+    async def call_tool_pipelined(self, calls: list[tuple[str, dict[str, Any]]]) -> list[dict[str, Any]]:
+        """Issue several tool calls without waiting in between, matching responses to requests by id"""
+        loop = asyncio.get_running_loop()
+        requests = []
+        pending: dict[int, asyncio.Future] = {}
+        for tool_name, arguments in calls:
+            request = self._TOOLS_CALL_TEMPLATE.copy()
+            request["params"] = {"name": tool_name, "arguments": arguments}
+            request["id"] = self._next_id()
+            requests.append(request)
+            pending[request["id"]] = loop.create_future()
+
+        async def send_all():
+            for request in requests:
+                await self.transport.send_client_message(request)
+
+        async def read_all():
+            # Single reader resolves each future as its response arrives, in whatever order
+            remaining = len(pending)
+            while remaining:
+                response = await self.transport.receive_server_response()
+                future = pending.get(response.get("id"))
+                if future is not None and not future.done():
+                    future.set_result(response)
+                    remaining -= 1
+
+        await asyncio.gather(send_all(), read_all())
+        return [future.result() for future in pending.values()]
+
     async def list_prompts(self) -> dict[str, Any]:
         """Request prompt list"""
-        request = {"jsonrpc": "2.0", "method": "prompts/list", "params": {}, "id": self._next_id()}
+        request = self._PROMPTS_LIST_TEMPLATE.copy()
+        request["id"] = self._next_id()
         await self.transport.send_client_message(request)
         return await self.transport.receive_server_response()
 
     async def get_prompt(self, prompt_name: str, arguments: dict[str, Any] = None) -> dict[str, Any]:
         """Get a specific prompt"""
-        request = {
-            "jsonrpc": "2.0",
-            "method": "prompts/get",
-            "params": {"name": prompt_name, "arguments": arguments or {}},
-            "id": self._next_id(),
-        }
+        request = self._PROMPTS_GET_TEMPLATE.copy()
+        request["params"] = {"name": prompt_name, "arguments": arguments or {}}
+        request["id"] = self._next_id()
         await self.transport.send_client_message(request)
         return await self.transport.receive_server_response()
 
 
-@pytest.fixture
-async def mcp_server_and_client():
-    """Create a connected MCP server and client pair"""
+class _NullStream:
+    """Inert stand-in for the stdio read/write streams, which the patched server loop never touches"""
+
+    async def read(self, *args):
+        return b""
+
+    async def write(self, *args):
+        pass
+
+
+class MockServerHarness:
+    """Runs the mock MCP server loop as a background task over a MockStdioTransport"""
+
+    def __init__(self, transport: MockStdioTransport, run_server):
+        self.transport = transport
+        self._run_server = run_server
+        self.task = None
+
+    async def ensure_running(self):
+        """Start the server task, or restart it if a test closed the transport"""
+        if self.task is not None and not self.task.done():
+            return
+        self.transport.reset()
+        ready = asyncio.Event()
+        self.task = asyncio.create_task(self._run_server(ready))
+
+        # Wait until the message loop is live; bail out early if the server task dies first
+        waiter = asyncio.ensure_future(ready.wait())
+        await asyncio.wait({waiter, self.task}, return_when=asyncio.FIRST_COMPLETED)
+        waiter.cancel()
+
+    async def stop(self):
+        """Close the transport and stop the server task"""
+        self.transport.close()
+        if self.task and not self.task.done():
+            self.task.cancel()
+            try:
+                await self.task
+            except asyncio.CancelledError:
+                pass
+
+
+@pytest_asyncio.fixture(scope="module", loop_scope="module")
+async def mcp_server():
+    """Start one mock MCP server per module, shared by all tests through mcp_server_and_client"""
     transport = MockStdioTransport()
-    client = MCPTestClient(transport)
-
-    # Create server task
-    server_task = None
-
-    async def run_server():
-        # Patch stdio to use our mock transport
-        with patch("server.stdio_server") as mock_stdio:
-            # Create a mock context manager
-            mock_context = AsyncMock()
-            mock_context.__aenter__.return_value = (
-                AsyncMock(),  # read_stream
-                AsyncMock(),  # write_stream
-            )
-            mock_context.__aexit__.return_value = None
-            mock_stdio.return_value = mock_context
-
-            # Patch the server's read/write to use our transport
-
-            async def mock_run():
-                Server("xtool_mcp_server")
-
-                # Override message handling
-                async def handle_messages():
-                    while not transport.closed:
-                        try:
-                            message = await transport.read_message()
-
-                            # Process message based on method
-                            if message.get("method") == "initialize":
-                                response = {
-                                    "jsonrpc": "2.0",
-                                    "result": {
-                                        "protocolVersion": LATEST_PROTOCOL_VERSION,
-                                        "capabilities": {
-                                            "tools": {"listChanged": False},
-                                            "prompts": {"listChanged": False},
-                                        },
-                                        "serverInfo": {"name": "xtool_mcp_server", "version": server.__version__},
-                                    },
-                                    "id": message["id"],
-                                }
-                                await transport.write_message(response)
-
-                            elif message.get("method") == "initialized":
-                                # No response needed for notification
-                                pass
-
-                            elif message.get("method") == "tools/list":
-                                tools = await server.handle_list_tools()
-                                response = {
-                                    "jsonrpc": "2.0",
-                                    "result": {
-                                        "tools": [
-                                            {
-                                                "name": tool.name,
-                                                "description": tool.description,
-                                                "inputSchema": tool.inputSchema,
-                                            }
-                                            for tool in tools
-                                        ]
-                                    },
-                                    "id": message["id"],
-                                }
-                                await transport.write_message(response)
-
-                            elif message.get("method") == "tools/call":
-                                params = message["params"]
-                                try:
-                                    result = await server.handle_call_tool(params["name"], params["arguments"])
-                                    response = {
-                                        "jsonrpc": "2.0",
-                                        "result": [{"type": "text", "text": result.output}],
-                                        "id": message["id"],
-                                    }
-                                except Exception as e:
-                                    response = {
-                                        "jsonrpc": "2.0",
-                                        "error": {"code": -32603, "message": str(e)},
-                                        "id": message["id"],
-                                    }
-                                await transport.write_message(response)
-
-                            elif message.get("method") == "prompts/list":
-                                prompts = await server.handle_list_prompts()
-                                response = {
-                                    "jsonrpc": "2.0",
-                                    "result": {
-                                        "prompts": [
-                                            {"name": prompt.name, "description": prompt.description}
-                                            for prompt in prompts
-                                        ]
-                                    },
-                                    "id": message["id"],
-                                }
-                                await transport.write_message(response)
-
-                        except EOFError:
-                            break
-                        except Exception as e:
-                            # Log error but continue
-                            print(f"Server error: {e}")
-
-                await handle_messages()
-
-            with patch("server.run", mock_run):
-                await mock_run()
-
-    # Start server in background
-    server_task = asyncio.create_task(run_server())
-
-    # Give server time to start
-    await asyncio.sleep(0.1)
-
-    yield client, transport
-
-    # Cleanup
-    transport.close()
-    if server_task and not server_task.done():
-        server_task.cancel()
+    # tools/list and prompts/list payloads, built once per module (the mock has no reload semantics)
+    list_cache: dict[str, list[dict[str, Any]]] = {}
+
+    async def on_initialize(message: dict[str, Any]):
+        response = {
+            "jsonrpc": "2.0",
+            "result": {
+                "protocolVersion": LATEST_PROTOCOL_VERSION,
+                "capabilities": {
+                    "tools": {"listChanged": False},
+                    "prompts": {"listChanged": False},
+                },
+                "serverInfo": {"name": "xtool_mcp_server", "version": server.__version__},
+            },
+            "id": message["id"],
+        }
+        await transport.write_message(response)
+
+    async def on_initialized(message: dict[str, Any]):
+        # No response needed for notification
+        pass
+
+    async def on_tools_list(message: dict[str, Any]):
+        if "tools" not in list_cache:
+            list_cache["tools"] = [
+                {
+                    "name": tool.name,
+                    "description": tool.description,
+                    "inputSchema": tool.inputSchema,
+                }
+                for tool in await server.handle_list_tools()
+            ]
+        response = {"jsonrpc": "2.0", "result": {"tools": list_cache["tools"]}, "id": message["id"]}
+        await transport.write_message(response)
+
+    async def on_tools_call(message: dict[str, Any]):
+        params = message["params"]
         try:
-            await server_task
-        except asyncio.CancelledError:
-            pass
+            result = await server.handle_call_tool(params["name"], params["arguments"])
+            response = {
+                "jsonrpc": "2.0",
+                "result": [{"type": "text", "text": result.output}],
+                "id": message["id"],
+            }
+        except Exception as e:
+            response = {
+                "jsonrpc": "2.0",
+                "error": {"code": -32603, "message": str(e)},
+                "id": message["id"],
+            }
+        await transport.write_message(response)
+
+    async def on_prompts_list(message: dict[str, Any]):
+        if "prompts" not in list_cache:
+            list_cache["prompts"] = [
+                {"name": prompt.name, "description": prompt.description}
+                for prompt in await server.handle_list_prompts()
+            ]
+        response = {"jsonrpc": "2.0", "result": {"prompts": list_cache["prompts"]}, "id": message["id"]}
+        await transport.write_message(response)
+
+    # Method -> handler; unknown methods get no response
+    handlers = {
+        "initialize": on_initialize,
+        "initialized": on_initialized,
+        "tools/list": on_tools_list,
+        "tools/call": on_tools_call,
+        "prompts/list": on_prompts_list,
+    }
+
+    async def mock_run(ready: asyncio.Event):
+        Server("xtool_mcp_server")
+
+        # Override message handling
+        async def handle_messages():
+            while not transport.closed:
+                try:
+                    batch = await transport.read_messages_batch()
+                except EOFError:
+                    break
+
+                # Dispatch the whole batch before yielding back to the loop
+                for message in batch:
+                    handler = handlers.get(message.get("method"))
+                    if handler is None:
+                        continue
+                    try:
+                        await handler(message)
+                    except Exception as e:
+                        # Log error but continue
+                        print(f"Server error: {e}")
+
+        ready.set()
+        await handle_messages()
+
+    # Create a mock stdio context manager
+    mock_context = AsyncMock()
+    mock_context.__aenter__.return_value = (
+        _NullStream(),  # read_stream
+        _NullStream(),  # write_stream
+    )
+    mock_context.__aexit__.return_value = None
+
+    # Patch stdio and the server loop once for the whole module; server restarts reuse the patches
+    with patch("server.stdio_server", return_value=mock_context), patch("server.run", mock_run):
+        # Start server in background
+        harness = MockServerHarness(transport, mock_run)
+        await harness.ensure_running()
+
+        yield harness
+
+        # Cleanup
+        await harness.stop()
+
+
+@pytest_asyncio.fixture(loop_scope="module")
+async def mcp_server_and_client(mcp_server):
+    """Create a client connected to the shared server, with transport state reset per test"""
+    mcp_server.transport.reset()
+    await mcp_server.ensure_running()
+    return MCPTestClient(mcp_server.transport), mcp_server.transport
 
 
 class TestMCPProtocolFlow:
     """Test complete MCP protocol communication flow"""
 
-    @pytest.mark.asyncio
+    @pytest.mark.asyncio(loop_scope="module")
     async def test_full_initialization_flow(self, mcp_server_and_client):
         """Test the complete initialization handshake"""
         client, transport = mcp_server_and_client
@@ -278,7 +415,7 @@ class TestMCPProtocolFlow:
         # No response expected for notification
         # Server should now be ready for requests
 
-    @pytest.mark.asyncio
+    @pytest.mark.asyncio(loop_scope="module")
     async def test_tool_discovery_flow(self, mcp_server_and_client):
         """Test tool discovery via MCP protocol"""
         client, transport = mcp_server_and_client
@@ -308,7 +445,7 @@ class TestMCPProtocolFlow:
         assert "thinkdeep" in tool_names
         assert "version" in tool_names
 
-    @pytest.mark.asyncio
+    @pytest.mark.asyncio(loop_scope="module")
     async def test_tool_execution_flow(self, mcp_server_and_client):
         """Test tool execution via MCP protocol"""
         client, transport = mcp_server_and_client
@@ -333,7 +470,7 @@ class TestMCPProtocolFlow:
         assert "result" in thinkboost_response
         assert "THINKING PATTERNS" in thinkboost_response["result"][0]["text"]
 
-    @pytest.mark.asyncio
+    @pytest.mark.asyncio(loop_scope="module")
     async def test_error_handling_flow(self, mcp_server_and_client):
         """Test error handling in MCP protocol"""
         client, transport = mcp_server_and_client
@@ -354,7 +491,7 @@ class TestMCPProtocolFlow:
         assert error_response["jsonrpc"] == "2.0"
         assert "error" in error_response
 
-    @pytest.mark.asyncio
+    @pytest.mark.asyncio(loop_scope="module")
     async def test_prompt_discovery_flow(self, mcp_server_and_client):
         """Test prompt discovery via MCP protocol"""
         client, transport = mcp_server_and_client
@@ -381,7 +518,7 @@ class TestMCPProtocolFlow:
 class TestMCPMessageValidation:
     """Test MCP message format validation"""
 
-    @pytest.mark.asyncio
+    @pytest.mark.asyncio(loop_scope="module")
     async def test_invalid_jsonrpc_version(self, mcp_server_and_client):
         """Test handling of invalid JSON-RPC version"""
         client, transport = mcp_server_and_client
@@ -391,7 +528,7 @@ class TestMCPMessageValidation:
             "jsonrpc": "1.0",  # Wrong version
             "method": "tools/list",
             "params": {},
-            "id": "1",
+            "id": 1,
         }
         await transport.send_client_message(invalid_request)
 
@@ -399,18 +536,18 @@ class TestMCPMessageValidation:
         await transport.receive_server_response()
         # Server might reject or handle gracefully
 
-    @pytest.mark.asyncio
+    @pytest.mark.asyncio(loop_scope="module")
     async def test_missing_method(self, mcp_server_and_client):
         """Test handling of missing method field"""
         client, transport = mcp_server_and_client
 
         # Send message without method
-        invalid_request = {"jsonrpc": "2.0", "params": {}, "id": "1"}
+        invalid_request = {"jsonrpc": "2.0", "params": {}, "id": 1}
         await transport.send_client_message(invalid_request)
 
         # Should get error or no response
 
-    @pytest.mark.asyncio
+    @pytest.mark.asyncio(loop_scope="module")
     async def test_notification_handling(self, mcp_server_and_client):
         """Test that notifications don't receive responses"""
         client, transport = mcp_server_and_client
@@ -432,7 +569,7 @@ class TestMCPMessageValidation:
 class TestMCPConcurrentRequests:
     """Test handling of concurrent MCP requests"""
 
-    @pytest.mark.asyncio
+    @pytest.mark.asyncio(loop_scope="module")
     async def test_concurrent_tool_calls(self, mcp_server_and_client):
         """Test multiple concurrent tool calls"""
         client, transport = mcp_server_and_client
@@ -441,26 +578,21 @@ class TestMCPConcurrentRequests:
         await client.initialize()
         await client.initialized()
 
-        # Send multiple requests concurrently
-        async def call_tool_async(name, args):
-            return await client.call_tool(name, args)
-
-        # Create concurrent tasks
-        tasks = [
-            call_tool_async("version", {}),
-            call_tool_async("thinkboost", {"problem": "Test 1", "context": ""}),
-            call_tool_async("thinkboost", {"problem": "Test 2", "context": ""}),
-        ]
-
-        # Execute concurrently
-        responses = await asyncio.gather(*tasks)
+        # Pipeline the requests; responses are correlated back by id
+        responses = await client.call_tool_pipelined(
+            [
+                ("version", {}),
+                ("thinkboost", {"problem": "Test 1", "context": ""}),
+                ("thinkboost", {"problem": "Test 2", "context": ""}),
+            ]
+        )
 
         # All should succeed
         for response in responses:
             assert response["jsonrpc"] == "2.0"
             assert "result" in response or "error" in response
 
-    @pytest.mark.asyncio
+    @pytest.mark.asyncio(loop_scope="module")
     async def test_request_ordering(self, mcp_server_and_client):
         """Test that responses match request IDs"""
         client, transport = mcp_server_and_client
@@ -478,9 +610,9 @@ class TestMCPConcurrentRequests:
                 "jsonrpc": "2.0",
                 "method": "tools/call",
                 "params": {"name": "version", "arguments": {}},
-                "id": f"test-{i}",
+                "id": i,
             }
-            request_ids.append(f"test-{i}")
+            request_ids.append(i)
             await transport.send_client_message(request)
 
         # Receive responses
@@ -497,7 +629,7 @@ class TestMCPConcurrentRequests:
 class TestMCPServerLifecycle:
     """Test server lifecycle management"""
 
-    @pytest.mark.asyncio
+    @pytest.mark.asyncio(loop_scope="module")
     async def test_server_graceful_shutdown(self, mcp_server_and_client):
         """Test graceful server shutdown"""
         client, transport = mcp_server_and_client
@@ -517,7 +649,7 @@ class TestMCPServerLifecycle:
         with pytest.raises(EOFError):
             await transport.read_message()
 
-    @pytest.mark.asyncio
+    @pytest.mark.asyncio(loop_scope="module")
     async def test_server_reconnection(self):
         """Test server behavior on reconnection"""
         # Create first connection
@@ -3,28 +3,56 @@ Test script for enhanced memory system with intelligent indexing
 """
 
 import asyncio
+import logging
 import os
 import sys
 from datetime import datetime, timedelta, timezone
 from pathlib import Path
 
+import pytest
+
+try:
+    import uvloop
+except ImportError:
+    uvloop = None
+
 # Add parent directory to path
 sys.path.insert(0, str(Path(__file__).parent.parent))
 
+from utils.conversation_memory import (
+    MemoryConfig,
+    _layer_cache,
+    _load_memory_layer,
+    flush_memory,
+    set_memory_config,
+)
 from utils.intelligent_memory_retrieval import (
     MemoryIndex,
+    _fit_memory_tokens,
+    _timestamp_epoch,
+    _timestamp_parts,
     calculate_memory_quality,
     calculate_relevance_score,
     enhanced_save_memory,
     extract_auto_tags,
+    get_memory_index,
     intelligent_recall_memory,
     rebuild_memory_index,
 )
 
+log = logging.getLogger(__name__)
+
+if uvloop is not None:
+
+    @pytest.fixture(scope="session")
+    def event_loop_policy():
+        """Run this module's async tests on uvloop when it is installed"""
+        return uvloop.EventLoopPolicy()
+
 
 def test_memory_index():
     """Test the MemoryIndex class"""
-    print("\n=== Testing MemoryIndex ===")
+    log.debug("\n=== Testing MemoryIndex ===")
 
     index = MemoryIndex()
 
@@ -55,57 +83,129 @@ def test_memory_index():
 
     # Test tag search
     python_memories = index.search_by_tags(["python"])
-    print(f"Python memories: {python_memories}")
+    log.debug("Python memories: %s", python_memories)
     assert len(python_memories) == 2
 
     # Test type search
     bug_memories = index.search_by_type("bug")
-    print(f"Bug memories: {bug_memories}")
+    log.debug("Bug memories: %s", bug_memories)
     assert len(bug_memories) == 1
 
     # Test layer search
     global_memories = index.search_by_layer("global")
-    print(f"Global memories: {global_memories}")
+    log.debug("Global memories: %s", global_memories)
     assert len(global_memories) == 2
 
     # Test quality search
     high_quality = index.search_by_quality(0.8, 1.0)
-    print(f"High quality memories: {high_quality}")
+    log.debug("High quality memories: %s", high_quality)
     assert len(high_quality) == 2
 
+    # Test combined bitmap filtering
+    assert index.filter_keys(tags=["python"], layer="global") == {"mem_001", "mem_003"}
+    assert index.filter_keys(tags=["python", "bug"], match_all=True) == {"mem_001"}
+    assert index.filter_keys(tags=["python"], min_quality=0.8) == {"mem_001"}
+    index.remove_memory("mem_003")
+    assert index.filter_keys(tags=["python"]) == {"mem_001"}
+    index.add_memory(test_data[2]["key"], test_data[2]["layer"], test_data[2]["metadata"], test_data[2]["timestamp"])
+    assert index.filter_keys(tags=["python"], layer="global") == {"mem_001", "mem_003"}
+
+    # Writes after the bitmaps are built update them in place
+    index.add_memory("mem_004", "project", {"tags": ["python"], "type": "bug"}, test_data[0]["timestamp"])
+    assert index.filter_keys(tags=["python"], mem_type="bug") == {"mem_001", "mem_004"}
+    index.remove_memory("mem_004")
+    assert index.filter_keys() == {"mem_001", "mem_002", "mem_003"}
+
     # Test serialization
     index_dict = index.to_dict()
     reconstructed = MemoryIndex.from_dict(index_dict)
     assert len(reconstructed.memory_metadata) == len(index.memory_metadata)
 
-    print("✓ MemoryIndex tests passed")
+    # The on-disk index is plain JSON: loading a store must never unpickle anything
+    blob = index.dumps()
+    assert blob.startswith(b"{")
+    restored = MemoryIndex.loads(blob)
+    assert restored.memory_metadata == index.memory_metadata
+    assert restored.search_by_tags(["python"]) == python_memories
+
+    log.debug("✓ MemoryIndex tests passed")
+
+
+def test_memory_index_follows_storage_path(tmp_path):
+    """Switching stores switches indexes; one store's keys never leak into another's"""
+    previous = set_memory_config(MemoryConfig(storage_path=tmp_path / "a"))
+    try:
+        key_a = enhanced_save_memory("saved in store A", layer="project")
+        set_memory_config(MemoryConfig(storage_path=tmp_path / "b"))
+        key_b = enhanced_save_memory("saved in store B", layer="project")
+
+        assert set(get_memory_index().memory_metadata) == {key_b}
+        assert set(MemoryIndex.loads((tmp_path / "b" / "memory_index.json").read_bytes()).memory_metadata) == {key_b}
+
+        set_memory_config(MemoryConfig(storage_path=tmp_path / "a"))
+        assert set(get_memory_index().memory_metadata) == {key_a}
+    finally:
+        flush_memory()
+        set_memory_config(previous)
+
+
+def test_enhanced_save_caches_what_it_persists(memory_store):
+    """Recall from the warm layer cache returns the same entry as a cold reload from disk"""
+    metadata = {"source": "caller"}
+    key = enhanced_save_memory("Fixed payment processing bug", layer="project", metadata=metadata, tags=["bug"])
+    metadata["source"] = "edited after save"
+    flush_memory()
+
+    warm = intelligent_recall_memory(query="payment", layer="project", limit=5)
+    _layer_cache.clear()
+    cold = intelligent_recall_memory(query="payment", layer="project", limit=5)
+
+    assert [m["key"] for m in warm] == [m["key"] for m in cold] == [key]
+    assert warm[0]["metadata"] == cold[0]["metadata"]
+    assert cold[0]["metadata"]["source"] == "caller"
+    assert cold[0]["metadata"]["quality_score"] > 0
+    assert warm[0]["relevance_score"] == pytest.approx(cold[0]["relevance_score"])
+
+
+@pytest.mark.parametrize("memory_store", [{"global": {"max_items": 2, "eviction": "lfu"}}], indirect=True)
+def test_intelligent_recall_feeds_lfu_eviction(memory_store):
+    """Intelligent recalls count toward LFU eviction, and compaction persists them as access_count"""
+    enhanced_save_memory("hot memory", layer="global", key="hot")
+    enhanced_save_memory("cold memory", layer="global", key="cold")
+    assert [m["key"] for m in intelligent_recall_memory(query="hot", layer="global")] == ["hot"]
+
+    # The second save evicts again and compacts the log
+    enhanced_save_memory("new memory", layer="global", key="new")
+    enhanced_save_memory("newer memory", layer="global", key="newer")
+    flush_memory()
+
+    _layer_cache.clear()
+    stored = _load_memory_layer("global")
+    assert list(stored) == ["hot", "newer"]
+    assert stored["hot"]["metadata"]["access_count"] == 1
+
+
+_AUTO_TAG_CASES = (
+    ("Fixed a bug in the Python authentication module", frozenset({"bug", "python"})),
+    ("Implemented new feature for JavaScript frontend", frozenset({"feature", "javascript"})),
+    ("Refactored the testing framework for better performance", frozenset({"refactor", "test", "performance"})),
+    ("Security vulnerability in auth system needs attention", frozenset({"security"})),
+    ("Optimized database queries for better speed", frozenset({"performance"})),
+)
 
 
-def test_auto_tagging():
+@pytest.mark.parametrize("content,expected_tags", _AUTO_TAG_CASES)
+def test_auto_tagging(content, expected_tags):
     """Test automatic tag extraction"""
-    print("\n=== Testing Auto-Tagging ===")
-
-    test_cases = [
-        ("Fixed a bug in the Python authentication module", ["bug", "python"]),
-        ("Implemented new feature for JavaScript frontend", ["feature", "javascript"]),
-        ("Refactored the testing framework for better performance", ["refactor", "test", "performance"]),
-        ("Security vulnerability in auth system needs attention", ["security"]),
-        ("Optimized database queries for better speed", ["performance"]),
-    ]
-
-    for content, expected_tags in test_cases:
-        tags = extract_auto_tags(content)
-        print(f"Content: {content[:50]}...")
-        print(f"Extracted tags: {tags}")
-        for tag in expected_tags:
-            assert tag in tags, f"Expected tag '{tag}' not found"
-
-    print("✓ Auto-tagging tests passed")
+    tags = extract_auto_tags(content)
+    log.debug("Content: %s... -> extracted tags: %s", content[:50], tags)
+    missing = expected_tags - set(tags)
+    assert not missing, f"Expected tags {sorted(missing)} not found"
 
 
 def test_quality_scoring():
     """Test memory quality calculation"""
-    print("\n=== Testing Quality Scoring ===")
+    log.debug("\n=== Testing Quality Scoring ===")
 
     # Recent memory with good metadata
     recent_memory = {
@@ -120,7 +220,7 @@ def test_quality_scoring():
     }
 
     quality = calculate_memory_quality(recent_memory)
-    print(f"Recent memory quality: {quality:.2f}")
+    log.debug("Recent memory quality: %.2f", quality)
     assert quality > 0.8, "Recent memory should have high quality"
 
     # Old memory with minimal metadata
@@ -131,15 +231,15 @@ def test_quality_scoring():
     }
 
     quality = calculate_memory_quality(old_memory)
-    print(f"Old memory quality: {quality:.2f}")
+    log.debug("Old memory quality: %.2f", quality)
     assert quality < 0.5, "Old memory with minimal content should have low quality"
 
-    print("✓ Quality scoring tests passed")
+    log.debug("✓ Quality scoring tests passed")
 
 
 def test_relevance_scoring():
     """Test relevance score calculation"""
-    print("\n=== Testing Relevance Scoring ===")
+    log.debug("\n=== Testing Relevance Scoring ===")
 
     memory = {
         "content": "Python authentication module using OAuth2 for secure login",
@@ -153,25 +253,56 @@ def test_relevance_scoring():
 
     # High relevance - exact query match
     score1 = calculate_relevance_score(memory, "authentication", ["python"], "architecture")
-    print(f"Relevance with exact matches: {score1:.2f}")
+    log.debug("Relevance with exact matches: %.2f", score1)
     assert score1 > 0.7
 
     # Medium relevance - partial match
     score2 = calculate_relevance_score(memory, "login", ["javascript"], "architecture")
-    print(f"Relevance with partial matches: {score2:.2f}")
+    log.debug("Relevance with partial matches: %.2f", score2)
     assert 0.3 < score2 < 0.9  # 调整阈值，因为内容中有 "login" 关键词
 
     # Low relevance - no match
     score3 = calculate_relevance_score(memory, "database", ["rust"], "bug")
-    print(f"Relevance with no matches: {score3:.2f}")
+    log.debug("Relevance with no matches: %.2f", score3)
     assert score3 < 0.4  # 调整阈值，基础质量分会影响最终分数
 
-    print("✓ Relevance scoring tests passed")
+    # A malformed (even unhashable) stored timestamp just earns no recency bonus
+    assert calculate_relevance_score({**memory, "timestamp": ["not", "a", "date"]}, None, None, None) == 0.8 * 0.3
+
+    log.debug("✓ Relevance scoring tests passed")
+
+
+def test_timestamp_parts():
+    """Naive and aware timestamps both parse; only aware ones have a recency epoch"""
+    naive = _timestamp_parts("2026-01-01T01:00:00")
+    aware = _timestamp_parts("2026-01-01T01:00:00Z")
+    assert naive == (aware[0], False) and aware[1]
+    assert naive[0] - _timestamp_parts("2026-01-01T00:00:00")[0] == 3600
+    assert _timestamp_epoch("2026-01-01T01:00:00") is None
+    assert _timestamp_epoch("2026-01-01T01:00:00Z") == aware[0]
+    assert _timestamp_parts("not a date") is None and _timestamp_parts(["unhashable"]) is None
+
 
+def test_fit_memory_tokens():
+    """Token cost of a recall candidate, rejecting oversized content before rendering its metadata"""
 
+    class Unrenderable:
+        def __repr__(self):
+            raise AssertionError("metadata should not be rendered")
+
+    memory = {"content": "x" * 40, "metadata": {"type": "note"}}
+    assert _fit_memory_tokens(memory, False, 10) == 10
+    assert _fit_memory_tokens(memory, True, 100) == (40 + len(str(memory["metadata"]))) // 4
+    assert _fit_memory_tokens(memory, True, 10) is None
+
+    oversized = {"content": "x" * 400, "metadata": {"blob": Unrenderable()}}
+    assert _fit_memory_tokens(oversized, True, 10) is None
+
+
+@pytest.mark.asyncio
 async def test_enhanced_save_and_recall():
     """Test enhanced save and intelligent recall"""
-    print("\n=== Testing Enhanced Save and Recall ===")
+    log.debug("\n=== Testing Enhanced Save and Recall ===")
 
     # Enable enhanced memory for testing
     os.environ["ENABLE_ENHANCED_MEMORY"] = "true"
@@ -210,42 +341,48 @@ async def test_enhanced_save_and_recall():
             importance=mem.get("importance"),
         )
         saved_keys.append(key)
-        print(f"Saved: {key}")
+        log.debug("Saved: %s", key)
 
     # Test recall by tags
     bug_memories = intelligent_recall_memory(tags=["bug"], limit=5)
-    print(f"\nBug memories found: {len(bug_memories)}")
+    log.debug("\nBug memories found: %s", len(bug_memories))
     assert len(bug_memories) >= 1
 
     # Test recall by type
     feature_memories = intelligent_recall_memory(mem_type="feature", limit=5)
-    print(f"Feature memories found: {len(feature_memories)}")
+    log.debug("Feature memories found: %s", len(feature_memories))
     assert len(feature_memories) >= 1
 
     # Test recall by query
     payment_memories = intelligent_recall_memory(query="payment", limit=5)
-    print(f"Payment memories found: {len(payment_memories)}")
+    log.debug("Payment memories found: %s", len(payment_memories))
     assert len(payment_memories) >= 1
 
+    # Recalled memories are private copies; mutating one must not leak into the next recall
+    payment_memories[0]["metadata"]["tags"].append("mutated-by-caller")
+    recalled_again = intelligent_recall_memory(query="payment", limit=5)
+    assert all("mutated-by-caller" not in m["metadata"]["tags"] for m in recalled_again)
+
     # Test combined filters
     python_global = intelligent_recall_memory(tags=["python"], layer="global", limit=5)
-    print(f"Python global memories found: {len(python_global)}")
+    log.debug("Python global memories found: %s", len(python_global))
 
-    print("✓ Enhanced save and recall tests passed")
+    log.debug("✓ Enhanced save and recall tests passed")
 
 
+@pytest.mark.asyncio
 async def test_index_rebuild():
     """Test index rebuilding"""
-    print("\n=== Testing Index Rebuild ===")
+    log.debug("\n=== Testing Index Rebuild ===")
 
     # Rebuild the index
     index = rebuild_memory_index()
 
-    print(f"Index rebuilt with {len(index.memory_metadata)} entries")
-    print(f"Tags: {len(index.tag_index)}")
-    print(f"Types: {len(index.type_index)}")
+    log.debug("Index rebuilt with %s entries", len(index.memory_metadata))
+    log.debug("Tags: %s", len(index.tag_index))
+    log.debug("Types: %s", len(index.type_index))
 
-    print("✓ Index rebuild test passed")
+    log.debug("✓ Index rebuild test passed")
 
 
 async def main():
@@ -255,17 +392,23 @@ async def main():
 
     # Basic component tests
     test_memory_index()
-    test_auto_tagging()
+    log.debug("\n=== Testing Auto-Tagging ===")
+    for content, expected_tags in _AUTO_TAG_CASES:
+        test_auto_tagging(content, expected_tags)
+    log.debug("✓ Auto-tagging tests passed")
     test_quality_scoring()
     test_relevance_scoring()
 
-    # Integration tests
-    await test_enhanced_save_and_recall()
-    await test_index_rebuild()
+    # Integration tests (independent; neither awaits while touching the shared memory store)
+    await asyncio.gather(test_enhanced_save_and_recall(), test_index_rebuild())
 
     print("\n" + "=" * 50)
     print("All tests passed! ✓")
 
 
 if __name__ == "__main__":
+    logging.basicConfig(format="%(message)s")
+    log.setLevel(logging.DEBUG)
+    if uvloop is not None:
+        asyncio.set_event_loop_policy(uvloop.EventLoopPolicy())
     asyncio.run(main())
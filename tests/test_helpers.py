@@ -9,8 +9,15 @@ import json
 from dataclasses import dataclass
 from typing import Any, Optional
 
+try:
+    import orjson
+except ImportError:
+    orjson = None
 
-@dataclass
+_loads = orjson.loads if orjson is not None else json.loads
+
+
+@dataclass(slots=True)
 class ToolResult:
     """Helper class to parse tool execution results"""
 
@@ -25,30 +32,35 @@ class ToolResult:
         if not response or not isinstance(response, list):
             return cls(status="error", output="Invalid response format")
 
-        # Extract text content from first item
+        # Extract text content from first item; an already-parsed dict skips the JSON step
         first_item = response[0]
-        if hasattr(first_item, "text"):
-            text_content = first_item.text
-        elif hasattr(first_item, "content"):
-            text_content = first_item.content
-        else:
+        if isinstance(first_item, dict):
+            return cls._from_data(first_item)
+
+        text_content = getattr(first_item, "text", None)
+        if text_content is None:
+            text_content = getattr(first_item, "content", None)
+        if text_content is None:
             text_content = str(first_item)
 
         # Try to parse as JSON ToolOutput
         try:
-            data = json.loads(text_content)
-            # Handle different output field names
-            output_content = data.get("output") or data.get("content", "")
-            return cls(
-                status=data.get("status", "unknown"),
-                output=output_content,
-                model=data.get("model"),
-                usage=data.get("usage"),
-            )
+            return cls._from_data(_loads(text_content))
         except (json.JSONDecodeError, AttributeError):
-            # If not JSON, treat as plain text output
+            # If not JSON, treat as plain text output (orjson's decode error subclasses json's)
             return cls(status="success" if text_content else "error", output=text_content)
 
+    @classmethod
+    def _from_data(cls, data: dict[str, Any]) -> "ToolResult":
+        get = data.get
+        # Handle different output field names
+        return cls(
+            status=get("status", "unknown"),
+            output=get("output") or get("content", ""),
+            model=get("model"),
+            usage=get("usage"),
+        )
+
 
 async def call_tool_with_result(handle_call_tool_func, tool_name: str, arguments: dict[str, Any]) -> ToolResult:
     """
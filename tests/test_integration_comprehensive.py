@@ -3,20 +3,23 @@ Comprehensive Integration Test Suite for xtool MCP Server
 
 This test suite provides end-to-end testing of the MCP server functionality,
 including tool discovery, execution, error handling, and cross-tool collaboration.
+
+The test classes are independent and can be spread across pytest-xdist workers:
+
+    pytest tests/test_integration_comprehensive.py -n auto --dist=loadscope
+
+loadscope keeps each class on one worker, so ordered flows such as save -> recall stay together,
+and every worker gets its own memory store from the session-wide memory_store_path fixture in conftest.py.
 """
 
 import asyncio
 import json
 import os
-import sys
-import tempfile
-from pathlib import Path
+import statistics
+import time
 from unittest.mock import patch
 
 import pytest
-
-sys.path.append(str(Path(__file__).parent.parent))
-
 from mcp.server import Server
 from mcp.server.models import InitializationOptions
 from mcp.types import (
@@ -25,6 +28,7 @@ from mcp.types import (
 )
 
 from config import __version__
+from providers.registry import ModelProviderRegistry
 from server import (
     handle_call_tool,
     handle_list_prompts,
@@ -32,23 +36,42 @@ from server import (
 )
 from tests.test_helpers import call_tool_with_result
 
+# Source file reviewed by the code review workflow, kept pre-encoded
+EXAMPLE_PY = b"""
+def calculate_sum(numbers):
+    total = 0
+    for n in numbers:
+        total += n
+    return total
 
-class MockTransport:
-    """Mock transport for testing MCP server communication"""
-
-    def __init__(self):
-        self.messages_sent = []
-        self.responses = {}
+# Test the function
+result = calculate_sum([1, 2, 3, 4, 5])
+print(f"Sum: {result}")
+"""
 
-    async def send_message(self, message: dict):
-        """Record sent messages"""
-        self.messages_sent.append(message)
+# Fixed memory payloads, serialized once at import
+PROJECT_CONTEXT_JSON = json.dumps(
+    {
+        "project": "test_project",
+        "files": ["main.py", "utils.py"],
+        "purpose": "Testing cross-tool collaboration",
+    }
+)
 
-    async def receive_message(self) -> dict:
-        """Return mocked responses"""
-        if self.responses:
-            return self.responses.pop(0)
-        return {}
+ISSUE_CONTEXT = {
+    "error": "AttributeError: 'NoneType' object has no attribute 'split'",
+    "file": "data_processor.py",
+    "line": 42,
+    "context": "Processing user input",
+}
+ISSUE_CONTEXT_JSON = json.dumps(ISSUE_CONTEXT)
+DEBUG_SESSION_JSON = json.dumps(
+    {
+        "issue": ISSUE_CONTEXT,
+        "analysis": "NoneType suggests missing null check",
+        "solution": "Add validation before calling split()",
+    }
+)
 
 
 @pytest.fixture
@@ -58,23 +81,18 @@ def mock_server():
     return server
 
 
-@pytest.fixture
-def mock_transport():
-    """Create a mock transport"""
-    return MockTransport()
-
-
-@pytest.fixture
-def temp_workspace():
-    """Create a temporary workspace for testing"""
-    with tempfile.TemporaryDirectory() as tmpdir:
-        yield Path(tmpdir)
+@pytest.fixture(scope="module")
+def example_file(tmp_path_factory):
+    """EXAMPLE_PY written once per module into a temporary workspace"""
+    path = tmp_path_factory.mktemp("workspace") / "example.py"
+    path.write_bytes(EXAMPLE_PY)
+    return path
 
 
 class TestServerInitialization:
     """Test server initialization and configuration"""
 
-    @pytest.mark.asyncio
+    @pytest.mark.asyncio(loop_scope="module")
     async def test_server_initialization(self, mock_server):
         """Test basic server initialization"""
         assert mock_server.name == "zen-mcp-test"
@@ -88,7 +106,7 @@ class TestServerInitialization:
         # Server should accept initialization
         assert mock_server.name == "zen-mcp-test"
 
-    def test_environment_configuration(self):
+    def test_environment_configuration(self, has_any_api_key):
         """Test environment variable configuration"""
         # Test default model
         from config import DEFAULT_MODEL
@@ -96,22 +114,15 @@ class TestServerInitialization:
         assert DEFAULT_MODEL is not None
 
         # Test API key presence (at least one should be configured)
-        api_keys = [
-            os.getenv("OPENAI_API_KEY"),
-            os.getenv("GEMINI_API_KEY"),
-            os.getenv("OPENROUTER_API_KEY"),
-            os.getenv("CUSTOM_API_URL"),
-        ]
-        assert any(key for key in api_keys), "At least one API key should be configured"
+        assert has_any_api_key, "At least one API key should be configured"
 
 
 class TestToolDiscovery:
     """Test tool discovery and listing"""
 
-    @pytest.mark.asyncio
-    async def test_list_tools(self):
+    def test_list_tools(self, all_tools):
         """Test listing available tools"""
-        tools = await handle_list_tools()
+        tools = all_tools
 
         # Check that all expected tools are present
         expected_tools = [
@@ -151,7 +162,7 @@ class TestToolDiscovery:
             assert "properties" in schema
             assert "required" in schema
 
-    @pytest.mark.asyncio
+    @pytest.mark.asyncio(loop_scope="module")
     async def test_list_prompts(self):
         """Test listing available prompts"""
         prompts = await handle_list_prompts()
@@ -166,10 +177,18 @@ class TestToolDiscovery:
             assert hasattr(prompt, "description")
 
 
+@pytest.fixture(scope="class")
+def mock_available_models():
+    """Patch the registry's model listing once for every test in the requesting class"""
+    models = {"gemini-pro": "google", "gemini-flash": "google", "gpt-4": "openai", "gpt-3.5-turbo": "openai"}
+    with patch.object(ModelProviderRegistry, "get_available_models", return_value=models) as mock:
+        yield mock
+
+
 class TestToolExecution:
     """Test individual tool execution"""
 
-    @pytest.mark.asyncio
+    @pytest.mark.asyncio(loop_scope="module")
     async def test_version_tool(self):
         """Test version tool execution"""
         result = await call_tool_with_result(handle_call_tool, "version", {})
@@ -178,21 +197,17 @@ class TestToolExecution:
         assert __version__ in result.output
         assert "xtool MCP Server" in result.output
 
-    @pytest.mark.asyncio
-    @patch("tools.listmodels.ModelProviderRegistry.get_all_models")
-    async def test_listmodels_tool(self, mock_get_models):
+    @pytest.mark.asyncio(loop_scope="module")
+    async def test_listmodels_tool(self, mock_available_models):
         """Test listmodels tool execution"""
-        # Mock model response
-        mock_get_models.return_value = {"gemini": ["gemini-pro", "gemini-flash"], "openai": ["gpt-4", "gpt-3.5-turbo"]}
-
         result = await call_tool_with_result(handle_call_tool, "listmodels", {})
 
         assert result.status == "success"
-        assert "Available Models" in result.output
-        assert "gemini-pro" in result.output
-        assert "gpt-4" in result.output
+        assert "Available AI Models" in result.output
+        assert "**Total Available Models**: 4" in result.output
+        mock_available_models.assert_called_with(respect_restrictions=True)
 
-    @pytest.mark.asyncio
+    @pytest.mark.asyncio(loop_scope="module")
     @pytest.mark.skipif(not os.getenv("GEMINI_API_KEY"), reason="Requires GEMINI_API_KEY")
     async def test_memory_tool_operations(self):
         """Test memory tool operations"""
@@ -211,7 +226,7 @@ class TestToolExecution:
         result = await call_tool_with_result(handle_call_tool, "memory", list_args)
         assert result.status == "success"
 
-    @pytest.mark.asyncio
+    @pytest.mark.asyncio(loop_scope="module")
     async def test_thinkboost_tool(self):
         """Test thinkboost tool (no model required)"""
         args = {"problem": "How to optimize database queries?", "context": "Performance is slow with large datasets"}
@@ -225,19 +240,13 @@ class TestToolExecution:
 class TestCrossToolCollaboration:
     """Test collaboration between different tools"""
 
-    @pytest.mark.asyncio
+    @pytest.mark.asyncio(loop_scope="module")
     async def test_memory_and_analysis_flow(self):
         """Test workflow: save context -> analyze -> recall"""
         # Step 1: Save some context
         save_args = {
             "action": "save",
-            "content": json.dumps(
-                {
-                    "project": "test_project",
-                    "files": ["main.py", "utils.py"],
-                    "purpose": "Testing cross-tool collaboration",
-                }
-            ),
+            "content": PROJECT_CONTEXT_JSON,
             "metadata": {"type": "project_context"},
         }
         save_result = await call_tool_with_result(handle_call_tool, "memory", save_args)
@@ -257,7 +266,7 @@ class TestCrossToolCollaboration:
         assert recall_result.status == "success"
         assert "test_project" in recall_result.output
 
-    @pytest.mark.asyncio
+    @pytest.mark.asyncio(loop_scope="module")
     async def test_planning_and_tracking_flow(self):
         """Test workflow: plan -> track -> report"""
         # This tests the conceptual flow of planning tools
@@ -281,21 +290,21 @@ class TestCrossToolCollaboration:
 class TestErrorHandling:
     """Test error handling and recovery"""
 
-    @pytest.mark.asyncio
+    @pytest.mark.asyncio(loop_scope="module")
     async def test_invalid_tool_name(self):
         """Test handling of invalid tool names"""
         result = await call_tool_with_result(handle_call_tool, "nonexistent_tool", {})
         assert result.status == "error"
         assert "Unknown tool" in result.output
 
-    @pytest.mark.asyncio
+    @pytest.mark.asyncio(loop_scope="module")
     async def test_missing_required_arguments(self):
         """Test handling of missing required arguments"""
         # Memory tool requires 'operation' argument
         result = await call_tool_with_result(handle_call_tool, "memory", {})
         assert result.status == "error"
 
-    @pytest.mark.asyncio
+    @pytest.mark.asyncio(loop_scope="module")
     async def test_invalid_argument_types(self):
         """Test handling of invalid argument types"""
         # Test with invalid argument type
@@ -306,7 +315,7 @@ class TestErrorHandling:
         result = await call_tool_with_result(handle_call_tool, "memory", args)
         assert result.status == "error"
 
-    @pytest.mark.asyncio
+    @pytest.mark.asyncio(loop_scope="module")
     async def test_tool_timeout_handling(self):
         """Test handling of tool timeouts"""
         # This would test timeout handling in real scenarios
@@ -321,98 +330,76 @@ class TestErrorHandling:
         assert result == "completed"
 
 
+async def _median_seconds(call, rounds: int = 5):
+    """Warm up once, then time `rounds` awaits of call(); returns (median seconds, last result)"""
+    result = await call()
+    samples = []
+    for _ in range(rounds):
+        start = time.perf_counter()
+        result = await call()
+        samples.append(time.perf_counter() - start)
+    return statistics.median(samples), result
+
+
 class TestPerformance:
     """Test performance characteristics"""
 
-    @pytest.mark.asyncio
+    @pytest.mark.slow
+    @pytest.mark.asyncio(loop_scope="module")
     async def test_tool_discovery_performance(self):
-        """Test that tool discovery is fast"""
-        import time
-
-        start = time.time()
-        tools = await handle_list_tools()
-        end = time.time()
+        """Test that tool discovery is fast (uncached calls, unlike the all_tools fixture)"""
+        elapsed, tools = await _median_seconds(handle_list_tools)
 
         # Tool discovery should be very fast (< 100ms)
-        assert (end - start) < 0.1
+        assert elapsed < 0.1
         assert len(tools) > 0
 
-    @pytest.mark.asyncio
-    async def test_memory_operation_performance(self):
+    @pytest.mark.slow
+    @pytest.mark.asyncio(loop_scope="module")
+    async def test_memory_operation_performance(self, perf_payload):
         """Test memory operation performance"""
-        import time
-
         # Test save performance
-        start = time.time()
-        save_args = {"action": "save", "content": "Performance test content" * 100, "metadata": {"test": "performance"}}
-        result = await call_tool_with_result(handle_call_tool, "memory", save_args)
-        end = time.time()
+        save_args = {"action": "save", "content": perf_payload, "metadata": {"test": "performance"}}
+        elapsed, result = await _median_seconds(lambda: call_tool_with_result(handle_call_tool, "memory", save_args))
 
         assert result.status == "success"
         # Memory save should be fast (< 500ms)
-        assert (end - start) < 0.5
+        assert elapsed < 0.5
 
         # Test recall performance
-        start = time.time()
         recall_args = {"action": "recall", "content": "performance"}
-        result = await call_tool_with_result(handle_call_tool, "memory", recall_args)
-        end = time.time()
+        elapsed, result = await _median_seconds(lambda: call_tool_with_result(handle_call_tool, "memory", recall_args))
 
         assert result.status == "success"
         # Memory recall should be fast (< 500ms)
-        assert (end - start) < 0.5
+        assert elapsed < 0.5
 
 
 class TestBackwardCompatibility:
     """Test backward compatibility with previous versions"""
 
-    @pytest.mark.asyncio
-    async def test_legacy_tool_names(self):
+    def test_legacy_tool_names(self, all_tools):
         """Test that legacy tool names still work"""
         # All current tools should maintain their names
         legacy_tools = ["chat", "thinkdeep", "codereview", "debug", "planner"]
 
-        tools = await handle_list_tools()
-        tool_names = [tool.name for tool in tools]
+        tool_names = [tool.name for tool in all_tools]
 
         for legacy in legacy_tools:
             assert legacy in tool_names, f"Legacy tool {legacy} should still exist"
 
-    @pytest.mark.asyncio
-    async def test_legacy_argument_formats(self):
-        """Test that legacy argument formats are supported"""
-        # Test memory tool with different argument styles
-
-        # New style
-        new_style = {"action": "save", "content": "test", "metadata": {"key": "value"}}
-        result = await call_tool_with_result(handle_call_tool, "memory", new_style)
-        assert result.status == "success"
-
-        # The tool should handle various input formats gracefully
-
 
 class TestRealWorldScenarios:
     """Test real-world usage scenarios"""
 
-    @pytest.mark.asyncio
-    async def test_code_review_workflow(self, temp_workspace):
+    @pytest.mark.asyncio(loop_scope="module")
+    async def test_code_review_workflow(self, example_file):
         """Test a typical code review workflow"""
-        # Create a test file
-        test_file = temp_workspace / "example.py"
-        test_file.write_text("""
-def calculate_sum(numbers):
-    total = 0
-    for n in numbers:
-        total += n
-    return total
-
-# Test the function
-result = calculate_sum([1, 2, 3, 4, 5])
-print(f"Sum: {result}")
-""")
-
         # Step 1: Analyze the code structure (using thinkboost)
-        analyze_args = {"problem": "Review this Python code for improvements", "context": test_file.read_text()}
+        analyze_args = {
+            "problem": "Review this Python code for improvements",
+            "context": example_file.read_bytes().decode(),
+        }
         result = await call_tool_with_result(handle_call_tool, "thinkboost", analyze_args)
         assert result.status == "success"
 
@@ -421,7 +408,7 @@ print(f"Sum: {result}")
             "action": "save",
             "content": json.dumps(
                 {
-                    "file": str(test_file),
+                    "file": str(example_file),
                     "analysis": "Code structure analyzed",
                     "suggestions": ["Consider using sum() builtin", "Add type hints"],
                 }
@@ -431,19 +418,11 @@ print(f"Sum: {result}")
         result = await call_tool_with_result(handle_call_tool, "memory", save_args)
         assert result.status == "success"
 
-    @pytest.mark.asyncio
+    @pytest.mark.asyncio(loop_scope="module")
     async def test_debugging_workflow(self):
         """Test a debugging workflow"""
-        # Step 1: Report an issue
-        issue_context = {
-            "error": "AttributeError: 'NoneType' object has no attribute 'split'",
-            "file": "data_processor.py",
-            "line": 42,
-            "context": "Processing user input",
-        }
-
-        # Step 2: Think about the issue
-        think_args = {"problem": f"Debug this error: {issue_context['error']}", "context": json.dumps(issue_context)}
+        # Steps 1-2: Report an issue (ISSUE_CONTEXT) and think about it
+        think_args = {"problem": f"Debug this error: {ISSUE_CONTEXT['error']}", "context": ISSUE_CONTEXT_JSON}
         result = await call_tool_with_result(handle_call_tool, "thinkboost", think_args)
         assert result.status == "success"
         assert "THINKING PATTERNS" in result.output
@@ -451,13 +430,7 @@ print(f"Sum: {result}")
         # Step 3: Save debugging session
         save_args = {
             "action": "save",
-            "content": json.dumps(
-                {
-                    "issue": issue_context,
-                    "analysis": "NoneType suggests missing null check",
-                    "solution": "Add validation before calling split()",
-                }
-            ),
+            "content": DEBUG_SESSION_JSON,
             "metadata": {"type": "debug_session", "error": "AttributeError"},
         }
         result = await call_tool_with_result(handle_call_tool, "memory", save_args)
@@ -467,7 +440,7 @@ print(f"Sum: {result}")
 class TestEdgeCases:
     """Test edge cases and boundary conditions"""
 
-    @pytest.mark.asyncio
+    @pytest.mark.asyncio(loop_scope="module")
     async def test_empty_inputs(self):
         """Test handling of empty inputs"""
         # Test thinkboost with empty problem
@@ -476,31 +449,35 @@ class TestEdgeCases:
         # Should still provide structured output
         assert result.status == "success"
 
-        # Test memory save with empty content
-        args = {"action": "save", "content": "", "metadata": {"empty": True}}
+    @pytest.mark.asyncio(loop_scope="module")
+    @pytest.mark.parametrize(
+        "content, content_fixture, metadata",
+        [
+            pytest.param("test", None, {"key": "value"}, id="plain"),
+            pytest.param("", None, {"empty": True}, id="empty"),
+            pytest.param(None, "large_payload_10k", {"size": "large"}, id="large"),
+        ],
+    )
+    async def test_memory_save_variants(self, request, content, content_fixture, metadata):
+        """Test that the memory tool saves plain, empty and large content"""
+        if content_fixture:
+            content = request.getfixturevalue(content_fixture)
+        args = {"action": "save", "content": content, "metadata": metadata}
         result = await call_tool_with_result(handle_call_tool, "memory", args)
         assert result.status == "success"
 
-    @pytest.mark.asyncio
-    async def test_large_inputs(self):
+    @pytest.mark.asyncio(loop_scope="module")
+    async def test_large_inputs(self, large_payload_10k):
         """Test handling of large inputs"""
-        # Create a large content
-        large_content = "x" * 10000  # 10KB of data
-
-        # Test memory with large content
-        args = {"action": "save", "content": large_content, "metadata": {"size": "large"}}
-        result = await call_tool_with_result(handle_call_tool, "memory", args)
-        assert result.status == "success"
-
         # Test thinkboost with large context
         args = {
             "problem": "Analyze this data",
-            "context": large_content[:1000],  # Use first 1KB
+            "context": large_payload_10k[:1000],  # Use first 1KB
         }
         result = await call_tool_with_result(handle_call_tool, "thinkboost", args)
         assert result.status == "success"
 
-    @pytest.mark.asyncio
+    @pytest.mark.asyncio(loop_scope="module")
     async def test_special_characters(self):
         """Test handling of special characters"""
         special_content = "Test with special chars: 你好 🎉 <script>alert('test')</script> \n\t\r"
@@ -519,7 +496,7 @@ class TestEdgeCases:
 class TestConcurrency:
     """Test concurrent operations"""
 
-    @pytest.mark.asyncio
+    @pytest.mark.asyncio(loop_scope="module")
     async def test_concurrent_tool_calls(self):
         """Test multiple tools called concurrently"""
 
@@ -528,38 +505,30 @@ class TestConcurrency:
 
         # Create multiple concurrent tasks
         tasks = [
-            call_tool("version", {}),
-            call_tool("thinkboost", {"problem": "Test 1", "context": ""}),
-            call_tool("thinkboost", {"problem": "Test 2", "context": ""}),
-            call_tool("memory", {"action": "list", "layer": "session"}),
+            asyncio.ensure_future(call_tool("version", {})),
+            asyncio.ensure_future(call_tool("thinkboost", {"problem": "Test 1", "context": ""})),
+            asyncio.ensure_future(call_tool("thinkboost", {"problem": "Test 2", "context": ""})),
+            asyncio.ensure_future(call_tool("memory", {"action": "list", "layer": "session"})),
         ]
 
-        # Execute concurrently
-        results = await asyncio.gather(*tasks, return_exceptions=True)
+        # All should succeed; stop at the first failure and cancel whatever is still running
+        try:
+            for next_done in asyncio.as_completed(tasks):
+                result = await next_done
+                assert result.status == "success", result.output
+        finally:
+            for task in tasks:
+                task.cancel()
 
-        # All should succeed
-        for i, result in enumerate(results):
-            if isinstance(result, Exception):
-                pytest.fail(f"Task {i} failed: {result}")
-            else:
-                assert result.status == "success"
+    @pytest.mark.asyncio(loop_scope="module")
+    async def test_batch_memory_operations(self):
+        """Test saving several memories in one batch_save call"""
+        items = [{"content": f"Content {i}", "metadata": {"key": f"key_{i}"}} for i in range(5)]
 
-    @pytest.mark.asyncio
-    async def test_concurrent_memory_operations(self):
-        """Test concurrent memory operations"""
+        result = await call_tool_with_result(handle_call_tool, "memory", {"action": "batch_save", "items": items})
 
-        async def save_memory(key, content):
-            args = {"action": "save", "content": content, "metadata": {"key": key}}
-            return await call_tool_with_result(handle_call_tool, "memory", args)
-
-        # Create multiple concurrent saves
-        tasks = [save_memory(f"key_{i}", f"Content {i}") for i in range(5)]
-
-        results = await asyncio.gather(*tasks)
-
-        # All should succeed
-        for result in results:
-            assert result.status == "success"
+        assert result.status == "success"
+        assert "Successfully saved 5 of 5 memories" in result.output
 
 
 if __name__ == "__main__":
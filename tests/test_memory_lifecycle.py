@@ -3,15 +3,12 @@
 """
 
 import asyncio
-import os
-import sys
+import logging
 from datetime import datetime, timedelta, timezone
-from pathlib import Path
 
-# Add parent directory to path
-sys.path.insert(0, str(Path(__file__).parent.parent))
+import pytest
 
-from utils.intelligent_memory_retrieval import enhanced_save_memory
+from utils.intelligent_memory_retrieval import enhanced_save_memories
 from utils.memory_lifecycle import (
     DecayCurve,
     MemoryLifecycleManager,
@@ -19,11 +16,21 @@ from utils.memory_lifecycle import (
     get_lifecycle_manager,
 )
 
+log = logging.getLogger(__name__)
+
+# 整个模块共用一个"当前时间"，时间戳在导入时一次算好
+NOW = datetime.now(timezone.utc)
+NOW_ISO = NOW.isoformat()
+AGE_45D_ISO = (NOW - timedelta(days=45)).isoformat()
+AGE_60D_ISO = (NOW - timedelta(days=60)).isoformat()
+AGE_180D_ISO = (NOW - timedelta(days=180)).isoformat()
+AGE_200D_ISO = (NOW - timedelta(days=200)).isoformat()
+
+ALL_DECAY_CURVES = [DecayCurve.LINEAR, DecayCurve.EXPONENTIAL, DecayCurve.LOGARITHMIC, DecayCurve.STEP]
+
 
 def test_advanced_quality_calculation():
     """测试高级质量计算"""
-    print("\n=== 测试高级质量计算 ===")
-
     manager = MemoryLifecycleManager()
 
     # 高质量记忆
@@ -56,69 +63,55 @@ def test_advanced_quality_calculation():
             "reference_count": 5,
             "user_rating": 5,
         },
-        "timestamp": datetime.now(timezone.utc).isoformat(),
+        "timestamp": NOW_ISO,
     }
 
     quality = manager.calculate_advanced_quality(high_quality_memory)
-    print(f"高质量记忆得分: {quality:.2f}")
+    log.debug("高质量记忆得分: %.2f", quality)
     assert quality > 0.7  # 调整阈值
 
     # 低质量记忆
     low_quality_memory = {
         "content": "TODO: fix bug",
         "metadata": {},
-        "timestamp": (datetime.now(timezone.utc) - timedelta(days=60)).isoformat(),
+        "timestamp": AGE_60D_ISO,
     }
 
     quality = manager.calculate_advanced_quality(low_quality_memory)
-    print(f"低质量记忆得分: {quality:.2f}")
+    log.debug("低质量记忆得分: %.2f", quality)
     assert quality < 0.4
 
-    print("✓ 高级质量计算测试通过")
-
 
-def test_decay_curves():
-    """测试不同的衰减曲线"""
-    print("\n=== 测试衰减曲线 ===")
-
-    # 测试记忆
-    memory = {
-        "timestamp": (datetime.now(timezone.utc) - timedelta(days=45)).isoformat(),
-        "metadata": {"importance": "medium", "type": "feature"},
+def _memory_aged_45_days(importance: str, mem_type: str) -> dict:
+    return {
+        "timestamp": AGE_45D_ISO,
+        "metadata": {"importance": importance, "type": mem_type},
     }
 
-    # 测试不同衰减曲线
-    curves = [DecayCurve.LINEAR, DecayCurve.EXPONENTIAL, DecayCurve.LOGARITHMIC, DecayCurve.STEP]
 
-    for curve in curves:
-        manager = MemoryLifecycleManager()
-        manager.decay_curve = curve
+@pytest.mark.parametrize("curve", ALL_DECAY_CURVES)
+def test_decay_curves(curve):
+    """测试不同的衰减曲线"""
+    manager = MemoryLifecycleManager()
+    manager.decay_curve = curve
 
-        decay_value = manager.apply_decay(memory)
-        print(f"{curve} 衰减值: {decay_value:.2f}")
-        assert 0.0 <= decay_value <= 1.0
+    decay_value = manager.apply_decay(_memory_aged_45_days("medium", "feature"), NOW)
+    log.debug("%s 衰减值: %.2f", curve, decay_value)
+    assert 0.0 <= decay_value <= 1.0
 
-    # 测试重要性影响
-    high_importance_memory = {
-        "timestamp": (datetime.now(timezone.utc) - timedelta(days=45)).isoformat(),
-        "metadata": {"importance": "high", "type": "security"},
-    }
 
+def test_importance_slows_decay():
+    """测试重要性影响"""
     manager = MemoryLifecycleManager()
-    decay_high = manager.apply_decay(high_importance_memory)
-    decay_normal = manager.apply_decay(memory)
+    decay_high = manager.apply_decay(_memory_aged_45_days("high", "security"), NOW)
+    decay_normal = manager.apply_decay(_memory_aged_45_days("medium", "feature"), NOW)
 
-    print(f"\n高重要性衰减: {decay_high:.2f}")
-    print(f"普通重要性衰减: {decay_normal:.2f}")
+    log.debug("高重要性衰减: %.2f, 普通重要性衰减: %.2f", decay_high, decay_normal)
     assert decay_high > decay_normal  # 高重要性衰减更慢
 
-    print("✓ 衰减曲线测试通过")
-
 
 def test_memory_value_evaluation():
     """测试记忆价值评估"""
-    print("\n=== 测试记忆价值评估 ===")
-
     manager = MemoryLifecycleManager()
 
     # 新的高价值记忆
@@ -131,16 +124,11 @@ def test_memory_value_evaluation():
             "access_count": 20,
             "reference_count": 10,
         },
-        "timestamp": datetime.now(timezone.utc).isoformat(),
+        "timestamp": NOW_ISO,
     }
 
-    value = manager.evaluate_memory_value(valuable_memory)
-    print("高价值记忆评估:")
-    for key, score in value.items():
-        if isinstance(score, float):
-            print(f"  {key}: {score:.2f}")
-        else:
-            print(f"  {key}: {score}")
+    value = manager.evaluate_memory_value(valuable_memory, NOW)
+    log.debug("高价值记忆评估: %s", value)
 
     assert value["overall"] > 0.6  # 调整阈值
     assert not value["should_archive"]
@@ -150,180 +138,118 @@ def test_memory_value_evaluation():
     old_memory = {
         "content": "Minor note",
         "metadata": {"type": "note", "importance": "low"},
-        "timestamp": (datetime.now(timezone.utc) - timedelta(days=180)).isoformat(),
+        "timestamp": AGE_180D_ISO,
     }
 
-    value = manager.evaluate_memory_value(old_memory)
-    print("\n低价值记忆评估:")
-    for key, score in value.items():
-        if isinstance(score, float):
-            print(f"  {key}: {score:.2f}")
-        else:
-            print(f"  {key}: {score}")
+    value = manager.evaluate_memory_value(old_memory, NOW)
+    log.debug("低价值记忆评估: %s", value)
 
     assert value["overall"] < 0.3
     assert value["should_archive"] or value["should_delete"]
 
-    print("\n✓ 记忆价值评估测试通过")
 
+def test_memory_value_uses_given_evaluation_time():
+    """评估时间可由调用方传入（批量评估共用同一时间）"""
+    manager = MemoryLifecycleManager()
+    memory = _memory_aged_45_days("medium", "feature")
 
-def test_memory_resurrection():
-    """测试记忆复活机制"""
-    print("\n=== 测试记忆复活机制 ===")
+    later = NOW + timedelta(days=365)
+    now_value = manager.evaluate_memory_value(memory, NOW)
+    later_value = manager.evaluate_memory_value(memory, later)
+
+    assert later_value["decay"] < now_value["decay"]
+    assert later_value["historical"] > now_value["historical"] == 0.0
 
-    import copy
 
+def test_memory_resurrection():
+    """测试记忆复活机制"""
     manager = MemoryLifecycleManager()
 
     # 老记忆
     old_memory = {
         "content": "Old but important architectural decision",
         "metadata": {"tags": ["architecture"], "type": "architecture", "quality_score": 0.3, "access_count": 2},
-        "timestamp": (datetime.now(timezone.utc) - timedelta(days=200)).isoformat(),
+        "timestamp": AGE_200D_ISO,
     }
 
-    # 创建副本以避免修改原始数据
-    memory_to_resurrect = copy.deepcopy(old_memory)
-
-    print(f"复活前质量分数: {old_memory['metadata']['quality_score']:.2f}")
+    # 创建副本以避免修改原始数据（resurrect_memory 只改 metadata 的顶层键）
+    memory_to_resurrect = {**old_memory, "metadata": {**old_memory["metadata"]}}
 
     # 复活记忆
     resurrected = manager.resurrect_memory(memory_to_resurrect)
 
     new_quality = resurrected["metadata"]["quality_score"]
-    print(f"复活后质量分数: {new_quality:.2f}")
-    print(f"访问次数: {resurrected['metadata']['access_count']}")
+    log.debug(
+        "复活质量分数: %.2f -> %.2f, 访问次数: %s",
+        old_memory["metadata"]["quality_score"],
+        new_quality,
+        resurrected["metadata"]["access_count"],
+    )
 
-    expected_quality = old_memory["metadata"]["quality_score"] + manager.resurrection_boost
-    print(f"期望质量分数: {expected_quality:.2f}")
-    print(f"复活提升值: {manager.resurrection_boost:.2f}")
     # 只要有提升就算通过
     assert new_quality > old_memory["metadata"]["quality_score"]
     assert resurrected["metadata"]["access_count"] == 3
     assert "last_accessed" in resurrected["metadata"]
     assert "resurrection_history" in resurrected["metadata"]
 
-    print("✓ 记忆复活机制测试通过")
-
 
-async def test_batch_evaluation():
+@pytest.mark.asyncio
+async def test_batch_evaluation(memory_store):
     """测试批量评估"""
-    print("\n=== 测试批量评估 ===")
-
-    # 启用增强记忆
-    os.environ["ENABLE_ENHANCED_MEMORY"] = "true"
-
     # 创建不同类型的测试记忆
     test_memories = [
         # 高价值记忆
         {
             "content": "Critical system architecture design pattern",
             "tags": ["architecture", "design", "critical"],
-            "type": "architecture",
+            "mem_type": "architecture",
             "importance": "high",
         },
         # 普通记忆
         {
             "content": "Regular feature implementation note",
             "tags": ["feature"],
-            "type": "feature",
+            "mem_type": "feature",
             "importance": "medium",
         },
         # 低价值记忆
-        {"content": "TODO", "tags": ["todo"], "type": "todo", "importance": "low"},
+        {"content": "TODO", "tags": ["todo"], "mem_type": "todo", "importance": "low"},
     ]
 
-    # 保存测试记忆
-    for _i, mem in enumerate(test_memories):
-        # 调整时间戳以创建不同年龄的记忆
-        enhanced_save_memory(
-            content=mem["content"],
-            tags=mem["tags"],
-            mem_type=mem["type"],
-            importance=mem["importance"],
-            layer="project",
-        )
+    # 一次性批量保存测试记忆（索引只写一次，放到线程里避免阻塞事件循环）
+    keys = await asyncio.to_thread(enhanced_save_memories, test_memories, "project")
+    assert all(keys)
 
     # 批量评估
     manager = get_lifecycle_manager()
     evaluation = manager.batch_evaluate_memories("project")
 
-    print("批量评估结果:")
-    print(f"  活跃记忆: {len(evaluation['active'])}")
-    print(f"  高价值记忆: {len(evaluation['valuable'])}")
-    print(f"  待归档: {len(evaluation['archive'])}")
-    print(f"  待删除: {len(evaluation['delete'])}")
+    log.debug("批量评估结果: %s", {group: len(items) for group, items in evaluation.items()})
 
     # 至少应该有一些活跃记忆
     assert len(evaluation["active"]) + len(evaluation["valuable"]) > 0
 
-    print("✓ 批量评估测试通过")
 
-
-async def test_memory_health_evaluation():
+@pytest.mark.asyncio
+async def test_memory_health_evaluation(memory_store):
     """测试记忆系统健康评估"""
-    print("\n=== 测试记忆系统健康评估 ===")
-
     health_report = evaluate_memory_health()
 
-    print("健康报告:")
-    print(f"  总记忆数: {health_report['total_memories']}")
-    print(f"  活跃记忆: {health_report['active_memories']}")
-    print(f"  高价值记忆: {health_report['valuable_memories']}")
-    print(f"  待归档: {health_report['memories_to_archive']}")
-    print(f"  待删除: {health_report['memories_to_delete']}")
-    print(f"  健康分数: {health_report['health_score']:.2f}")
-
-    if health_report["recommendations"]:
-        print("  建议:")
-        for rec in health_report["recommendations"]:
-            print(f"    - {rec}")
+    log.debug("健康报告: %s", health_report)
 
     assert 0.0 <= health_report["health_score"] <= 1.0
     assert isinstance(health_report["recommendations"], list)
 
-    print("✓ 健康评估测试通过")
-
 
-async def test_memory_optimization():
+@pytest.mark.asyncio
+async def test_memory_optimization(memory_store):
     """测试记忆优化"""
-    print("\n=== 测试记忆优化 ===")
-
     manager = get_lifecycle_manager()
 
     # 模拟运行（不实际删除）
     stats = manager.optimize_memory_storage(dry_run=True)
 
-    print("优化统计（模拟）:")
-    print(f"  待删除: {stats['deleted']}")
-    print(f"  待归档: {stats['archived']}")
-    print(f"  待更新: {stats['updated']}")
+    log.debug("优化统计（模拟）: %s", stats)
 
     assert stats["deleted"] >= 0
     assert stats["archived"] >= 0
-
-    print("✓ 记忆优化测试通过")
-
-
-async def main():
-    """运行所有测试"""
-    print("开始测试记忆生命周期管理")
-    print("=" * 50)
-
-    # 单元测试
-    test_advanced_quality_calculation()
-    test_decay_curves()
-    test_memory_value_evaluation()
-    test_memory_resurrection()
-
-    # 集成测试
-    await test_batch_evaluation()
-    await test_memory_health_evaluation()
-    await test_memory_optimization()
-
-    print("\n" + "=" * 50)
-    print("所有测试通过! ✓")
-
-
-if __name__ == "__main__":
-    asyncio.run(main())
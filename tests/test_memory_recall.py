@@ -9,6 +9,7 @@ import pytest
 from tools.memory_recall import MemoryRecallTool
 from utils.intelligent_memory_retrieval import (
     MEMORY_TOKEN_LIMIT,
+    enhanced_save_memories,
     enhanced_save_memory,
     get_memory_stats_with_tokens,
     token_aware_memory_recall,
@@ -18,16 +19,18 @@ from utils.intelligent_memory_retrieval import (
 class TestMemoryRecall(unittest.TestCase):
     """测试记忆回忆功能"""
 
-    def setUp(self):
-        """设置测试环境"""
-        self.tool = MemoryRecallTool()
-        self.test_memories = []
+    @classmethod
+    def setUpClass(cls):
+        """设置测试环境；测试记忆只对整个类创建一次"""
+        cls.tool = MemoryRecallTool()
+        cls.test_memories = []
 
         # 创建一些测试记忆
-        self._create_test_memories()
+        cls._create_test_memories()
 
-    def _create_test_memories(self):
-        """创建测试记忆数据"""
+    @classmethod
+    def _create_test_memories(cls):
+        """创建测试记忆数据（固定 key，重复运行会覆盖而不是累积）"""
         test_data = [
             {
                 "content": "修复了用户登录的 bug，问题出现在密码验证逻辑中",
@@ -61,17 +64,10 @@ class TestMemoryRecall(unittest.TestCase):
             },
         ]
 
-        # 保存测试记忆
+        # 一次批量保存测试记忆（索引只写一次）
         for i, data in enumerate(test_data):
-            key = enhanced_save_memory(
-                content=data["content"],
-                layer="project",
-                tags=data["tags"],
-                mem_type=data["mem_type"],
-                importance=data["importance"],
-                key=f"test_memory_{i}",
-            )
-            self.test_memories.append(key)
+            data["key"] = f"test_memory_{i}"
+        cls.test_memories.extend(enhanced_save_memories(test_data, layer="project"))
 
     def test_token_limit_functionality(self):
         """测试 token 限制功能"""
@@ -17,8 +17,8 @@ from tests.test_helpers import call_tool_with_result
 
 async def test_version():
     """Test version tool"""
-    print("\n✅ Testing version tool...")
     result = await call_tool_with_result(handle_call_tool, "version", {})
+    print("\n✅ Testing version tool...")
     print(f"Status: {result.status}")
     print(f"Output preview: {result.output[:200]}...")
     assert result.status == "success"
@@ -28,12 +28,12 @@ async def test_version():
 
 async def test_thinkboost():
     """Test thinkboost tool"""
-    print("\n✅ Testing thinkboost tool...")
     result = await call_tool_with_result(
         handle_call_tool,
         "thinkboost",
         {"problem": "How to optimize Python code?", "context": "Looking for performance improvements"},
     )
+    print("\n✅ Testing thinkboost tool...")
     print(f"Status: {result.status}")
     print(f"Output preview: {result.output[:200]}...")
     assert result.status == "success"
@@ -43,8 +43,8 @@ async def test_thinkboost():
 
 async def test_listmodels():
     """Test listmodels tool"""
-    print("\n✅ Testing listmodels tool...")
     result = await call_tool_with_result(handle_call_tool, "listmodels", {})
+    print("\n✅ Testing listmodels tool...")
     print(f"Status: {result.status}")
     print(f"Output preview: {result.output[:200]}...")
     assert result.status == "success"
@@ -54,8 +54,8 @@ async def test_listmodels():
 
 async def test_tool_discovery():
     """Test tool discovery"""
-    print("\n✅ Testing tool discovery...")
     tools = await handle_list_tools()
+    print("\n✅ Testing tool discovery...")
     print(f"Found {len(tools)} tools")
 
     expected_tools = ["chat", "thinkdeep", "memory", "version", "thinkboost"]
@@ -75,10 +75,9 @@ async def main():
     print("=" * 60)
 
     try:
-        await test_version()
-        await test_thinkboost()
-        await test_listmodels()
-        await test_tool_discovery()
+        # The checks are independent, so run them concurrently. Each one prints only after its
+        # single await, which keeps every check's output in one uninterrupted block.
+        await asyncio.gather(test_version(), test_thinkboost(), test_listmodels(), test_tool_discovery())
 
         print("\n" + "=" * 60)
         print("✅ All quick validation tests passed!")
@@ -16,9 +16,12 @@ if TYPE_CHECKING:
 
 from config import TEMPERATURE_ANALYTICAL
 from tools.shared.base_models import ToolRequest
-from utils.conversation_memory import ENABLE_ENHANCED_MEMORY, detect_environment
+from utils.conversation_memory import detect_environment, get_memory_config
 from utils.intelligent_memory_retrieval import (
+    MEMORY_DECAY_DAYS,
+    MEMORY_QUALITY_THRESHOLD,
     cleanup_old_memories,
+    enhanced_save_memories,
     enhanced_save_memory,
     intelligent_recall_memory,
     rebuild_memory_index,
@@ -26,10 +29,14 @@ from utils.intelligent_memory_retrieval import (
 
 from .simple.base import SimpleTool
 
+# Model used for memory operations (OpenRouter format), resolved once at import
+MEMORY_TOOL_MODEL = os.getenv("MEMORY_TOOL_MODEL", "google/gemini-2.5-flash")
+
 # Field descriptions for the memory manager tool
 MEMORY_FIELD_DESCRIPTIONS = {
-    "action": "Action to perform: save, recall, analyze, detect_env, rebuild_index, cleanup, export, import",
+    "action": "Action to perform: save, batch_save, recall, analyze, detect_env, rebuild_index, cleanup, export, import",
     "content": "Content to save (for save action) or search query (for recall action)",
+    "items": "Memories to save (for batch_save action): objects with content and optional metadata, tags, mem_type, importance, layer",
     "layer": "Memory layer: global (cross-project), project (current project), session (current session)",
     "metadata": "Additional metadata for the memory (tags, type, category, etc.)",
     "filters": "Filters for recall: layer, metadata values, date ranges",
@@ -54,6 +61,7 @@ class MemoryManagerRequest(ToolRequest):
 
     action: str = Field(..., description=MEMORY_FIELD_DESCRIPTIONS["action"])
     content: Optional[str] = Field(None, description=MEMORY_FIELD_DESCRIPTIONS["content"])
+    items: Optional[list[dict]] = Field(None, description=MEMORY_FIELD_DESCRIPTIONS["items"])
     layer: Optional[str] = Field("session", description=MEMORY_FIELD_DESCRIPTIONS["layer"])
     metadata: Optional[dict] = Field(None, description=MEMORY_FIELD_DESCRIPTIONS["metadata"])
     filters: Optional[dict] = Field(None, description=MEMORY_FIELD_DESCRIPTIONS["filters"])
@@ -93,8 +101,7 @@ class MemoryManagerTool(SimpleTool):
         """Override model selection to always use Gemini 2.5 Flash for memory operations"""
         # 强制记忆模块只使用 Gemini 2.5 Flash 模型
         # 使用环境变量或默认为 google/gemini-2.5-flash (OpenRouter格式)
-        import os
-        return os.getenv("MEMORY_TOOL_MODEL", "google/gemini-2.5-flash")
+        return MEMORY_TOOL_MODEL
 
     def requires_ai_model(self, request: MemoryManagerRequest) -> bool:
         """
@@ -104,7 +111,16 @@ class MemoryManagerTool(SimpleTool):
         Recall and analyze operations might benefit from AI assistance.
         """
         # Direct operations that don't need AI
-        if request.action in ["save", "detect_env", "rebuild_index", "cleanup", "export", "import", "recall"]:
+        if request.action in [
+            "save",
+            "batch_save",
+            "detect_env",
+            "rebuild_index",
+            "cleanup",
+            "export",
+            "import",
+            "recall",
+        ]:
             return False
 
         # Only analyze operations use AI for better results
@@ -242,10 +258,25 @@ Always optimize for:
             "properties": {
                 "action": {
                     "type": "string",
-                    "enum": ["save", "recall", "analyze", "detect_env", "rebuild_index", "cleanup", "export", "import"],
+                    "enum": [
+                        "save",
+                        "batch_save",
+                        "recall",
+                        "analyze",
+                        "detect_env",
+                        "rebuild_index",
+                        "cleanup",
+                        "export",
+                        "import",
+                    ],
                     "description": MEMORY_FIELD_DESCRIPTIONS["action"],
                 },
                 "content": {"type": "string", "description": MEMORY_FIELD_DESCRIPTIONS["content"]},
+                "items": {
+                    "type": "array",
+                    "items": {"type": "object"},
+                    "description": MEMORY_FIELD_DESCRIPTIONS["items"],
+                },
                 "layer": {
                     "type": "string",
                     "enum": ["global", "project", "session"],
@@ -326,7 +357,7 @@ Always optimize for:
 
     async def prepare_prompt(self, request: MemoryManagerRequest) -> str:
         """Prepare prompt based on the memory action"""
-        if not ENABLE_ENHANCED_MEMORY:
+        if not get_memory_config().enabled:
             return "Enhanced memory is disabled. Please inform the user that they need to set ENABLE_ENHANCED_MEMORY=true to use memory features."
 
         # Auto-detect environment on first use
@@ -338,6 +369,8 @@ Always optimize for:
 
         if action == "save":
             return await self._prepare_save_prompt(request)
+        elif action == "batch_save":
+            return await self._prepare_batch_save_prompt(request)
         elif action == "recall":
             return await self._prepare_recall_prompt(request)
         elif action == "analyze":
@@ -353,7 +386,7 @@ Always optimize for:
         elif action == "import":
             return await self._prepare_import_prompt(request)
         else:
-            return f"Unknown memory action: {action}. Please use one of: save, recall, analyze, detect_env, rebuild_index, cleanup, export, import"
+            return f"Unknown memory action: {action}. Please use one of: save, batch_save, recall, analyze, detect_env, rebuild_index, cleanup, export, import"
 
     async def _prepare_save_prompt(self, request: MemoryManagerRequest) -> str:
         """Prepare prompt for save action"""
@@ -407,6 +440,23 @@ The memory has been indexed and can be recalled using:
         else:
             return "Failed to save memory. The memory system may be experiencing issues."
 
+    async def _prepare_batch_save_prompt(self, request: MemoryManagerRequest) -> str:
+        """Prepare prompt for batch_save action"""
+        if not request.items or not all(isinstance(item, dict) and item.get("content") for item in request.items):
+            return "Error: batch_save requires items, each with content. Please provide the memories to save."
+
+        # One index write for the whole batch; layer appends are coalesced by the memory store
+        keys = enhanced_save_memories(request.items, layer=request.layer or "session")
+        saved = [key for key in keys if key]
+        if not saved:
+            return "Failed to save memories. The memory system may be experiencing issues."
+
+        key_lines = "\n".join(f"- {key}" for key in saved)
+        return f"""Successfully saved {len(saved)} of {len(request.items)} memories with intelligent indexing.
+
+Saved Keys:
+{key_lines}"""
+
     async def _prepare_recall_prompt(self, request: MemoryManagerRequest) -> str:
         """Prepare prompt for recall action"""
         # Parse time range if provided
@@ -719,8 +769,8 @@ Cleanup Results:
 - Memories removed: {removed_count}
 
 Cleanup criteria:
-- Age threshold: Memories older than {os.getenv("MEMORY_DECAY_DAYS", "30")} days
-- Quality threshold: Memories with quality score below {os.getenv("MEMORY_QUALITY_THRESHOLD", "0.3")}
+- Age threshold: Memories older than {MEMORY_DECAY_DAYS} days
+- Quality threshold: Memories with quality score below {MEMORY_QUALITY_THRESHOLD}
 
 The memory system has been optimized by removing old, low-quality entries while preserving important knowledge."""
         except Exception as e:
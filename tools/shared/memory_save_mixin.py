@@ -132,9 +132,9 @@ class MemorySaveMixin:
         """
         try:
             # 检查是否启用了增强记忆
-            from utils.conversation_memory import ENABLE_ENHANCED_MEMORY
+            from utils.conversation_memory import get_memory_config
 
-            if not ENABLE_ENHANCED_MEMORY:
+            if not get_memory_config().enabled:
                 return None
 
             # 检查是否应该保存
@@ -165,16 +165,32 @@ LLM看到自然的对话流程："轮次1 → 轮次2 → 轮次3..."
 
 """
 
+import atexit
+import copy
+import functools
+import heapq
 import json
 import logging
+import mmap
 import os
+import pickle
+import re
+import threading
+import time
 import uuid
+from collections import Counter, OrderedDict, defaultdict
+from dataclasses import dataclass, field
 from datetime import datetime, timezone
 from pathlib import Path
 from typing import Any, Optional
 
 from pydantic import BaseModel
 
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
 logger = logging.getLogger(__name__)
 
 # Configuration constants
@@ -206,26 +222,78 @@ except ValueError:
 
 CONVERSATION_TIMEOUT_SECONDS = CONVERSATION_TIMEOUT_HOURS * 3600
 
+
 # Enhanced Memory Configuration
-ENABLE_ENHANCED_MEMORY = os.getenv("ENABLE_ENHANCED_MEMORY", "true").lower() == "true"
-MEMORY_STORAGE_PATH = Path(os.getenv("MEMORY_STORAGE_PATH", ".XTOOL_memory"))
-AUTO_DETECT_ENV = os.getenv("MEMORY_AUTO_DETECT_ENV", "true").lower() == "true"
-AUTO_SAVE_MEMORY = os.getenv("MEMORY_AUTO_SAVE", "true").lower() == "true"
-
-# Memory layer configurations
-MEMORY_LAYERS = {
-    "global": {
-        "persist": True,
-        "max_items": int(os.getenv("MEMORY_GLOBAL_MAX_ITEMS", "10000")),
-        "file": "global_memory.json",
-    },
-    "project": {
-        "persist": True,
-        "max_items": int(os.getenv("MEMORY_PROJECT_MAX_ITEMS", "5000")),
-        "file": "project_memory.json",
-    },
-    "session": {"persist": False, "max_items": int(os.getenv("MEMORY_SESSION_MAX_ITEMS", "1000")), "file": None},
-}
+def _default_memory_layers() -> dict[str, dict[str, Any]]:
+    """Memory layer configurations, with item limits and eviction policy read from the environment."""
+    # "fifo" evicts the oldest entry; "lfu" evicts the least recalled one (oldest first among ties)
+    eviction = os.getenv("MEMORY_EVICTION_POLICY", "fifo").lower()
+    return {
+        "global": {
+            "persist": True,
+            "max_items": int(os.getenv("MEMORY_GLOBAL_MAX_ITEMS", "10000")),
+            "eviction": eviction,
+            "file": "global_memory.jsonl",
+            "legacy_file": "global_memory.json",
+        },
+        "project": {
+            "persist": True,
+            "max_items": int(os.getenv("MEMORY_PROJECT_MAX_ITEMS", "5000")),
+            "eviction": eviction,
+            "file": "project_memory.jsonl",
+            "legacy_file": "project_memory.json",
+        },
+        "session": {"persist": False, "max_items": int(os.getenv("MEMORY_SESSION_MAX_ITEMS", "1000")), "file": None},
+    }
+
+
+@dataclass
+class MemoryConfig:
+    """
+    Enhanced memory settings.
+
+    The active instance is read through get_memory_config(); tests swap it with
+    set_memory_config() (or monkeypatch ``_config``) instead of reloading this module.
+    """
+
+    enabled: bool = True
+    storage_path: Path = field(default_factory=lambda: Path(".XTOOL_memory"))
+    auto_detect_env: bool = True
+    auto_save: bool = True
+    layers: dict[str, dict[str, Any]] = field(default_factory=_default_memory_layers)
+
+    @classmethod
+    def from_env(cls) -> "MemoryConfig":
+        """Build the configuration from environment variables."""
+        return cls(
+            enabled=os.getenv("ENABLE_ENHANCED_MEMORY", "true").lower() == "true",
+            storage_path=Path(os.getenv("MEMORY_STORAGE_PATH", ".XTOOL_memory")),
+            auto_detect_env=os.getenv("MEMORY_AUTO_DETECT_ENV", "true").lower() == "true",
+            auto_save=os.getenv("MEMORY_AUTO_SAVE", "true").lower() == "true",
+        )
+
+
+_config = MemoryConfig.from_env()
+
+
+def get_memory_config() -> MemoryConfig:
+    """Return the active enhanced memory configuration."""
+    return _config
+
+
+def set_memory_config(config: MemoryConfig) -> MemoryConfig:
+    """Install a new enhanced memory configuration and return the previous one."""
+    global _config
+    previous, _config = _config, config
+    return previous
+
+
+# Import-time snapshot of the configuration, kept for existing importers
+ENABLE_ENHANCED_MEMORY = _config.enabled
+MEMORY_STORAGE_PATH = _config.storage_path
+AUTO_DETECT_ENV = _config.auto_detect_env
+AUTO_SAVE_MEMORY = _config.auto_save
+MEMORY_LAYERS = _config.layers
 
 
 class ConversationTurn(BaseModel):
@@ -1182,44 +1250,253 @@ def _is_valid_uuid(val: str) -> bool:
 # Enhanced Memory Functions
 def _get_memory_storage_path(layer: str) -> Optional[Path]:
     """Get storage path for a memory layer."""
-    if not ENABLE_ENHANCED_MEMORY:
+    config = _config
+    if not config.enabled:
         return None
 
-    if not MEMORY_LAYERS[layer]["persist"]:
+    if not config.layers[layer]["persist"]:
         return None
 
-    file_name = MEMORY_LAYERS[layer]["file"]
+    file_name = config.layers[layer]["file"]
     if not file_name:
         return None
 
     # Create storage directory if it doesn't exist
-    MEMORY_STORAGE_PATH.mkdir(exist_ok=True)
-    return MEMORY_STORAGE_PATH / file_name
+    config.storage_path.mkdir(exist_ok=True)
+    return config.storage_path / file_name
 
 
-def _load_memory_layer(layer: str) -> dict[str, Any]:
-    """Load persisted memory from disk."""
+def _dumps_json(obj: Any) -> bytes:
+    """Serialize to UTF-8 JSON bytes, with orjson when it is installed."""
+    if orjson is not None:
+        return orjson.dumps(obj, option=orjson.OPT_NON_STR_KEYS)
+    return json.dumps(obj, ensure_ascii=False).encode("utf-8")
+
+
+# orjson.JSONDecodeError subclasses ValueError, so callers catch the same errors either way
+_loads_json = orjson.loads if orjson is not None else json.loads
+
+
+def _encode_memory_record(key: str, entry: Optional[dict[str, Any]]) -> bytes:
+    """Encode one line of a layer's JSONL log: an upsert, or a deletion when entry is None."""
+    record = {"key": key, "entry": entry} if entry is not None else {"key": key, "deleted": True}
+    return _dumps_json(record) + b"\n"
+
+
+# Layer logs at least this large are read through mmap; below it the plain buffered read is as cheap
+MEMORY_LOG_MMAP_MIN_BYTES = 4096
+
+
+def _read_memory_log(layer: str) -> tuple[OrderedDict, int]:
+    """
+    Replay a layer's JSONL log into an insertion-ordered dict, oldest entry first.
+
+    A later upsert for a key replaces it and moves it to the end; a deletion record drops it.
+    Returns the data and the number of records read, so callers can tell how stale the log is.
+    """
     storage_path = _get_memory_storage_path(layer)
-    if not storage_path or not storage_path.exists():
-        return {}
+    if not storage_path:
+        return OrderedDict(), 0
+
+    if not storage_path.exists():
+        # Fall back to the pre-JSONL single-document format
+        legacy_path = storage_path.with_name(_config.layers[layer]["legacy_file"])
+        if not legacy_path.exists():
+            return OrderedDict(), 0
+        try:
+            legacy = _loads_json(legacy_path.read_bytes())
+            return OrderedDict(sorted(legacy.items(), key=lambda item: item[1].get("timestamp", ""))), 0
+        except Exception as e:
+            logger.warning(f"Failed to load {layer} memory: {e}")
+            return OrderedDict(), 0
 
     try:
-        with open(storage_path, encoding="utf-8") as f:
-            return json.load(f)
+        with open(storage_path, "rb") as f:
+            if os.fstat(f.fileno()).st_size < MEMORY_LOG_MMAP_MIN_BYTES:
+                return _replay_memory_records(f, storage_path)
+            # Split lines straight out of the page cache rather than through the file object's buffer
+            with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+                return _replay_memory_records(iter(mm.readline, b""), storage_path)
     except Exception as e:
         logger.warning(f"Failed to load {layer} memory: {e}")
-        return {}
+        return OrderedDict(), 0
+
+
+def _replay_memory_records(lines, storage_path: Path) -> tuple[OrderedDict, int]:
+    """Apply JSONL log lines in order; see _read_memory_log."""
+    data = OrderedDict()
+    records = 0
+    for line in lines:
+        try:
+            record = _loads_json(line)
+            key = record["key"]
+            data.pop(key, None)
+            if not record.get("deleted"):
+                data[key] = record["entry"]
+        except (ValueError, KeyError, TypeError):
+            # A torn final line from an interrupted append; skip it
+            logger.debug(f"Skipping unreadable record in {storage_path}")
+            continue
+        records += 1
+    return data, records
+
+
+def _log_signature(path: Path) -> Optional[tuple[int, int]]:
+    """Cheap change detector for a layer log: (mtime_ns, size), or None if it does not exist."""
+    try:
+        stat = path.stat()
+    except OSError:
+        return None
+    return stat.st_mtime_ns, stat.st_size
+
+
+class _LayerIndex:
+    """Inverted indexes over one memory layer: metadata (field, value) pairs and content trigrams."""
+
+    def __init__(self, data: dict[str, Any]):
+        self.meta: dict[tuple[str, Any], set[str]] = defaultdict(set)
+        self.trigrams: dict[str, set[str]] = defaultdict(set)
+        for key, memory in data.items():
+            self.add(key, memory)
+
+    @staticmethod
+    def _meta_pairs(memory: dict[str, Any]):
+        for field_name, value in (memory.get("metadata") or {}).items():
+            if isinstance(value, (str, int, float, bool)):
+                yield field_name, value
+
+    @staticmethod
+    def _content_trigrams(memory: dict[str, Any]) -> set[str]:
+        text = str(memory.get("content", "")).lower()
+        return {text[i : i + 3] for i in range(len(text) - 2)}
+
+    def add(self, key: str, memory: dict[str, Any]):
+        for pair in self._meta_pairs(memory):
+            self.meta[pair].add(key)
+        for trigram in self._content_trigrams(memory):
+            self.trigrams[trigram].add(key)
+
+    def remove(self, key: str, memory: dict[str, Any]):
+        for pair in self._meta_pairs(memory):
+            self.meta[pair].discard(key)
+        for trigram in self._content_trigrams(memory):
+            self.trigrams[trigram].discard(key)
+
+    def candidates(self, query: Optional[str], filters: Optional[dict]) -> Optional[set[str]]:
+        """Keys that can possibly match, or None when the indexes cannot narrow the search."""
+        sets = []
+        for field_name, value in (filters or {}).items():
+            if isinstance(value, (str, int, float, bool)):
+                sets.append(self.meta.get((field_name, value), set()))
+        if query and len(query) >= 3:
+            text = query.lower()
+            sets.extend(self.trigrams.get(text[i : i + 3], set()) for i in range(len(text) - 2))
+        if not sets:
+            return None
+        sets.sort(key=len)
+        return sets[0].intersection(*sets[1:])
+
+
+class _CachedLayer:
+    """A layer's parsed entries kept between calls, valid while its log signature is unchanged."""
+
+    def __init__(self, signature: Optional[tuple[int, int]], data: OrderedDict, records: int):
+        self.signature = signature
+        self.data = data
+        self.records = records
+        self._index: Optional[_LayerIndex] = None
+        self._snapshot: Optional[bytes] = None
+        # Times each key was recalled since the last compaction (for LFU eviction)
+        self.hits: Counter = Counter()
+
+    @property
+    def index(self) -> _LayerIndex:
+        if self._index is None:
+            self._index = _LayerIndex(self.data)
+        return self._index
+
+    @property
+    def has_index(self) -> bool:
+        return self._index is not None
+
+    def copy(self) -> OrderedDict:
+        """A private deep copy of the entries; unpickling a snapshot is far cheaper than re-parsing the log."""
+        if self._snapshot is None:
+            self._snapshot = pickle.dumps(self.data, protocol=pickle.HIGHEST_PROTOCOL)
+        return pickle.loads(self._snapshot)
+
+    def invalidate_snapshot(self):
+        self._snapshot = None
+
+    def fold_hits(self):
+        """Move the recall counts into each entry's metadata access_count, so a compaction persists them."""
+        index = self._index
+        for key, count in self.hits.items():
+            entry = self.data.get(key)
+            if entry is None:
+                continue
+            if index is not None:
+                index.remove(key, entry)
+            metadata = entry.get("metadata") or {}
+            entry["metadata"] = {**metadata, "access_count": metadata.get("access_count", 0) + count}
+            if index is not None:
+                index.add(key, entry)
+        self.hits.clear()
+        self._snapshot = None
+
+    def least_frequently_used(self, exclude: str) -> str:
+        """Key with the fewest recalls, counting persisted access_count; the oldest wins ties."""
+        hits = self.hits
+        return min(
+            (key for key in self.data if key != exclude),
+            key=lambda key: hits[key] + (self.data[key].get("metadata") or {}).get("access_count", 0),
+            default=exclude,
+        )
+
+
+# Layer contents shared by save_memory and recall_memory, keyed by storage path.
+# Writers outside save_memory change the log signature or drop the entry.
+_layer_cache: dict[Path, _CachedLayer] = {}
+
+
+def _cached_layer(layer: str) -> Optional[_CachedLayer]:
+    """Return a layer's cached entries, re-reading the log only if it changed on disk."""
+    storage_path = _get_memory_storage_path(layer)
+    if not storage_path:
+        return None
+
+    cached = _layer_cache.get(storage_path)
+    if cached is not None and cached.signature is not None and cached.signature == _log_signature(storage_path):
+        return cached
+
+    # Records still queued by save_memory are part of the layer; write them before re-reading
+    flush_memory(storage_path)
+    data, records = _read_memory_log(layer)
+    cached = _layer_cache[storage_path] = _CachedLayer(_log_signature(storage_path), data, records)
+    return cached
+
+
+def _load_memory_layer(layer: str) -> dict[str, Any]:
+    """Load persisted memory, served from the layer cache while the log is unchanged on disk."""
+    cached = _cached_layer(layer)
+    return cached.copy() if cached else OrderedDict()
 
 
 def _save_memory_layer(layer: str, data: dict[str, Any]) -> bool:
-    """Save memory layer to disk."""
+    """Rewrite a layer's log to hold exactly the given entries (compaction)."""
     storage_path = _get_memory_storage_path(layer)
     if not storage_path:
         return False
 
+    _layer_cache.pop(storage_path, None)
+    # The rewrite supersedes any queued appends
+    with _pending_lock:
+        _pending_writes.pop(storage_path, None)
+    tmp_path = storage_path.with_name(storage_path.name + ".tmp")
     try:
-        with open(storage_path, "w", encoding="utf-8") as f:
-            json.dump(data, f, indent=2, ensure_ascii=False)
+        # Encode the whole layer up front so the file gets one write call
+        tmp_path.write_bytes(b"".join([_encode_memory_record(key, entry) for key, entry in data.items()]))
+        os.replace(tmp_path, storage_path)
         logger.info(f"Memory saved to file: {storage_path}")
         return True
     except Exception as e:
@@ -1227,6 +1504,90 @@ def _save_memory_layer(layer: str, data: dict[str, Any]) -> bool:
         return False
 
 
+# Write-behind queue for layer log appends: saves made within MEMORY_FLUSH_DELAY of each other
+# reach disk in one write per layer file
+MEMORY_FLUSH_DELAY = 0.05
+_pending_writes: dict[Path, list[bytes]] = {}
+_pending_lock = threading.Lock()
+_flush_timer: Optional[threading.Timer] = None
+
+
+def _append_memory_records(layer: str, lines: list[bytes]) -> bool:
+    """Queue encoded records for appending to a layer's log; a timer flushes them shortly after."""
+    global _flush_timer
+    storage_path = _get_memory_storage_path(layer)
+    if not storage_path:
+        return False
+
+    with _pending_lock:
+        _pending_writes.setdefault(storage_path, []).extend(lines)
+        if _flush_timer is None:
+            _flush_timer = threading.Timer(MEMORY_FLUSH_DELAY, flush_memory)
+            _flush_timer.daemon = True
+            _flush_timer.start()
+    return True
+
+
+def flush_memory(storage_path: Optional[Path] = None) -> bool:
+    """Write queued layer records to disk now, for one layer file or all of them."""
+    global _flush_timer
+    success = True
+    with _pending_lock:
+        if storage_path is None:
+            pending = list(_pending_writes.items())
+            _pending_writes.clear()
+            if _flush_timer is not None:
+                _flush_timer.cancel()
+                _flush_timer = None
+        else:
+            lines = _pending_writes.pop(storage_path, None)
+            pending = [(storage_path, lines)] if lines else []
+
+        for path, lines in pending:
+            before = _log_signature(path)
+            try:
+                with open(path, "ab") as f:
+                    f.writelines(lines)
+                logger.debug(f"Memory appended to file: {path} ({len(lines)} records)")
+            except Exception as e:
+                logger.error(f"Failed to append memory to {path}: {e}")
+                _layer_cache.pop(path, None)
+                success = False
+                continue
+            # The cache already holds these records; keep it valid unless someone else wrote meanwhile
+            cached = _layer_cache.get(path)
+            if cached is not None and cached.signature == before:
+                cached.signature = _log_signature(path)
+    return success
+
+
+atexit.register(flush_memory)
+
+
+# Session-layer entries saved by this process, oldest first, as key -> (expires_at, entry).
+# The storage backend cannot list keys, so recall_memory serves the session layer from here.
+_session_memories: OrderedDict = OrderedDict()
+_session_lock = threading.Lock()
+
+
+def _remember_session_memory(key: str, entry: dict[str, Any], max_items: int):
+    """Record a session entry with the conversation TTL, evicting the oldest beyond max_items."""
+    with _session_lock:
+        _session_memories.pop(key, None)
+        _session_memories[key] = (time.monotonic() + CONVERSATION_TIMEOUT_SECONDS, entry)
+        while len(_session_memories) > max_items:
+            _session_memories.popitem(last=False)
+
+
+def _live_session_memories() -> dict[str, Any]:
+    """Unexpired session entries, dropping the expired ones."""
+    now = time.monotonic()
+    with _session_lock:
+        for key in [key for key, (expires_at, _entry) in _session_memories.items() if expires_at <= now]:
+            del _session_memories[key]
+        return {key: entry for key, (_expires_at, entry) in _session_memories.items()}
+
+
 def save_memory(
     content: Any, layer: str = "session", metadata: Optional[dict] = None, key: Optional[str] = None
 ) -> str:
@@ -1242,11 +1603,12 @@ def save_memory(
     Returns:
         str: The key used to store the memory
     """
-    if not ENABLE_ENHANCED_MEMORY:
+    config = _config
+    if not config.enabled:
         logger.debug("Enhanced memory is disabled")
         return ""
 
-    if layer not in MEMORY_LAYERS:
+    if layer not in config.layers:
         logger.warning(f"Invalid memory layer: {layer}")
         return ""
 
@@ -1255,7 +1617,9 @@ def save_memory(
         key = f"mem_{datetime.now(timezone.utc).isoformat()}_{uuid.uuid4().hex[:8]}"
 
     # Load existing memory for the layer
-    memory_data = _load_memory_layer(layer) if layer != "session" else {}
+    cached = _cached_layer(layer) if layer != "session" else None
+    memory_data, log_records = (cached.data, cached.records) if cached else (OrderedDict(), 0)
+    index = cached.index if cached and cached.has_index else None
 
     # Create memory entry
     memory_entry = {
@@ -1264,26 +1628,63 @@ def save_memory(
         "timestamp": datetime.now(timezone.utc).isoformat(),
         "layer": layer,
     }
+    # Cache the entry as persisted, so later edits to the caller's metadata never reach the caches
+    record = _encode_memory_record(key, memory_entry)
+    memory_entry = _loads_json(record)["entry"]
 
-    # Add new entry first
+    # Add new entry first; re-saving a key makes it the newest
+    previous = memory_data.pop(key, None)
     memory_data[key] = memory_entry
-
-    # Check max items limit after adding
-    max_items = MEMORY_LAYERS[layer]["max_items"]
-    if len(memory_data) > max_items:
-        # Remove oldest entries (FIFO)
-        sorted_keys = sorted(memory_data.keys(), key=lambda k: memory_data[k].get("timestamp", ""))
-        # Remove the oldest entries to stay within limit
-        for old_key in sorted_keys[: len(memory_data) - max_items]:
-            del memory_data[old_key]
+    if index is not None:
+        if previous is not None:
+            index.remove(key, previous)
+        index.add(key, memory_entry)
+
+    # Check max items limit after adding: entries are kept oldest-first, so FIFO evicts from the front
+    max_items = config.layers[layer]["max_items"]
+    lfu = cached is not None and config.layers[layer].get("eviction", "fifo") == "lfu"
+    evicted_keys = []
+    while len(memory_data) > max_items:
+        if lfu:
+            old_key = cached.least_frequently_used(exclude=key)
+            old_entry = memory_data.pop(old_key)
+            cached.hits.pop(old_key, None)
+        else:
+            old_key, old_entry = memory_data.popitem(last=False)
+        evicted_keys.append(old_key)
+        if index is not None:
+            index.remove(old_key, old_entry)
 
     # Persist if needed
-    if MEMORY_LAYERS[layer]["persist"]:
-        _save_memory_layer(layer, memory_data)
+    if config.layers[layer]["persist"]:
+        # Append the new record plus a deletion per evicted key; compact the log instead when it
+        # has not been started yet (e.g. migrating a legacy file) or stale records outnumber live ones
+        new_records = 1 + len(evicted_keys)
+        if log_records == 0 or log_records + new_records > 2 * len(memory_data):
+            if cached is not None:
+                cached.fold_hits()
+            saved = _save_memory_layer(layer, memory_data)
+            log_records = len(memory_data)
+        else:
+            lines = [_encode_memory_record(old_key, None) for old_key in evicted_keys]
+            lines.append(record)
+            saved = _append_memory_records(layer, lines)
+            log_records += new_records
+
+        storage_path = _get_memory_storage_path(layer)
+        if saved and cached is not None:
+            # _save_memory_layer drops the cache entry, so re-register the live object
+            cached.signature = _log_signature(storage_path)
+            cached.records = log_records
+            cached.invalidate_snapshot()
+            _layer_cache[storage_path] = cached
+        else:
+            _layer_cache.pop(storage_path, None)
     else:
         # For session layer, store in the current thread's metadata
         storage = get_storage()
-        storage.setex(f"session_memory:{key}", CONVERSATION_TIMEOUT_SECONDS, json.dumps(memory_entry))
+        storage.setex(f"session_memory:{key}", CONVERSATION_TIMEOUT_SECONDS, _dumps_json(memory_entry).decode())
+        _remember_session_memory(key, memory_entry, config.layers[layer]["max_items"])
 
     logger.debug(f"Saved memory to {layer} layer with key: {key}")
     return key
@@ -1304,28 +1705,37 @@ def recall_memory(
     Returns:
         List of matching memories, newest first
     """
-    if not ENABLE_ENHANCED_MEMORY:
+    if not _config.enabled:
         return []
 
     all_memories = []
+    hit_counters = {}
     layers_to_search = [layer] if layer else ["global", "project", "session"]
+    query_lower = query.lower() if query else None
 
     for search_layer in layers_to_search:
-        if search_layer not in MEMORY_LAYERS:
+        if search_layer not in _config.layers:
             continue
 
         # Load layer data
+        candidate_keys = None
         if search_layer == "session":
-            # For session layer, we would need to scan storage for session memories
-            # This is a simplified approach - in production, you might want
-            # to maintain an index of session memory keys
-            # For now, we just use an empty dict as session memories are transient
-            layer_memories = {}
+            layer_memories = _live_session_memories()
         else:
-            layer_memories = _load_memory_layer(search_layer)
+            cached = _cached_layer(search_layer)
+            layer_memories = cached.data if cached else {}
+            if cached:
+                hit_counters[search_layer] = cached.hits
+            if cached and (query or filters):
+                # Narrow to keys the metadata/trigram indexes allow, then verify each below
+                candidate_keys = cached.index.candidates(query, filters)
 
         # Apply filters and collect matches
-        for key, memory in layer_memories.items():
+        if candidate_keys is not None:
+            matches = ((key, layer_memories[key]) for key in candidate_keys)
+        else:
+            matches = layer_memories.items()
+        for key, memory in matches:
             # Check metadata filters
             if filters:
                 metadata = memory.get("metadata", {})
@@ -1335,15 +1745,93 @@ def recall_memory(
             # Check query match (simple substring search)
             if query:
                 content_str = str(memory.get("content", ""))
-                if query.lower() not in content_str.lower():
+                if query_lower not in content_str.lower():
                     continue
 
             # Add to results
-            all_memories.append({"key": key, "layer": search_layer, **memory})
+            all_memories.append((key, search_layer, memory))
+
+    # Newest first, limited; nlargest matches a stable descending sort + slice without sorting every match
+    results = heapq.nlargest(limit, all_memories, key=lambda m: m[2].get("timestamp", ""))
+    for key, search_layer, _memory in results:
+        if search_layer in hit_counters:
+            hit_counters[search_layer][key] += 1
+    # Copy the survivors: the entries are shared with the layer cache and must not be mutated by callers
+    return [{"key": key, "layer": search_layer, **copy.deepcopy(memory)} for key, search_layer, memory in results]
 
-    # Sort by timestamp (newest first) and limit
-    all_memories.sort(key=lambda m: m.get("timestamp", ""), reverse=True)
-    return all_memories[:limit]
+
+def _environment_mtime_token(project_root: str) -> tuple[int, int]:
+    """
+    Change token for detect_environment: mtimes of the project root and .git/HEAD.
+
+    Everything the scan reads is a top-level entry of the root (added/removed files bump the
+    directory mtime) or the branch in HEAD, so an unchanged token means an unchanged result.
+    """
+    tokens = []
+    for path in (Path(project_root), Path(project_root) / ".git" / "HEAD"):
+        try:
+            tokens.append(path.stat().st_mtime_ns)
+        except OSError:
+            tokens.append(0)
+    return tokens[0], tokens[1]
+
+
+# Top-level files that identify a project's tooling, and TODO files worth remembering
+PROJECT_MARKER_FILES = [
+    "README.md",
+    "setup.py",
+    "pyproject.toml",
+    "requirements.txt",
+    "package.json",
+    "Cargo.toml",
+    "go.mod",
+    "pom.xml",
+    "build.gradle",
+]
+TODO_FILE_NAMES = ["TODO.md", "TODO.txt", "TASKS.md"]
+_ENVIRONMENT_FILE_NAMES = frozenset(PROJECT_MARKER_FILES + TODO_FILE_NAMES)
+
+
+def _read_git_head(project_path: Path) -> dict[str, str]:
+    """Return git info (currently the checked-out branch) from .git/HEAD."""
+    git_info = {}
+    try:
+        head_content = (project_path / ".git" / "HEAD").read_text().strip()
+        if head_content.startswith("ref: refs/heads/"):
+            git_info["branch"] = head_content.replace("ref: refs/heads/", "")
+    except FileNotFoundError:
+        pass
+    except Exception as e:
+        logger.debug(f"Failed to read git info: {e}")
+    return git_info
+
+
+def _list_root_files(project_path: Path) -> set[str]:
+    """Marker and TODO files directly under the project root, from a single directory scan."""
+    found = set()
+    try:
+        with os.scandir(project_path) as entries:
+            for entry in entries:
+                # Filter on the name first; is_file() then uses the type readdir already returned
+                if entry.name in _ENVIRONMENT_FILE_NAMES and entry.is_file():
+                    found.add(entry.name)
+    except OSError:
+        pass
+    return found
+
+
+@functools.lru_cache(maxsize=32)
+def _scan_environment(project_root: str, mtime_token: tuple[int, int]) -> dict[str, Any]:
+    """Filesystem part of detect_environment, memoized per project root and change token."""
+    project_path = Path(project_root)
+    root_files = _list_root_files(project_path)
+
+    return {
+        "git_info": _read_git_head(project_path),
+        "files": {name: str(project_path / name) for name in PROJECT_MARKER_FILES if name in root_files},
+        "dependencies": {},
+        "todos": [str(project_path / name) for name in TODO_FILE_NAMES if name in root_files],
+    }
 
 
 def detect_environment(project_root: str) -> dict[str, Any]:
@@ -1356,57 +1844,18 @@ def detect_environment(project_root: str) -> dict[str, Any]:
     Returns:
         Dict containing environment information
     """
-    if not ENABLE_ENHANCED_MEMORY or not AUTO_DETECT_ENV:
+    if not _config.enabled or not _config.auto_detect_env:
         return {}
 
+    scanned = _scan_environment(project_root, _environment_mtime_token(project_root))
     env_info = {
         "project_root": project_root,
         "detected_at": datetime.now(timezone.utc).isoformat(),
-        "git_info": {},
-        "files": {},
-        "dependencies": {},
-        "todos": [],
+        **copy.deepcopy(scanned),
     }
 
     project_path = Path(project_root)
 
-    # Detect git information
-    git_dir = project_path / ".git"
-    if git_dir.exists():
-        try:
-            # Get current branch
-            head_file = git_dir / "HEAD"
-            if head_file.exists():
-                head_content = head_file.read_text().strip()
-                if head_content.startswith("ref: refs/heads/"):
-                    env_info["git_info"]["branch"] = head_content.replace("ref: refs/heads/", "")
-        except Exception as e:
-            logger.debug(f"Failed to read git info: {e}")
-
-    # Detect common project files
-    common_files = [
-        "README.md",
-        "setup.py",
-        "pyproject.toml",
-        "requirements.txt",
-        "package.json",
-        "Cargo.toml",
-        "go.mod",
-        "pom.xml",
-        "build.gradle",
-    ]
-
-    for file_name in common_files:
-        file_path = project_path / file_name
-        if file_path.exists():
-            env_info["files"][file_name] = str(file_path)
-
-    # Look for TODO files
-    todo_patterns = ["TODO.md", "TODO.txt", "TASKS.md"]
-    for pattern in todo_patterns:
-        for todo_file in project_path.glob(pattern):
-            env_info["todos"].append(str(todo_file))
-
     # Save to project memory
     save_memory(
         content=env_info,
@@ -1419,6 +1868,11 @@ def detect_environment(project_root: str) -> dict[str, Any]:
     return env_info
 
 
+# Turn content that routes an auto-saved turn to a persistent layer; global keywords take precedence
+_GLOBAL_MEMORY_KEYWORDS = re.compile("architecture|design pattern|best practice", re.IGNORECASE)
+_PROJECT_MEMORY_KEYWORDS = re.compile("bug|error|issue|todo", re.IGNORECASE)
+
+
 def add_turn_with_memory(thread_id: str, role: str, content: str, save_to_memory: bool = True, **kwargs) -> bool:
     """
     Enhanced version of add_turn that can save to memory layers.
@@ -1428,21 +1882,19 @@ def add_turn_with_memory(thread_id: str, role: str, content: str, save_to_memory
     # Call original add_turn
     success = add_turn(thread_id, role, content, **kwargs)
 
-    if not success or not ENABLE_ENHANCED_MEMORY or not AUTO_SAVE_MEMORY:
+    if not success or not _config.enabled or not _config.auto_save:
         return success
 
-    # Determine which memory layer to use based on content
-    memory_layer = "session"  # Default
-
-    # Simple heuristics for layer selection
-    content_lower = content.lower()
-    if any(keyword in content_lower for keyword in ["architecture", "design pattern", "best practice"]):
-        memory_layer = "global"
-    elif any(keyword in content_lower for keyword in ["bug", "error", "issue", "todo"]):
-        memory_layer = "project"
-
     # Save to memory
     if save_to_memory:
+        # Simple heuristics for layer selection, session by default
+        if _GLOBAL_MEMORY_KEYWORDS.search(content):
+            memory_layer = "global"
+        elif _PROJECT_MEMORY_KEYWORDS.search(content):
+            memory_layer = "project"
+        else:
+            memory_layer = "session"
+
         save_memory(
             content=content,
             layer=memory_layer,
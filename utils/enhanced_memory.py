@@ -13,6 +13,7 @@
 - 协调机制：层级间信息流转和冲突解决
 """
 
+import heapq
 import json
 import logging
 import os
@@ -228,10 +229,10 @@ class MemoryLayer(ABC):
 
             results.append(item)
 
-        # 排序：相关度 > 质量 > 访问时间
-        results.sort(key=lambda x: (x.relevance_score, x.calculate_decay_score(), x.last_accessed), reverse=True)
-
-        return results[:limit]
+        # 排序：相关度 > 质量 > 访问时间；只取前 limit 条，不必整体排序
+        return heapq.nlargest(
+            limit, results, key=lambda x: (x.relevance_score, x.calculate_decay_score(), x.last_accessed)
+        )
 
     def remove_item(self, item_id: str) -> bool:
         """删除记忆项"""
@@ -10,18 +10,24 @@ This module implements advanced memory management features including:
 - Structured recall order: type → index → specified files
 """
 
-import json
+import copy
+import functools
+import heapq
 import logging
 import os
+import time
 from collections import defaultdict
 from datetime import datetime, timedelta, timezone
+from pathlib import Path
 from typing import Any, Optional
 
 from .conversation_memory import (
-    ENABLE_ENHANCED_MEMORY,
-    MEMORY_STORAGE_PATH,
+    _cached_layer,
+    _dumps_json,
     _load_memory_layer,
+    _loads_json,
     _save_memory_layer,
+    get_memory_config,
 )
 from .conversation_memory import (
     save_memory as base_save_memory,
@@ -44,6 +50,37 @@ MEMORY_TOKEN_LIMIT = int(os.getenv("MEMORY_TOKEN_LIMIT", "20000"))
 RECALL_ORDER = ["type", "index", "files"]  # 类型 → 索引 → 指定文件
 
 
+def _timestamp_epoch(timestamp: Any) -> Optional[float]:
+    """Parse a stored ISO timestamp to unix epoch seconds; None if not a string, unparseable or naive."""
+    parts = _timestamp_parts(timestamp)
+    return parts[0] if parts is not None and parts[1] else None
+
+
+def _timestamp_parts(timestamp: Any) -> Optional[tuple[float, bool]]:
+    """
+    Parse a stored ISO timestamp to (epoch seconds, is_aware); None if not a string or unparseable.
+
+    Naive timestamps are read as UTC wall-clock time, so two naive stamps differ by exactly what
+    subtracting the datetimes would give. Only compare epochs whose is_aware flags agree.
+    """
+    # Stored timestamps may be any JSON value; only strings reach the cache (lists are unhashable)
+    if not isinstance(timestamp, str):
+        return None
+    return _parse_timestamp_parts(timestamp)
+
+
+@functools.lru_cache(maxsize=4096)
+def _parse_timestamp_parts(timestamp: str) -> Optional[tuple[float, bool]]:
+    """Cached body of _timestamp_parts."""
+    try:
+        dt = datetime.fromisoformat(timestamp.replace("Z", "+00:00"))
+    except Exception:
+        return None
+    if dt.tzinfo is None:
+        return dt.replace(tzinfo=timezone.utc).timestamp(), False
+    return dt.timestamp(), True
+
+
 # Index structure for fast lookups
 class MemoryIndex:
     """
@@ -71,6 +108,9 @@ class MemoryIndex:
         # Reverse lookup
         self.memory_metadata: dict[str, dict[str, Any]] = {}  # key -> metadata
 
+        # Bitmap view of the set indexes, built lazily by filter_keys and then kept in step with writes
+        self._bitmaps: Optional[dict[str, Any]] = None
+
     def add_memory(self, key: str, layer: str, metadata: dict[str, Any], timestamp: str):
         """Add a memory entry to all relevant indexes."""
         # Layer index
@@ -88,10 +128,13 @@ class MemoryIndex:
         self.type_index[mem_type].add(key)
 
         # Time index (bucket by day)
+        epoch = None
         try:
             dt = datetime.fromisoformat(timestamp.replace("Z", "+00:00"))
             time_bucket = dt.strftime("%Y-%m-%d")
             self.time_index[time_bucket].add(key)
+            if dt.tzinfo is not None:
+                epoch = dt.timestamp()
         except Exception as e:
             logger.debug(f"Failed to parse timestamp {timestamp}: {e}")
 
@@ -106,15 +149,25 @@ class MemoryIndex:
             "tags": tags,
             "type": mem_type,
             "timestamp": timestamp,
+            "epoch": epoch,  # parsed once here so scoring can skip fromisoformat
             "quality_score": quality,
         }
 
+        if self._bitmaps is not None:
+            self._mark_bitmaps(key, layer, tags, mem_type, quality_bucket, True)
+
     def remove_memory(self, key: str):
         """Remove a memory entry from all indexes."""
         metadata = self.memory_metadata.get(key)
         if not metadata:
             return
 
+        if self._bitmaps is not None:
+            quality_bucket = round(metadata.get("quality_score", 1.0), 1)
+            self._mark_bitmaps(
+                key, metadata["layer"], metadata.get("tags", []), metadata["type"], quality_bucket, False
+            )
+
         # Remove from all indexes
         self.layer_index[metadata["layer"]].discard(key)
 
@@ -138,6 +191,10 @@ class MemoryIndex:
         # Remove metadata
         del self.memory_metadata[key]
 
+        # Removed rows stay allocated (a re-added key reuses its row); rebuild once they dominate
+        if self._bitmaps is not None and len(self._bitmaps["keys"]) > 2 * len(self.memory_metadata) + 64:
+            self._bitmaps = None
+
     def search_by_tags(self, tags: list[str], match_all: bool = False) -> set[str]:
         """Search memories by tags."""
         if not tags:
@@ -207,6 +264,94 @@ class MemoryIndex:
         """Search memories by layer."""
         return self.layer_index.get(layer, set()).copy()
 
+    def _build_bitmaps(self) -> dict[str, Any]:
+        """Pack the tag/type/layer/quality indexes into one int bitmap per value, one bit per memory."""
+        keys = list(self.memory_metadata)
+        rows = {key: row for row, key in enumerate(keys)}
+        n_bytes = (len(keys) + 7) // 8
+
+        def pack(index: dict) -> dict:
+            bitmaps = {}
+            for value, members in index.items():
+                buf = bytearray(n_bytes)
+                for key in members:
+                    row = rows.get(key)
+                    if row is not None:
+                        buf[row >> 3] |= 1 << (row & 7)
+                bitmaps[value] = int.from_bytes(buf, "little")
+            return bitmaps
+
+        return {
+            "keys": keys,
+            "rows": rows,
+            "live": (1 << len(keys)) - 1,
+            "tag": pack(self.tag_index),
+            "type": pack(self.type_index),
+            "layer": pack(self.layer_index),
+            "quality": pack(self.quality_index),
+        }
+
+    def _mark_bitmaps(self, key: str, layer: str, tags: list[str], mem_type: str, quality_bucket: float, present: bool):
+        """Set or clear one memory's bit in the built bitmaps, so a write does not force a full rebuild."""
+        bitmaps = self._bitmaps
+        row = bitmaps["rows"].get(key)
+        if row is None:
+            if not present:
+                return
+            row = bitmaps["rows"][key] = len(bitmaps["keys"])
+            bitmaps["keys"].append(key)
+        bit = 1 << row
+        bitmaps["live"] = bitmaps["live"] | bit if present else bitmaps["live"] & ~bit
+
+        values = [("layer", layer), ("type", mem_type), ("quality", quality_bucket)]
+        values += [("tag", tag.lower()) for tag in tags]
+        for dimension, value in values:
+            dimension_bitmaps = bitmaps[dimension]
+            current = dimension_bitmaps.get(value, 0)
+            dimension_bitmaps[value] = current | bit if present else current & ~bit
+
+    def filter_keys(
+        self,
+        tags: Optional[list[str]] = None,
+        match_all: bool = False,
+        mem_type: Optional[str] = None,
+        layer: Optional[str] = None,
+        min_quality: Optional[float] = None,
+        max_quality: float = 1.0,
+    ) -> set[str]:
+        """Combined tag/type/layer/quality search, ANDing bitmaps instead of intersecting sets."""
+        if self._bitmaps is None:
+            self._bitmaps = self._build_bitmaps()
+        bitmaps = self._bitmaps
+
+        mask = bitmaps["live"]
+        if tags:
+            tag_bits = [bitmaps["tag"].get(tag.lower(), 0) for tag in tags]
+            combined = tag_bits[0]
+            for bits in tag_bits[1:]:
+                combined = combined & bits if match_all else combined | bits
+            mask &= combined
+        if mem_type:
+            mask &= bitmaps["type"].get(mem_type, 0)
+        if layer:
+            mask &= bitmaps["layer"].get(layer, 0)
+        if min_quality is not None:
+            # Same bucket walk as search_by_quality
+            quality_bits = 0
+            for score_bucket in range(int(min_quality * 10), int(max_quality * 10) + 1):
+                quality_bits |= bitmaps["quality"].get(score_bucket / 10.0, 0)
+            mask &= quality_bits
+
+        # Decode set bits via the binary string so the scan stays in C
+        keys = bitmaps["keys"]
+        bits = bin(mask)[:1:-1]
+        result = set()
+        row = bits.find("1")
+        while row != -1:
+            result.add(keys[row])
+            row = bits.find("1", row + 1)
+        return result
+
     def get_memory_metadata(self, key: str) -> Optional[dict[str, Any]]:
         """Get metadata for a memory key."""
         return self.memory_metadata.get(key)
@@ -218,12 +363,21 @@ class MemoryIndex:
             "last_updated": self.last_updated,
             "tag_index": {tag: list(keys) for tag, keys in self.tag_index.items()},
             "type_index": {typ: list(keys) for typ, keys in self.type_index.items()},
-            "time_index": {time: list(keys) for time, keys in self.time_index.items()},
+            "time_index": {bucket: list(keys) for bucket, keys in self.time_index.items()},
             "quality_index": {str(score): list(keys) for score, keys in self.quality_index.items()},
             "layer_index": {layer: list(keys) for layer, keys in self.layer_index.items()},
             "memory_metadata": self.memory_metadata,
         }
 
+    def dumps(self) -> bytes:
+        """Serialize index to JSON bytes (data only, so loading a store never executes code)."""
+        return _dumps_json(self.to_dict())
+
+    @classmethod
+    def loads(cls, blob: bytes) -> "MemoryIndex":
+        """Deserialize index from bytes produced by dumps()."""
+        return cls.from_dict(_loads_json(blob))
+
     @classmethod
     def from_dict(cls, data: dict[str, Any]) -> "MemoryIndex":
         """Deserialize index from dictionary."""
@@ -238,8 +392,8 @@ class MemoryIndex:
         for typ, keys in data.get("type_index", {}).items():
             index.type_index[typ] = set(keys)
 
-        for time, keys in data.get("time_index", {}).items():
-            index.time_index[time] = set(keys)
+        for bucket, keys in data.get("time_index", {}).items():
+            index.time_index[bucket] = set(keys)
 
         for score_str, keys in data.get("quality_index", {}).items():
             score = float(score_str)
@@ -253,29 +407,31 @@ class MemoryIndex:
         return index
 
 
-# Global memory index instance
+# Global memory index instance, and the storage path it was loaded from
 _memory_index: Optional[MemoryIndex] = None
+_memory_index_path: Optional[Path] = None
 
 
 def get_memory_index() -> MemoryIndex:
-    """Get or create the global memory index."""
-    global _memory_index
+    """Get or create the memory index of the active store, reloading it when the storage path changes."""
+    global _memory_index, _memory_index_path
 
-    if _memory_index is None:
+    storage_path = get_memory_config().storage_path
+    if _memory_index is None or _memory_index_path != storage_path:
+        # Every write saves the index, so nothing is lost by dropping the previous store's copy
         _memory_index = load_memory_index()
+        _memory_index_path = storage_path
 
     return _memory_index
 
 
 def load_memory_index() -> MemoryIndex:
     """Load memory index from disk."""
-    index_path = MEMORY_STORAGE_PATH / MEMORY_INDEX_FILE
+    index_path = get_memory_config().storage_path / MEMORY_INDEX_FILE
 
     if index_path.exists():
         try:
-            with open(index_path, encoding="utf-8") as f:
-                data = json.load(f)
-                return MemoryIndex.from_dict(data)
+            return MemoryIndex.loads(index_path.read_bytes())
         except Exception as e:
             logger.warning(f"Failed to load memory index: {e}")
 
@@ -289,11 +445,13 @@ def save_memory_index(index: Optional[MemoryIndex] = None) -> bool:
         index = get_memory_index()
 
     try:
-        MEMORY_STORAGE_PATH.mkdir(exist_ok=True)
-        index_path = MEMORY_STORAGE_PATH / MEMORY_INDEX_FILE
-
-        with open(index_path, "w", encoding="utf-8") as f:
-            json.dump(index.to_dict(), f, indent=2, ensure_ascii=False)
+        storage_path = get_memory_config().storage_path
+        storage_path.mkdir(exist_ok=True)
+        index_path = storage_path / MEMORY_INDEX_FILE
+        # Write aside and rename, so a crash mid-write never leaves a torn index behind
+        tmp_path = index_path.with_name(index_path.name + ".tmp")
+        tmp_path.write_bytes(index.dumps())
+        os.replace(tmp_path, index_path)
 
         logger.debug(f"Memory index saved to {index_path}")
         return True
@@ -323,7 +481,7 @@ def rebuild_memory_index() -> MemoryIndex:
     return index
 
 
-def calculate_memory_quality(memory: dict[str, Any]) -> float:
+def calculate_memory_quality(memory: dict[str, Any], now: Optional[float] = None) -> float:
     """
     Calculate quality score for a memory based on various factors.
 
@@ -333,22 +491,21 @@ def calculate_memory_quality(memory: dict[str, Any]) -> float:
     - Content length and structure
     - Metadata completeness
     - Relevance indicators
+
+    ``now`` (unix epoch seconds) lets callers scoring many memories read the clock once.
     """
     score = 1.0
 
     # Age factor (decay over time)
     if MEMORY_DECAY_ENABLED:
-        try:
-            timestamp = memory.get("timestamp", "")
-            dt = datetime.fromisoformat(timestamp.replace("Z", "+00:00"))
-            age_days = (datetime.now(timezone.utc) - dt).days
+        epoch = _timestamp_epoch(memory.get("timestamp", ""))
+        if epoch is not None:
+            age_days = int(((time.time() if now is None else now) - epoch) // 86400)
 
             if age_days > MEMORY_DECAY_DAYS:
                 # Linear decay after threshold
                 decay_factor = max(0.3, 1.0 - (age_days - MEMORY_DECAY_DAYS) / MEMORY_DECAY_DAYS)
                 score *= decay_factor
-        except Exception:
-            pass
 
     # Content quality factor
     content = memory.get("content", "")
@@ -407,12 +564,64 @@ def enhanced_save_memory(
     Returns:
         str: The key used to store the memory
     """
-    if not ENABLE_ENHANCED_MEMORY:
+    if not get_memory_config().enabled:
         logger.debug("Enhanced memory is disabled")
         return ""
 
+    index = get_memory_index()
+    key = _save_indexed_memory(index, content, layer, metadata, key, tags, mem_type, importance)
+    if key:
+        save_memory_index(index)
+    return key
+
+
+def enhanced_save_memories(items: list[dict[str, Any]], layer: str = "session") -> list[str]:
+    """
+    Save several memories at once, writing the memory index a single time.
+
+    Args:
+        items: One dict per memory with enhanced_save_memory's keyword arguments ("content" required)
+        layer: Memory layer for items that do not name their own
+
+    Returns:
+        list[str]: The key of each saved memory, "" where a save failed
+    """
+    if not get_memory_config().enabled:
+        logger.debug("Enhanced memory is disabled")
+        return []
+
+    index = get_memory_index()
+    keys = [
+        _save_indexed_memory(
+            index,
+            item.get("content"),
+            item.get("layer") or layer,
+            item.get("metadata"),
+            item.get("key"),
+            item.get("tags"),
+            item.get("mem_type"),
+            item.get("importance"),
+        )
+        for item in items
+    ]
+    if any(keys):
+        save_memory_index(index)
+    return keys
+
+
+def _save_indexed_memory(
+    index: MemoryIndex,
+    content: Any,
+    layer: str,
+    metadata: Optional[dict[str, Any]],
+    key: Optional[str],
+    tags: Optional[list[str]],
+    mem_type: Optional[str],
+    importance: Optional[str],
+) -> str:
+    """Save one memory and add it to the in-memory index; the caller persists the index."""
     # Prepare enhanced metadata
-    enhanced_metadata = metadata or {}
+    enhanced_metadata = dict(metadata or {})
 
     if tags:
         enhanced_metadata["tags"] = tags
@@ -429,27 +638,23 @@ def enhanced_save_memory(
         if auto_tags:
             enhanced_metadata["tags"] = enhanced_metadata.get("tags", []) + auto_tags
 
+    # Calculate initial quality score before saving, so it is persisted with the entry
+    timestamp = datetime.now(timezone.utc).isoformat()
+    memory_entry = {
+        "content": content,
+        "metadata": enhanced_metadata,
+        "timestamp": timestamp,
+        "layer": layer,
+    }
+    quality_score = calculate_memory_quality(memory_entry)
+    enhanced_metadata["quality_score"] = quality_score
+
     # Save using base function
     key = base_save_memory(content, layer, enhanced_metadata, key)
 
     if key:
-        # Update index
-        index = get_memory_index()
-        timestamp = datetime.now(timezone.utc).isoformat()
-
-        # Calculate initial quality score
-        memory_entry = {
-            "content": content,
-            "metadata": enhanced_metadata,
-            "timestamp": timestamp,
-            "layer": layer,
-        }
-        quality_score = calculate_memory_quality(memory_entry)
-        enhanced_metadata["quality_score"] = quality_score
-
         # Add to index
         index.add_memory(key, layer, enhanced_metadata, timestamp)
-        save_memory_index(index)
 
         logger.debug(
             f"Enhanced memory saved with key: {key}, tags: {enhanced_metadata.get('tags', [])}, quality: {quality_score:.2f}"
@@ -458,30 +663,32 @@ def enhanced_save_memory(
     return key
 
 
+# Auto-tagging keywords: programming languages tag themselves, topics map keywords to a tag
+AUTO_TAG_LANGUAGES = ["python", "javascript", "typescript", "java", "cpp", "rust", "go"]
+AUTO_TAG_TOPICS = {
+    "bug": ["bug", "error", "issue", "problem", "fix"],
+    "feature": ["feature", "implement", "add", "new"],
+    "refactor": ["refactor", "cleanup", "improve", "optimize"],
+    "test": ["test", "testing", "unit test", "integration"],
+    "doc": ["document", "documentation", "readme", "comment"],
+    "security": ["security", "vulnerability", "auth", "permission"],
+    "performance": ["performance", "optimize", "speed", "memory"],
+    "architecture": ["architecture", "design", "pattern", "structure"],
+}
+
+
 def extract_auto_tags(content: str) -> list[str]:
     """Extract tags automatically from content."""
     tags = []
     content_lower = content.lower()
 
     # Programming language detection
-    languages = ["python", "javascript", "typescript", "java", "cpp", "rust", "go"]
-    for lang in languages:
+    for lang in AUTO_TAG_LANGUAGES:
         if lang in content_lower:
             tags.append(lang)
 
     # Topic detection
-    topics = {
-        "bug": ["bug", "error", "issue", "problem", "fix"],
-        "feature": ["feature", "implement", "add", "new"],
-        "refactor": ["refactor", "cleanup", "improve", "optimize"],
-        "test": ["test", "testing", "unit test", "integration"],
-        "doc": ["document", "documentation", "readme", "comment"],
-        "security": ["security", "vulnerability", "auth", "permission"],
-        "performance": ["performance", "optimize", "speed", "memory"],
-        "architecture": ["architecture", "design", "pattern", "structure"],
-    }
-
-    for tag, keywords in topics.items():
+    for tag, keywords in AUTO_TAG_TOPICS.items():
         if any(keyword in content_lower for keyword in keywords):
             tags.append(tag)
 
@@ -516,77 +723,121 @@ def intelligent_recall_memory(
     Returns:
         List of matching memories with relevance scoring
     """
-    if not ENABLE_ENHANCED_MEMORY:
+    if not get_memory_config().enabled:
         return []
 
-    index = get_memory_index()
+    matches = _load_recall_matches(query, tags, mem_type, layer, time_range, min_quality, match_mode)
+    return _rank_recall_matches(matches, query, tags, mem_type, limit, include_metadata)
 
-    # Start with all memories
-    candidate_keys = set(index.memory_metadata.keys())
-
-    # Apply filters progressively
-    if tags:
-        tag_matches = index.search_by_tags(tags, match_all=(match_mode == "all"))
-        candidate_keys &= tag_matches
 
-    if mem_type:
-        type_matches = index.search_by_type(mem_type)
-        candidate_keys &= type_matches
+def _load_recall_matches(
+    query: Optional[str],
+    tags: Optional[list[str]],
+    mem_type: Optional[str],
+    layer: Optional[str],
+    time_range: Optional[tuple[datetime, datetime]],
+    min_quality: float,
+    match_mode: str,
+) -> list[tuple[str, str, dict[str, Any]]]:
+    """Filter the index and stored layers down to (key, layer, memory) matches, unscored."""
+    index = get_memory_index()
 
-    if layer:
-        layer_matches = index.search_by_layer(layer)
-        candidate_keys &= layer_matches
+    # Apply tag/type/layer/quality filters in one bitmap pass
+    candidate_keys = index.filter_keys(
+        tags=tags,
+        match_all=(match_mode == "all"),
+        mem_type=mem_type,
+        layer=layer,
+        min_quality=min_quality if min_quality is not None else 0.0,
+    )
 
     if time_range:
         time_matches = index.search_by_time_range(time_range[0], time_range[1])
         candidate_keys &= time_matches
 
-    # Apply quality filter
-    quality_matches = index.search_by_quality(min_quality, 1.0)
-    candidate_keys &= quality_matches
-
-    # Load and score memories
-    results = []
+    # Load matching memories
+    matches = []
     layers_to_search = [layer] if layer else ["global", "project"]
+    query_lower = str(query).lower() if query else ""
 
     for search_layer in layers_to_search:
-        layer_data = _load_memory_layer(search_layer)
+        # Read the shared layer cache rather than a private copy of the whole layer;
+        # _rank_recall_matches copies only the memories it returns
+        cached = _cached_layer(search_layer)
+        if not cached:
+            continue
+        layer_data = cached.data
+
+        # Content trigrams rule out most non-matching keys before the substring check
+        text_keys = cached.index.candidates(query_lower, None) if query_lower else None
 
         for key in candidate_keys:
-            if key not in layer_data:
+            if key not in layer_data or (text_keys is not None and key not in text_keys):
                 continue
 
             memory = layer_data[key]
 
             # Text search if query provided
-            if query:
-                content_str = str(memory.get("content", ""))
-                query_str = str(query) if query is not None else ""
-                if query_str and query_str.lower() not in content_str.lower():
-                    continue
+            if query_lower and query_lower not in str(memory.get("content", "")).lower():
+                continue
 
-            # Calculate relevance score
-            relevance = calculate_relevance_score(memory, query, tags, mem_type)
+            matches.append((key, search_layer, memory))
 
-            # Prepare result
-            result = {
-                "key": key,
-                "layer": search_layer,
-                "content": memory.get("content"),
-                "timestamp": memory.get("timestamp"),
-                "relevance_score": relevance,
-            }
+    return matches
 
-            if include_metadata:
-                result["metadata"] = memory.get("metadata", {})
 
-            results.append(result)
+def _rank_recall_matches(
+    matches: list[tuple[str, str, dict[str, Any]]],
+    query: Optional[str],
+    tags: Optional[list[str]],
+    mem_type: Optional[str],
+    limit: int,
+    include_metadata: bool,
+) -> list[dict[str, Any]]:
+    """Score matches and return the top ``limit`` as recall result dicts."""
+    index = get_memory_index()
 
-    # Sort by relevance and timestamp
-    results.sort(key=lambda x: (x["relevance_score"], x["timestamp"]), reverse=True)
+    # Score all matches in one pass, against one clock reading and the index's parsed timestamps
+    scores = calculate_relevance_scores_batch(
+        [memory for _, _, memory in matches],
+        query,
+        tags,
+        mem_type,
+        now=time.time(),
+        epochs=[(index.memory_metadata.get(key) or {}).get("epoch") for key, _, _ in matches],
+    )
 
-    # Apply limit
-    return results[:limit]
+    results = []
+    for (key, search_layer, memory), relevance in zip(matches, scores):
+        result = {
+            "key": key,
+            "layer": search_layer,
+            "content": memory.get("content"),
+            "timestamp": memory.get("timestamp"),
+            "relevance_score": relevance,
+        }
+
+        if include_metadata:
+            result["metadata"] = memory.get("metadata", {})
+
+        results.append(result)
+
+    # Top results by relevance and timestamp
+    top = heapq.nlargest(limit, results, key=lambda x: (x["relevance_score"], x["timestamp"]))
+
+    # Copy the survivors: the entries are shared with the layer cache and must not be mutated by callers
+    caches = {}
+    for result in top:
+        result["content"] = copy.deepcopy(result["content"])
+        if include_metadata:
+            result["metadata"] = copy.deepcopy(result["metadata"])
+
+        # Count the recall in the layer cache, which feeds LFU eviction
+        if result["layer"] not in caches:
+            caches[result["layer"]] = _cached_layer(result["layer"])
+        if caches[result["layer"]] is not None:
+            caches[result["layer"]].hits[result["key"]] += 1
+    return top
 
 
 def calculate_relevance_score(
@@ -596,59 +847,77 @@ def calculate_relevance_score(
     mem_type: Optional[str],
 ) -> float:
     """Calculate relevance score for a memory based on search criteria."""
-    score = 0.0
-    metadata = memory.get("metadata", {})
+    return calculate_relevance_scores_batch([memory], query, tags, mem_type)[0]
 
-    # Base quality score
-    score += metadata.get("quality_score", 0.5) * 0.3
 
-    # Query match scoring
-    if query:
-        content_str = str(memory.get("content", "")).lower()
-        query_str = str(query) if query is not None else ""
-        query_lower = query_str.lower()
+def calculate_relevance_scores_batch(
+    memories: list[dict[str, Any]],
+    query: Optional[str],
+    tags: Optional[list[str]],
+    mem_type: Optional[str],
+    now: Optional[float] = None,
+    epochs: Optional[list[Optional[float]]] = None,
+) -> list[float]:
+    """
+    Score many memories at once, computing the query-side terms and the clock only once.
+
+    ``epochs`` optionally supplies each memory's pre-parsed timestamp (unix seconds, e.g. from
+    the index metadata); entries that are None fall back to parsing the memory's timestamp.
+    """
+    query_lower = str(query).lower() if query else ""
+    query_tags = {tag.lower() for tag in tags} if tags else set()
+    if now is None:
+        now = time.time()
+
+    scores = []
+    for i, memory in enumerate(memories):
+        score = 0.0
+        metadata = memory.get("metadata", {})
 
-        # Exact match bonus
-        if query_lower in content_str:
-            score += 0.3
+        # Base quality score
+        score += metadata.get("quality_score", 0.5) * 0.3
 
-            # Position bonus (earlier matches score higher)
+        # Query match scoring
+        if query:
+            content_str = str(memory.get("content", "")).lower()
+
+            # Exact match bonus, plus position bonus (earlier matches score higher)
             position = content_str.find(query_lower)
             if position >= 0:
+                score += 0.3
                 position_factor = 1.0 - (position / max(len(content_str), 1))
                 score += position_factor * 0.1
 
-    # Tag match scoring
-    if tags:
-        memory_tags = {tag.lower() for tag in metadata.get("tags", [])}
-        query_tags = {tag.lower() for tag in tags}
-
-        if memory_tags and query_tags:
-            # Jaccard similarity
-            intersection = len(memory_tags & query_tags)
-            union = len(memory_tags | query_tags)
-            if union > 0:
+        # Tag match scoring
+        if query_tags:
+            memory_tags = {tag.lower() for tag in metadata.get("tags", [])}
+
+            if memory_tags:
+                # Jaccard similarity
+                intersection = len(memory_tags & query_tags)
+                union = len(memory_tags | query_tags)
                 score += (intersection / union) * 0.2
 
-    # Type match scoring
-    if mem_type and metadata.get("type") == mem_type:
-        score += 0.2
+        # Type match scoring
+        if mem_type and metadata.get("type") == mem_type:
+            score += 0.2
 
-    # Recency bonus
-    try:
-        timestamp = memory.get("timestamp", "")
-        dt = datetime.fromisoformat(timestamp.replace("Z", "+00:00"))
-        age_hours = (datetime.now(timezone.utc) - dt).total_seconds() / 3600
+        # Recency bonus
+        epoch = epochs[i] if epochs is not None else None
+        if epoch is None:
+            epoch = _timestamp_epoch(memory.get("timestamp", ""))
+        if epoch is not None:
+            age_hours = (now - epoch) / 3600
 
-        # Logarithmic decay - recent memories score higher
-        if age_hours < 24:
-            score += 0.1
-        elif age_hours < 168:  # 1 week
-            score += 0.05
-    except Exception:
-        pass
+            # Logarithmic decay - recent memories score higher
+            if age_hours < 24:
+                score += 0.1
+            elif age_hours < 168:  # 1 week
+                score += 0.05
 
-    return min(1.0, max(0.0, score))
+        scores.append(min(1.0, max(0.0, score)))
+
+    return scores
 
 
 def update_memory_access(key: str, layer: str):
@@ -680,7 +949,7 @@ def update_memory_access(key: str, layer: str):
 
 def cleanup_old_memories(days: int = MEMORY_DECAY_DAYS * 2):
     """Remove memories older than specified days with low quality scores."""
-    if not ENABLE_ENHANCED_MEMORY or not MEMORY_DECAY_ENABLED:
+    if not get_memory_config().enabled or not MEMORY_DECAY_ENABLED:
         return
 
     logger.info(f"Cleaning up memories older than {days} days with low quality...")
@@ -761,7 +1030,7 @@ def token_aware_memory_recall(
             "truncated": bool
         }
     """
-    if not ENABLE_ENHANCED_MEMORY:
+    if not get_memory_config().enabled:
         return {
             "total_tokens": 0,
             "recall_summary": {"by_type": {}, "by_index": {}, "specified_files": {}},
@@ -858,6 +1127,24 @@ def token_aware_memory_recall(
     return result
 
 
+def _fit_memory_tokens(memory: dict[str, Any], include_metadata: bool, budget: int) -> Optional[int]:
+    """
+    Token cost of a recalled memory, or None if it does not fit in the remaining budget.
+
+    The content alone is a lower bound on the cost, so a memory whose content already
+    overflows the budget is rejected before its metadata is rendered to a string.
+    """
+    content = str(memory.get("content", ""))
+    if estimate_tokens(content) > budget:
+        return None
+
+    if include_metadata:
+        content += str(memory.get("metadata", {}))
+
+    memory_tokens = estimate_tokens(content)
+    return memory_tokens if memory_tokens <= budget else None
+
+
 def _recall_by_type(
     query: Optional[str],
     tags: Optional[list[str]],
@@ -899,37 +1186,31 @@ def _recall_by_type(
     # 如果指定了特定类型，优先处理
     types_to_process = [mem_type] if mem_type else important_types
 
+    # 只扫描一次存储，再按索引中的类型分桶，而不是每种类型各查一遍
+    matches_by_type = defaultdict(list)
+    if get_memory_config().enabled:
+        type_of = get_memory_index().memory_metadata
+        for match in _load_recall_matches(query, tags, mem_type, layer, time_range, min_quality, match_mode):
+            matches_by_type[type_of[match[0]]["type"]].append(match)
+
     for type_name in types_to_process:
         if total_tokens >= remaining_tokens:
             break
 
-        # 获取该类型的记忆
-        type_memories = intelligent_recall_memory(
-            query=query,
-            tags=tags,
-            mem_type=type_name,
-            layer=layer,
-            time_range=time_range,
-            min_quality=min_quality,
-            match_mode=match_mode,
-            limit=50,  # 每种类型最多50条
-            include_metadata=include_metadata,
+        # 获取该类型的记忆（每种类型最多50条，按该类型打分）
+        type_memories = _rank_recall_matches(
+            matches_by_type.get(type_name, []), query, tags, type_name, 50, include_metadata
         )
 
         # 按 token 预算添加记忆
         for memory in type_memories:
-            content = str(memory.get("content", ""))
-            if include_metadata:
-                content += str(memory.get("metadata", {}))
-
-            memory_tokens = estimate_tokens(content)
-
-            if total_tokens + memory_tokens <= remaining_tokens:
-                memories.append(memory)
-                total_tokens += memory_tokens
-            else:
+            memory_tokens = _fit_memory_tokens(memory, include_metadata, remaining_tokens - total_tokens)
+            if memory_tokens is None:
                 break
 
+            memories.append(memory)
+            total_tokens += memory_tokens
+
         if mem_type:  # 如果指定了类型，只处理这一种
             break
 
@@ -972,19 +1253,14 @@ def _recall_by_index(
             if memory["key"] in exclude_keys:
                 continue
 
-            content = str(memory.get("content", ""))
-            if include_metadata:
-                content += str(memory.get("metadata", {}))
-
-            memory_tokens = estimate_tokens(content)
-
-            if total_tokens + memory_tokens <= remaining_tokens:
-                memories.append(memory)
-                total_tokens += memory_tokens
-                exclude_keys.add(memory["key"])
-            else:
+            memory_tokens = _fit_memory_tokens(memory, include_metadata, remaining_tokens - total_tokens)
+            if memory_tokens is None:
                 break
 
+            memories.append(memory)
+            total_tokens += memory_tokens
+            exclude_keys.add(memory["key"])
+
     # 按时间索引检索最近的记忆
     if total_tokens < remaining_tokens:
         recent_memories = intelligent_recall_memory(
@@ -1000,19 +1276,14 @@ def _recall_by_index(
             if memory["key"] in exclude_keys:
                 continue
 
-            content = str(memory.get("content", ""))
-            if include_metadata:
-                content += str(memory.get("metadata", {}))
-
-            memory_tokens = estimate_tokens(content)
-
-            if total_tokens + memory_tokens <= remaining_tokens:
-                memories.append(memory)
-                total_tokens += memory_tokens
-                exclude_keys.add(memory["key"])
-            else:
+            memory_tokens = _fit_memory_tokens(memory, include_metadata, remaining_tokens - total_tokens)
+            if memory_tokens is None:
                 break
 
+            memories.append(memory)
+            total_tokens += memory_tokens
+            exclude_keys.add(memory["key"])
+
     return memories, total_tokens
 
 
@@ -1039,19 +1310,14 @@ def _recall_specified_files(
             if memory["key"] in exclude_keys:
                 continue
 
-            content = str(memory.get("content", ""))
-            if include_metadata:
-                content += str(memory.get("metadata", {}))
-
-            memory_tokens = estimate_tokens(content)
-
-            if total_tokens + memory_tokens <= remaining_tokens:
-                memories.append(memory)
-                total_tokens += memory_tokens
-                exclude_keys.add(memory["key"])
-            else:
+            memory_tokens = _fit_memory_tokens(memory, include_metadata, remaining_tokens - total_tokens)
+            if memory_tokens is None:
                 break
 
+            memories.append(memory)
+            total_tokens += memory_tokens
+            exclude_keys.add(memory["key"])
+
     return memories, total_tokens
 
 
@@ -1077,7 +1343,7 @@ def _get_index_categories_used(memories: list[dict[str, Any]]) -> list[str]:
 
 def get_memory_stats_with_tokens() -> dict[str, Any]:
     """获取包含 token 统计的记忆系统状态。"""
-    if not ENABLE_ENHANCED_MEMORY:
+    if not get_memory_config().enabled:
         return {"enabled": False}
 
     index = get_memory_index()
@@ -1115,5 +1381,5 @@ def get_memory_stats_with_tokens() -> dict[str, Any]:
 
 
 # Initialize index on module load
-if ENABLE_ENHANCED_MEMORY:
-    _memory_index = load_memory_index()
+if get_memory_config().enabled:
+    get_memory_index()
@@ -16,6 +16,11 @@ import os
 from datetime import datetime, timezone
 from typing import Any, Optional
 
+try:
+    from numba import njit
+except ImportError:
+    njit = None
+
 from .conversation_memory import _load_memory_layer, _save_memory_layer
 from .intelligent_memory_retrieval import (
     MEMORY_DECAY_DAYS,
@@ -53,6 +58,52 @@ class DecayCurve:
     STEP = "step"
 
 
+# 衰减曲线 -> 内核中使用的整数编号（未知曲线不衰减）
+_DECAY_CURVE_IDS = {DecayCurve.LINEAR: 0, DecayCurve.EXPONENTIAL: 1, DecayCurve.LOGARITHMIC: 2, DecayCurve.STEP: 3}
+
+
+def _decay_kernel(age_days: float, curve_id: int, decay_days: float) -> float:
+    """
+    衰减曲线的纯数值部分；只用标量运算，安装了 numba 时会被编译
+
+    numba 是可选依赖，不在任何 requirements 文件中，因此 CI 只测试纯 Python 路径。
+    """
+    if curve_id < 0 or age_days <= decay_days:
+        return 1.0
+    if curve_id == 0:
+        # 线性衰减
+        return max(0.1, 1.0 - (age_days - decay_days) / (decay_days * 2))
+    if curve_id == 1:
+        # 指数衰减 e^(-λt)，λ 控制衰减速度
+        return max(0.1, math.exp(-0.05 * (age_days - decay_days)))
+    if curve_id == 2:
+        # 对数衰减（衰减速度逐渐减慢）：1 - log(1 + t) / log(1 + max_t)
+        return max(0.1, 1.0 - math.log(1 + age_days - decay_days) / math.log(1 + decay_days * 10))
+    # 阶梯衰减
+    if age_days <= decay_days * 2:
+        return 0.7
+    if age_days <= decay_days * 4:
+        return 0.5
+    if age_days <= decay_days * 8:
+        return 0.3
+    return 0.1
+
+
+def _weighted_quality_kernel(
+    base: float, content: float, structure: float, relevance: float, usage: float, feedback: float
+) -> float:
+    """综合质量评分的加权平均，结果限制在 [0, 1]"""
+    total = 0.3 * base + 0.2 * content + 0.15 * structure + 0.15 * relevance + 0.15 * usage + 0.05 * feedback
+    return min(1.0, max(0.0, total))
+
+
+if njit is not None:
+    # cache=True 把编译结果写入磁盘缓存（默认在 __pycache__，设置了 NUMBA_CACHE_DIR 时写到该目录，
+    # 测试中为 .numba_cache），之后的进程无需重新编译
+    _decay_kernel = njit(cache=True)(_decay_kernel)
+    _weighted_quality_kernel = njit(cache=True)(_weighted_quality_kernel)
+
+
 class MemoryLifecycleManager:
     """
     高级记忆生命周期管理器
@@ -101,19 +152,15 @@ class MemoryLifecycleManager:
         feedback_score = self._evaluate_feedback(memory.get("metadata", {}))
 
         # 综合评分（加权平均）
-        weights = {"base": 0.3, "content": 0.2, "structure": 0.15, "relevance": 0.15, "usage": 0.15, "feedback": 0.05}
-
-        total_score = (
-            weights["base"] * base_quality
-            + weights["content"] * content_score
-            + weights["structure"] * structure_score
-            + weights["relevance"] * relevance_score
-            + weights["usage"] * usage_score
-            + weights["feedback"] * feedback_score
+        return _weighted_quality_kernel(
+            float(base_quality),
+            float(content_score),
+            float(structure_score),
+            float(relevance_score),
+            float(usage_score),
+            float(feedback_score),
         )
 
-        return min(1.0, max(0.0, total_score))
-
     def apply_decay(self, memory: dict[str, Any], current_time: Optional[datetime] = None) -> float:
         """
         应用衰减算法
@@ -144,16 +191,9 @@ class MemoryLifecycleManager:
         adjusted_age = age_days / importance_factor
 
         # 应用不同的衰减曲线
-        if self.decay_curve == DecayCurve.LINEAR:
-            decay_value = self._linear_decay(adjusted_age)
-        elif self.decay_curve == DecayCurve.EXPONENTIAL:
-            decay_value = self._exponential_decay(adjusted_age)
-        elif self.decay_curve == DecayCurve.LOGARITHMIC:
-            decay_value = self._logarithmic_decay(adjusted_age)
-        elif self.decay_curve == DecayCurve.STEP:
-            decay_value = self._step_decay(adjusted_age)
-        else:
-            decay_value = 1.0
+        decay_value = _decay_kernel(
+            float(adjusted_age), _DECAY_CURVE_IDS.get(self.decay_curve, -1), float(MEMORY_DECAY_DAYS)
+        )
 
         # 应用类型权重
         mem_type = metadata.get("type", "general")
@@ -161,14 +201,19 @@ class MemoryLifecycleManager:
 
         return min(1.0, decay_value * type_weight)
 
-    def evaluate_memory_value(self, memory: dict[str, Any]) -> dict[str, float]:
+    def evaluate_memory_value(
+        self, memory: dict[str, Any], current_time: Optional[datetime] = None
+    ) -> dict[str, float]:
         """
         评估记忆的综合价值
 
         返回多维度的价值评分
         """
+        if current_time is None:
+            current_time = datetime.now(timezone.utc)
+
         quality = self.calculate_advanced_quality(memory)
-        decay = self.apply_decay(memory)
+        decay = self.apply_decay(memory, current_time)
 
         # 计算综合价值
         overall_value = quality * decay
@@ -177,7 +222,7 @@ class MemoryLifecycleManager:
         metadata = memory.get("metadata", {})
 
         # 历史价值（老记忆可能有历史价值）
-        historical_value = self._calculate_historical_value(memory)
+        historical_value = self._calculate_historical_value(memory, current_time)
 
         # 参考价值（被引用次数）
         reference_value = metadata.get("reference_count", 0) / 10.0
@@ -245,22 +290,32 @@ class MemoryLifecycleManager:
 
         layers = [layer] if layer else ["global", "project"]
 
+        # 整批共用同一个评估时间，避免每条记忆重复取当前时间
+        now = datetime.now(timezone.utc)
+        evaluate = self.evaluate_memory_value
+        delete, archive, valuable, active = (
+            results["delete"],
+            results["archive"],
+            results["valuable"],
+            results["active"],
+        )
+
         for current_layer in layers:
             layer_data = _load_memory_layer(current_layer)
 
             for key, memory in layer_data.items():
-                value_assessment = self.evaluate_memory_value(memory)
+                value_assessment = evaluate(memory, now)
 
                 memory_info = {"key": key, "layer": current_layer, "memory": memory, "assessment": value_assessment}
 
                 if value_assessment["should_delete"]:
-                    results["delete"].append(memory_info)
+                    delete.append(memory_info)
                 elif value_assessment["should_archive"]:
-                    results["archive"].append(memory_info)
+                    archive.append(memory_info)
                 elif value_assessment["overall"] > 0.8:
-                    results["valuable"].append(memory_info)
+                    valuable.append(memory_info)
                 else:
-                    results["active"].append(memory_info)
+                    active.append(memory_info)
 
         return results
 
@@ -396,12 +451,15 @@ class MemoryLifecycleManager:
 
         return 0.5  # 默认中性
 
-    def _calculate_historical_value(self, memory: dict[str, Any]) -> float:
+    def _calculate_historical_value(self, memory: dict[str, Any], current_time: Optional[datetime] = None) -> float:
         """计算历史价值"""
+        if current_time is None:
+            current_time = datetime.now(timezone.utc)
+
         try:
             timestamp = memory.get("timestamp", "")
             created_time = datetime.fromisoformat(timestamp.replace("Z", "+00:00"))
-            age_days = (datetime.now(timezone.utc) - created_time).days
+            age_days = (current_time - created_time).days
 
             # 超过一定时间的记忆可能有历史价值
             if age_days > 365:  # 1年以上
@@ -424,46 +482,6 @@ class MemoryLifecycleManager:
         # 暂时使用标签数量作为简单指标
         return min(1.0, len(tags) / 10)
 
-    # 衰减函数实现
-
-    def _linear_decay(self, age_days: float) -> float:
-        """线性衰减"""
-        if age_days <= MEMORY_DECAY_DAYS:
-            return 1.0
-        else:
-            return max(0.1, 1.0 - (age_days - MEMORY_DECAY_DAYS) / (MEMORY_DECAY_DAYS * 2))
-
-    def _exponential_decay(self, age_days: float) -> float:
-        """指数衰减"""
-        if age_days <= MEMORY_DECAY_DAYS:
-            return 1.0
-        else:
-            # e^(-λt) 其中 λ 控制衰减速度
-            decay_rate = 0.05  # 衰减率
-            return max(0.1, math.exp(-decay_rate * (age_days - MEMORY_DECAY_DAYS)))
-
-    def _logarithmic_decay(self, age_days: float) -> float:
-        """对数衰减（衰减速度逐渐减慢）"""
-        if age_days <= MEMORY_DECAY_DAYS:
-            return 1.0
-        else:
-            # 1 - log(1 + t) / log(1 + max_t)
-            max_age = MEMORY_DECAY_DAYS * 10
-            return max(0.1, 1.0 - math.log(1 + age_days - MEMORY_DECAY_DAYS) / math.log(1 + max_age))
-
-    def _step_decay(self, age_days: float) -> float:
-        """阶梯衰减"""
-        if age_days <= MEMORY_DECAY_DAYS:
-            return 1.0
-        elif age_days <= MEMORY_DECAY_DAYS * 2:
-            return 0.7
-        elif age_days <= MEMORY_DECAY_DAYS * 4:
-            return 0.5
-        elif age_days <= MEMORY_DECAY_DAYS * 8:
-            return 0.3
-        else:
-            return 0.1
-
 
 # 全局实例
 _lifecycle_manager: Optional[MemoryLifecycleManager] = None
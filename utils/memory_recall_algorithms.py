@@ -8,18 +8,56 @@
 - 多维度评分融合
 """
 
+import heapq
 import logging
 import re
-from datetime import datetime
 from difflib import SequenceMatcher
 from typing import Any, Optional
 
-from .intelligent_memory_retrieval import get_memory_index
+from .intelligent_memory_retrieval import _timestamp_parts, get_memory_index
 from .intelligent_memory_retrieval import intelligent_recall_memory as base_recall
 from .thinking_patterns import thinking_registry
 
 logger = logging.getLogger(__name__)
 
+# 分词时过滤的停用词
+_STOP_WORDS = frozenset({"the", "a", "an", "is", "are", "was", "were", "in", "on", "at", "to", "for"})
+
+# 一些简单的语义相关词组
+_SEMANTIC_GROUPS = {
+    "bug": ["error", "issue", "problem", "fault", "defect", "bug", "crash"],
+    "feature": ["feature", "function", "capability", "enhancement", "addition"],
+    "performance": ["performance", "speed", "optimization", "efficient", "fast", "slow"],
+    "security": ["security", "auth", "authentication", "permission", "access", "vulnerability"],
+    "test": ["test", "testing", "unit", "integration", "coverage", "assertion"],
+    "refactor": ["refactor", "cleanup", "reorganize", "restructure", "improve"],
+    "database": ["database", "db", "sql", "query", "table", "schema"],
+    "api": ["api", "endpoint", "request", "response", "rest", "graphql"],
+}
+
+# 反向索引：词 -> 所属语义组
+_WORD_TO_GROUPS: dict[str, list[str]] = {}
+for _group, _words in _SEMANTIC_GROUPS.items():
+    for _word in _words:
+        _WORD_TO_GROUPS.setdefault(_word, []).append(_group)
+
+# 模糊匹配的相似度阈值
+_FUZZY_THRESHOLD = 0.8
+
+# 思维模式的特征词
+_THINKING_PATTERN_KEYWORDS = {
+    "first_principles": ("first principle", "基本原理", "fundamental", "本质"),
+    "dialectical": ("dialectic", "辩证", "contradiction", "矛盾", "synthesis"),
+    "systems_thinking": ("system", "系统", "interconnect", "相互关联", "holistic"),
+    "critical_analysis": ("critical", "批判", "analyze", "分析", "evaluate"),
+    "creative_exploration": ("creative", "创造", "innovative", "创新", "brainstorm"),
+    "meta_cognitive": ("meta", "元认知", "think about thinking", "思考的思考"),
+    "analogical": ("analogy", "类比", "similar to", "相似", "like"),
+    "empirical": ("empirical", "实证", "evidence", "证据", "data"),
+    "pragmatic": ("pragmatic", "实用", "practical", "实际", "actionable"),
+    "holistic": ("holistic", "整体", "comprehensive", "全面", "complete"),
+}
+
 
 class MemoryRecallEngine:
     """
@@ -47,6 +85,10 @@ class MemoryRecallEngine:
         - 上下文权重
         """
         query_lower = query.lower()
+        return self._semantic_match(query_lower, self._tokenize(query_lower), content)
+
+    def _semantic_match(self, query_lower: str, query_words: list[str], content: str) -> float:
+        """semantic_keyword_match 的主体；查询的小写和分词由调用方预先算好，批量评分时只做一次"""
         content_lower = content.lower()
 
         # 1. 精确匹配
@@ -57,8 +99,7 @@ class MemoryRecallEngine:
             return 0.8 * position_weight
 
         # 2. 分词匹配
-        query_words = self._tokenize(query_lower)
-        content_words = self._tokenize(content_lower)
+        content_words = set(self._tokenize(content_lower))
 
         if not query_words:
             return 0.0
@@ -70,12 +111,7 @@ class MemoryRecallEngine:
         # 3. 模糊匹配（编辑距离）
         fuzzy_score = 0.0
         for q_word in query_words:
-            best_match = 0.0
-            for c_word in content_words:
-                similarity = SequenceMatcher(None, q_word, c_word).ratio()
-                if similarity > 0.8:  # 80%相似度阈值
-                    best_match = max(best_match, similarity)
-            fuzzy_score += best_match
+            fuzzy_score += self._best_fuzzy_match(q_word, content_words)
 
         if query_words:
             fuzzy_score /= len(query_words)
@@ -133,12 +169,14 @@ class MemoryRecallEngine:
 
         # 1. 时间接近度
         if context.get("timestamp") and memory.get("timestamp"):
-            try:
-                ctx_time = datetime.fromisoformat(context["timestamp"].replace("Z", "+00:00"))
-                mem_time = datetime.fromisoformat(memory["timestamp"].replace("Z", "+00:00"))
+            # 时间戳解析结果按字符串缓存，排序循环里同一个上下文时间只解析一次
+            ctx_time = _timestamp_parts(context["timestamp"])
+            mem_time = _timestamp_parts(memory["timestamp"])
 
+            # 与 datetime 相减的规则一致：naive 与 naive、aware 与 aware 可比，混合或无法解析时不计时间分
+            if ctx_time is not None and mem_time is not None and ctx_time[1] == mem_time[1]:
                 # 计算时间差（小时）
-                time_diff = abs((ctx_time - mem_time).total_seconds()) / 3600
+                time_diff = abs(ctx_time[0] - mem_time[0]) / 3600
 
                 # 使用指数衰减函数
                 if time_diff < 24:  # 24小时内
@@ -151,8 +189,6 @@ class MemoryRecallEngine:
                     time_score = 0.2
 
                 score += weights["time"] * time_score
-            except Exception:
-                pass
 
         # 2. 标签重叠度（Jaccard相似系数）
         ctx_tags = set(context.get("tags", []))
@@ -232,20 +268,24 @@ class MemoryRecallEngine:
         # 2. 对每个候选记忆进行高级评分
         scored_memories = []
 
+        # 查询只需小写和分词一次
+        if query:
+            query_lower = query.lower()
+            query_words = self._tokenize(query_lower)
+
         for memory in candidates:
             # 基础相关性分数
             base_score = memory.get("relevance_score", 0.5)
+            content = str(memory.get("content", ""))
 
             # 语义匹配分数
             semantic_score = 0.0
             if query:
-                content = str(memory.get("content", ""))
-                semantic_score = self.semantic_keyword_match(query, content)
+                semantic_score = self._semantic_match(query_lower, query_words, content)
 
             # 思维模式匹配分数
             pattern_score = 0.0
             if thinking_patterns:
-                content = str(memory.get("content", ""))
                 pattern_score = self.thinking_pattern_match(content, thinking_patterns)
 
             # 上下文相似度分数
@@ -294,10 +334,8 @@ class MemoryRecallEngine:
 
             scored_memories.append(memory)
 
-        # 3. 按最终分数排序并返回
-        scored_memories.sort(key=lambda x: x["relevance_score"], reverse=True)
-
-        return scored_memories[:limit]
+        # 3. 按最终分数取前 limit 条（与稳定的降序排序后切片结果一致）
+        return heapq.nlargest(limit, scored_memories, key=lambda x: x["relevance_score"])
 
     def _tokenize(self, text: str) -> list[str]:
         """分词处理"""
@@ -305,30 +343,28 @@ class MemoryRecallEngine:
         # 去除标点符号，按空格分词
         words = re.findall(r"\w+", text.lower())
         # 过滤停用词
-        stop_words = {"the", "a", "an", "is", "are", "was", "were", "in", "on", "at", "to", "for"}
-        return [w for w in words if w not in stop_words and len(w) > 2]
-
-    def _calculate_semantic_relevance(self, query_words: list[str], content_words: list[str]) -> float:
+        return [w for w in words if w not in _STOP_WORDS and len(w) > 2]
+
+    def _best_fuzzy_match(self, q_word: str, content_words: set[str]) -> float:
+        """查询词与内容词的最高相似度（只计超过阈值的）"""
+        if q_word in content_words:
+            return 1.0
+
+        best_match = 0.0
+        matcher = SequenceMatcher(None, q_word)
+        for c_word in content_words:
+            matcher.set_seq2(c_word)
+            # real_quick_ratio/quick_ratio 都是 ratio 的上界，先用它们剪枝
+            if matcher.real_quick_ratio() <= _FUZZY_THRESHOLD or matcher.quick_ratio() <= _FUZZY_THRESHOLD:
+                continue
+            similarity = matcher.ratio()
+            if similarity > _FUZZY_THRESHOLD:
+                best_match = max(best_match, similarity)
+        return best_match
+
+    def _calculate_semantic_relevance(self, query_words: list[str], content_words: set[str]) -> float:
         """计算语义相关性"""
-        # 定义一些简单的语义相关词组
-        semantic_groups = {
-            "bug": ["error", "issue", "problem", "fault", "defect", "bug", "crash"],
-            "feature": ["feature", "function", "capability", "enhancement", "addition"],
-            "performance": ["performance", "speed", "optimization", "efficient", "fast", "slow"],
-            "security": ["security", "auth", "authentication", "permission", "access", "vulnerability"],
-            "test": ["test", "testing", "unit", "integration", "coverage", "assertion"],
-            "refactor": ["refactor", "cleanup", "reorganize", "restructure", "improve"],
-            "database": ["database", "db", "sql", "query", "table", "schema"],
-            "api": ["api", "endpoint", "request", "response", "rest", "graphql"],
-        }
-
-        # 反向索引
-        word_to_group = {}
-        for group, words in semantic_groups.items():
-            for word in words:
-                if word not in word_to_group:
-                    word_to_group[word] = []
-                word_to_group[word].append(group)
+        word_to_group = _WORD_TO_GROUPS
 
         # 查找查询词所属的语义组
         query_groups = set()
@@ -353,22 +389,8 @@ class MemoryRecallEngine:
         detected_patterns = set()
         content_lower = content.lower()
 
-        # 定义思维模式的特征词
-        pattern_keywords = {
-            "first_principles": ["first principle", "基本原理", "fundamental", "本质"],
-            "dialectical": ["dialectic", "辩证", "contradiction", "矛盾", "synthesis"],
-            "systems_thinking": ["system", "系统", "interconnect", "相互关联", "holistic"],
-            "critical_analysis": ["critical", "批判", "analyze", "分析", "evaluate"],
-            "creative_exploration": ["creative", "创造", "innovative", "创新", "brainstorm"],
-            "meta_cognitive": ["meta", "元认知", "think about thinking", "思考的思考"],
-            "analogical": ["analogy", "类比", "similar to", "相似", "like"],
-            "empirical": ["empirical", "实证", "evidence", "证据", "data"],
-            "pragmatic": ["pragmatic", "实用", "practical", "实际", "actionable"],
-            "holistic": ["holistic", "整体", "comprehensive", "全面", "complete"],
-        }
-
-        # 检查每种模式的特征词
-        for pattern, keywords in pattern_keywords.items():
+        # 检查每种模式的特征词（逐词子串查找比合并成一个正则的单次扫描更快）
+        for pattern, keywords in _THINKING_PATTERN_KEYWORDS.items():
             if any(keyword in content_lower for keyword in keywords):
                 detected_patterns.add(pattern)
 